@@ -0,0 +1,40 @@
+#!/usr/bin/env python
+
+"""
+Latency of single Api.get(), Api.search() and Api.add() calls against a
+local FakeNuvla, with the standard library and the default JSON codecs.
+
+    $ python benchmarks/api_latency.py -o latency.json
+"""
+
+from bench import main, measure, result
+from nuvla.api import Api
+from nuvla.api.testing import FakeNuvla
+from nuvla.api.util.codec import JsonCodec, default_codec
+
+RECORD = {'name': 'GNSS', 'description': 'GNSS record', 'gnss:lat': 52.95,
+          'gnss:lon': -1.18, 'gnss:station': 'nuvlabox-esac', 'bytes': 49999800,
+          'location': [52.95, -1.18, 99], 'timestamp': '2019-10-03T14:46:57Z'}
+
+
+def run(quick=False):
+    repeat = 50 if quick else 500
+    results = []
+    with FakeNuvla() as server:
+        ids = [server.add_resource('data-record', dict(RECORD, n=i)) for i in range(1000)]
+        for codec in [JsonCodec(), default_codec()]:
+            api = Api(server.endpoint, persist_cookie=False, json_codec=codec)
+            params = {'codec': codec.name}
+            results.append(result('api.get', params,
+                                  measure(lambda: api.get(ids[0]), repeat)))
+            results.append(result('api.search', dict(params, last=100),
+                                  measure(lambda: api.search('data-record', filter='n<100',
+                                                             last=100), repeat // 5)))
+            results.append(result('api.add', params,
+                                  measure(lambda: api.add('data-record', RECORD), repeat)))
+            api.close()
+    return results
+
+
+if __name__ == '__main__':
+    main(run, __doc__.strip().splitlines()[0])
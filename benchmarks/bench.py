@@ -0,0 +1,106 @@
+"""
+Helpers shared by the benchmarks: timing, statistics and JSON reports.
+
+Each benchmark module exposes `run(quick=False) -> list` returning result
+dicts {'benchmark': <name>, 'params': {...}, 'metrics': {...}} and can be
+run on its own or through `run_all.py`.
+"""
+
+import gc
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+from nuvla.api.metrics import percentile
+from nuvla.api.util.codec import default_codec
+
+
+def library_version() -> str:
+    try:
+        from importlib.metadata import version
+        return version('nuvla-api')
+    except Exception:
+        return 'unknown'
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(['git', 'describe', '--always', '--dirty'],
+                              capture_output=True, text=True, check=True,
+                              timeout=10).stdout.strip()
+    except Exception:
+        return 'unknown'
+
+
+def meta() -> dict:
+    return {'date': datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ'),
+            'library_version': library_version(),
+            'git_revision': git_revision(),
+            'python': platform.python_version(),
+            'implementation': platform.python_implementation(),
+            'platform': platform.platform(),
+            'json_codec': default_codec().name}
+
+
+def summarize(samples) -> dict:
+    """Latency statistics, in milliseconds, of `samples` in seconds."""
+    values = sorted(s * 1000 for s in samples)
+    return {'n': len(values),
+            'min_ms': round(values[0], 4),
+            'mean_ms': round(statistics.mean(values), 4),
+            'p50_ms': round(percentile(values, 50), 4),
+            'p95_ms': round(percentile(values, 95), 4),
+            'p99_ms': round(percentile(values, 99), 4),
+            'max_ms': round(values[-1], 4)}
+
+
+def measure(fn, repeat, warmup=1) -> dict:
+    """Calls `fn` `warmup` + `repeat` times and returns the latency
+    statistics of the last `repeat` calls."""
+    for _ in range(warmup):
+        fn()
+    samples = []
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            fn()
+            samples.append(time.perf_counter() - start)
+    finally:
+        if gc_enabled:
+            gc.enable()
+    return summarize(samples)
+
+
+def result(benchmark, params, metrics) -> dict:
+    return {'benchmark': benchmark, 'params': params, 'metrics': metrics}
+
+
+def report(results) -> dict:
+    return {'meta': meta(), 'results': results}
+
+
+def output(results, path=None):
+    """Writes the JSON report of `results` to `path` or to stdout."""
+    data = json.dumps(report(results), indent=2)
+    if path:
+        with open(path, 'w') as fh:
+            fh.write(data + '\n')
+    else:
+        sys.stdout.write(data + '\n')
+
+
+def main(run, description):
+    """Command line entry point of a benchmark module."""
+    import argparse
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('--quick', action='store_true',
+                        help='smaller sizes and fewer repetitions')
+    parser.add_argument('--output', '-o', help='JSON report file (default: stdout)')
+    args = parser.parse_args()
+    output(run(quick=args.quick), args.output)
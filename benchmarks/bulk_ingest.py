@@ -0,0 +1,44 @@
+#!/usr/bin/env python
+
+"""
+Throughput of the ingest of data records with DataRecord.create_many()
+against a local FakeNuvla with injected network latency, for several
+concurrency levels.
+
+    $ python benchmarks/bulk_ingest.py -o ingest.json
+"""
+
+from bench import main, result
+from nuvla.api import Api
+from nuvla.api.resources.data import DataRecord
+from nuvla.api.testing import FakeNuvla
+
+RECORD = {'name': 'GNSS', 'gnss:station': 'nuvlabox-esac', 'gnss:lat': 52.95,
+          'gnss:lon': -1.18, 'bytes': 49999800, 'content-type': 'gnss/perf-test',
+          'timestamp': '2019-10-03T14:46:57Z'}
+
+
+def run(quick=False):
+    total = 200 if quick else 2000
+    latency = 0.002
+    results = []
+    with FakeNuvla(latency=latency) as server:
+        for concurrency in [1, 4, 16]:
+            api = Api(server.endpoint, persist_cookie=False, pool_maxsize=concurrency)
+            records = (dict(RECORD, n=i) for i in range(total))
+            report = DataRecord(api).create_many(records, 'infrastructure-service/1',
+                                                 concurrency=concurrency)
+            results.append(result('data_record.create_many',
+                                  {'records': total, 'concurrency': concurrency,
+                                   'latency_ms': latency * 1000},
+                                  {'seconds': round(report.elapsed, 3),
+                                   'records_per_second': round(report.throughput, 1),
+                                   'failed': report.failed,
+                                   'retries': report.retries}))
+            api.close()
+            server.resources.clear()
+    return results
+
+
+if __name__ == '__main__':
+    main(run, __doc__.strip().splitlines()[0])
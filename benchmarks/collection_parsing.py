@@ -0,0 +1,49 @@
+#!/usr/bin/env python
+
+"""
+Decoding of search responses and construction of CimiCollection objects for
+1k, 10k and 100k resources, with the standard library and the default JSON
+codecs.
+
+    $ python benchmarks/collection_parsing.py -o parsing.json
+"""
+
+from bench import main, measure, result
+from nuvla.api.models import CimiCollection
+from nuvla.api.util.codec import JsonCodec, default_codec
+
+
+def search_response(size) -> dict:
+    return {'id': 'data-record',
+            'resource-type': 'data-record-collection',
+            'count': size,
+            'resources': [{'id': 'data-record/{}'.format(i),
+                           'resource-type': 'data-record',
+                           'name': 'GNSS', 'gnss:station': 'nuvlabox-esac',
+                           'gnss:lat': 52.95, 'gnss:lon': -1.18, 'bytes': i,
+                           'location': [52.95, -1.18, 99],
+                           'tags': ['gnss', 'perf-test'],
+                           'acl': {'owners': ['group/nuvla-admin']},
+                           'created': '2019-10-03T14:46:57.123Z',
+                           'updated': '2019-10-03T14:46:57.123Z'}
+                          for i in range(size)]}
+
+
+def run(quick=False):
+    sizes = [1000, 10000] if quick else [1000, 10000, 100000]
+    results = []
+    for size in sizes:
+        repeat = max(3, 100000 // size // (10 if quick else 1))
+        doc = search_response(size)
+        for codec in [JsonCodec(), default_codec()]:
+            body = codec.dumps(doc)
+            params = {'resources': size, 'codec': codec.name, 'body_bytes': len(body)}
+            results.append(result('collection.decode', params,
+                                  measure(lambda: codec.loads(body), repeat)))
+            results.append(result('collection.build', params, measure(
+                lambda: CimiCollection(codec.loads(body)).resources, repeat)))
+    return results
+
+
+if __name__ == '__main__':
+    main(run, __doc__.strip().splitlines()[0])
@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+
+"""
+Compares two benchmark reports and lists the metrics which changed by more
+than a threshold. Exits with status 1 if any metric regressed.
+
+    $ python benchmarks/compare.py results-4.2.3.json results-new.json --threshold 10
+"""
+
+import argparse
+import json
+import sys
+
+# Metrics for which higher values are better; lower is better for the others
+# (latencies, sizes).
+HIGHER_IS_BETTER = ('rps', 'records_per_second', 'ratio')
+# Metrics which aren't performance measures.
+IGNORED = ('n', 'failed', 'retries', 'bytes_in')
+
+
+def key(r) -> tuple:
+    return r['benchmark'], json.dumps(r['params'], sort_keys=True)
+
+
+def compare(baseline, current, threshold) -> list:
+    """Returns the (benchmark, params, metric, old, new, change %, regression)
+    of the metrics which changed by more than `threshold` percent."""
+    base = {key(r): r['metrics'] for r in baseline['results']}
+    changes = []
+    for r in current['results']:
+        old_metrics = base.get(key(r))
+        if old_metrics is None:
+            continue
+        for metric, new in r['metrics'].items():
+            old = old_metrics.get(metric)
+            if metric in IGNORED or not isinstance(old, (int, float)) \
+                    or not isinstance(new, (int, float)) or old == 0:
+                continue
+            change = (new - old) / abs(old) * 100
+            if abs(change) <= threshold:
+                continue
+            worse = change < 0 if metric in HIGHER_IS_BETTER else change > 0
+            changes.append((r['benchmark'], r['params'], metric, old, new,
+                            round(change, 1), worse))
+    return changes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('baseline')
+    parser.add_argument('current')
+    parser.add_argument('--threshold', type=float, default=10.0,
+                        help='minimum change in percent (default: 10)')
+    args = parser.parse_args()
+
+    with open(args.baseline) as fh:
+        baseline = json.load(fh)
+    with open(args.current) as fh:
+        current = json.load(fh)
+    changes = compare(baseline, current, args.threshold)
+    for benchmark, params, metric, old, new, change, worse in changes:
+        print('{0:<10} {1} {2} {3}: {4} -> {5} ({6:+}%)'.format(
+            'REGRESSION' if worse else 'improved', benchmark,
+            json.dumps(params, sort_keys=True), metric, old, new, change))
+    sys.exit(1 if any(c[-1] for c in changes) else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+#!/usr/bin/env python
+
+"""
+Overhead of the compression of request bodies: Api.add() latency with and
+without `compress=True` for several body sizes, with the compression ratio
+and CPU time.
+
+    $ python benchmarks/compression.py -o compression.json
+"""
+
+from bench import main, measure, result
+from nuvla.api import Api
+from nuvla.api.testing import FakeNuvla
+
+
+def record(size) -> dict:
+    # Repetitive content, as in real documents, compresses well.
+    items = [{'name': 'param-{}'.format(i), 'value': str(i % 97)}
+             for i in range(max(1, size // 40))]
+    return {'name': 'record', 'items': items}
+
+
+def run(quick=False):
+    repeat = 20 if quick else 200
+    sizes = [512, 16 * 1024, 256 * 1024]
+    results = []
+    with FakeNuvla() as server:
+        for size in sizes:
+            doc = record(size)
+            for compress in [False, True]:
+                api = Api(server.endpoint, persist_cookie=False, compress=compress)
+                metrics = measure(lambda: api.add('data-record', doc), repeat)
+                if compress:
+                    counters = api.compression_stats.as_dict()
+                    metrics.update({'bytes_in': counters['bytes_in'],
+                                    'bytes_out': counters['bytes_out'],
+                                    'ratio': round(counters['bytes_in']
+                                                   / max(counters['bytes_out'], 1), 2),
+                                    'cpu_ms_per_request': round(
+                                        counters['cpu_time'] * 1000
+                                        / max(counters['requests'], 1), 4)})
+                results.append(result('api.add.compress',
+                                      {'size': size, 'compress': compress}, metrics))
+                api.close()
+                server.resources.clear()
+    return results
+
+
+if __name__ == '__main__':
+    main(run, __doc__.strip().splitlines()[0])
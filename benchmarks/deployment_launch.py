@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+
+"""
+End-to-end Deployment.launch() (create, start and get) and
+Deployment.launch_many() against a local FakeNuvla with injected network
+latency. Reports the latency and the number of requests sent per launch.
+
+    $ python benchmarks/deployment_launch.py -o launch.json
+"""
+
+import time
+
+from bench import main, measure, result
+from nuvla.api import Api
+from nuvla.api.resources import Deployment
+from nuvla.api.testing import FakeNuvla
+
+
+def run(quick=False):
+    repeat = 10 if quick else 50
+    results = []
+    for latency in [0.0, 0.005]:
+        with FakeNuvla(latency=latency) as server:
+            module_id = server.add_resource('module', {
+                'name': 'app', 'subtype': 'component',
+                'content': {'image': 'nginx', 'urls': [['http', 'http://${hostname}']]}})
+            api = Api(server.endpoint, persist_cookie=False)
+            api.login_password('user', 'password')
+            dpl_api = Deployment(api)
+            kwargs = {'infra_cred_id': 'credential/1',
+                      'data_records': ['data-record/1']}
+            dpl_api.launch(module_id, **kwargs)
+            requests_before = len(server.requests)
+            metrics = measure(lambda: dpl_api.launch(module_id, **kwargs), repeat,
+                              warmup=0)
+            metrics['requests_per_launch'] = \
+                (len(server.requests) - requests_before) / repeat
+            results.append(result('deployment.launch', {'latency_ms': latency * 1000},
+                                  metrics))
+
+            n, concurrency = repeat * 2, 10
+            specs = [dict(kwargs, module_id=module_id)] * n
+            requests_before = len(server.requests)
+            start = time.perf_counter()
+            failed = sum(not r.ok for r in dpl_api.launch_many(specs, concurrency))
+            elapsed = time.perf_counter() - start
+            results.append(result('deployment.launch_many',
+                                  {'latency_ms': latency * 1000, 'launches': n,
+                                   'concurrency': concurrency},
+                                  {'elapsed_s': round(elapsed, 4),
+                                   'launches_per_s': round(n / elapsed, 1),
+                                   'failed': failed,
+                                   'requests_per_launch':
+                                       (len(server.requests) - requests_before) / n}))
+            api.close()
+    return results
+
+
+if __name__ == '__main__':
+    main(run, __doc__.strip().splitlines()[0])
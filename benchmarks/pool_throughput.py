@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+
+"""
+Throughput of Api.get() shared by a growing number of threads, against a
+local FakeNuvla.
+
+Compares the default `requests` adapter with pools sized for the number of
+threads. Reports requests per second and the number of TCP connections the
+server had to accept (connection churn).
+
+    $ python benchmarks/pool_throughput.py -o pool.json
+"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from requests.adapters import HTTPAdapter
+
+from bench import main, result
+from nuvla.api import Api
+from nuvla.api.testing import FakeNuvla
+
+
+def default_adapter_api(endpoint):
+    api = Api(endpoint, persist_cookie=False)
+    adapter = HTTPAdapter()
+    api.session.mount('http://', adapter)
+    return api
+
+
+def tuned_api(endpoint, threads):
+    return Api(endpoint, persist_cookie=False, pool_maxsize=threads,
+               pool_block=True)
+
+
+def measure_throughput(server, api, ids, threads):
+    server.connections = 0
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        list(executor.map(api.get, ids))
+    elapsed = time.perf_counter() - start
+    return {'seconds': round(elapsed, 3),
+            'rps': round(len(ids) / elapsed, 1),
+            'connections': server.connections}
+
+
+def run(quick=False):
+    n_requests = 200 if quick else 2000
+    thread_counts = [1, 4, 16] if quick else [1, 2, 4, 8, 16, 32, 64]
+    results = []
+    with FakeNuvla() as server:
+        record_ids = [server.add_resource('data-record', {'n': i}) for i in range(100)]
+        ids = [record_ids[i % len(record_ids)] for i in range(n_requests)]
+        for threads in thread_counts:
+            for name, api in [('default', default_adapter_api(server.endpoint)),
+                              ('tuned', tuned_api(server.endpoint, threads))]:
+                results.append(result('api.get.threads',
+                                      {'adapter': name, 'threads': threads,
+                                       'requests': n_requests},
+                                      measure_throughput(server, api, ids, threads)))
+                api.close()
+    return results
+
+
+if __name__ == '__main__':
+    main(run, __doc__.strip().splitlines()[0])
@@ -0,0 +1,37 @@
+#!/usr/bin/env python
+
+"""
+Runs the benchmarks and writes a single JSON report, to be compared between
+releases with compare.py.
+
+    $ python benchmarks/run_all.py -o results-4.2.3.json
+    $ python benchmarks/run_all.py --quick --only api_latency bulk_ingest
+"""
+
+import argparse
+import importlib
+import sys
+
+from bench import output
+
+BENCHMARKS = ['api_latency', 'collection_parsing', 'compression',
+              'deployment_launch', 'bulk_ingest', 'pool_throughput']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--quick', action='store_true',
+                        help='smaller sizes and fewer repetitions')
+    parser.add_argument('--only', nargs='+', choices=BENCHMARKS, default=BENCHMARKS)
+    parser.add_argument('--output', '-o', help='JSON report file (default: stdout)')
+    args = parser.parse_args()
+
+    results = []
+    for name in args.only:
+        sys.stderr.write('running {}...\n'.format(name))
+        results.extend(importlib.import_module(name).run(quick=args.quick))
+    output(results, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,4 +1,4 @@
 # -*- coding: utf-8 -*-
 
 from .api import Api, NuvlaError, ConnectionError, NuvlaResourceOperationNotAvailable
-
+from .async_api import AsyncApi
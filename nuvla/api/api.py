@@ -54,27 +54,54 @@
 
 """
 
+import atexit
 import json as jsonlib
 import logging
 import os
 import stat
 import copy
-import gzip
-from typing import Optional, Union
+import socket
+import tempfile
+import threading
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Iterator, Optional, Union
 
 import requests
+from requests.adapters import HTTPAdapter
 from requests.cookies import MockRequest
 from requests.exceptions import HTTPError, ConnectionError
 from http.cookiejar import MozillaCookieJar
 from urllib.parse import urlparse
+from urllib3.connection import HTTPConnection
+from urllib3.util.retry import Retry
 
+from .batch import Batch
+from .cache import DEFAULT_CACHE_SIZE, ResourceCache, cache_key
+from . import tracing
+from .metrics import RequestEvent, RequestHook, call_hooks, uri_template
 from .models import CimiResource, CimiCollection, CimiResponse, CloudEntryPoint
+from .util.codec import default_codec
+from .util.singleflight import SingleFlight
+from .util.compression import (Compressor, CompressionCounters,
+                               DEFAULT_LEVEL as DEFAULT_COMPRESS_LEVEL,
+                               DEFAULT_MIN_SIZE as DEFAULT_COMPRESS_MIN_SIZE)
 
 logger = logging.getLogger(__name__)
 
 DEFAULT_TIMEOUT = 120
+DEFAULT_PAGE_SIZE = 1000
+DEFAULT_CONCURRENCY = 10
+DEFAULT_POOL_CONNECTIONS = 10
+DEFAULT_POOL_MAXSIZE = 10
+# Only retry failures to establish a connection: nothing has been sent yet,
+# so it is safe for any method.
+DEFAULT_MAX_RETRIES = Retry(total=3, connect=3, read=0, status=0,
+                            backoff_factor=0.1, raise_on_status=False)
 DEFAULT_ENDPOINT = 'https://nuvla.io'
 DEFAULT_COOKIE_FILE = os.path.expanduser('~/.nuvla/cookies.txt')
+DEFAULT_COOKIE_SAVE_DELAY = 1.0
 HREF_SESSION_TMPL_PASSWORD = 'session-template/password'
 HREF_SESSION_TMPL_APIKEY = 'session-template/api-key'
 CLOUD_ENTRY_POINT_ID = 'cloud-entry-point'
@@ -126,11 +153,171 @@ def _response_debug(response: requests.Response):
     print('<<< Response')
 
 
+class AtomicMozillaCookieJar(MozillaCookieJar):
+    """A ``MozillaCookieJar`` saved atomically: the cookies are written to a
+    temporary file, while holding the jar lock, which then replaces the
+    cookie file. Readers never see a partially written file."""
+
+    def save(self, filename=None, ignore_discard=False, ignore_expires=False):
+        if filename is None:
+            filename = self.filename
+        if filename is None:
+            raise ValueError('cookie file name is not set')
+        fd, tmp_filename = tempfile.mkstemp(
+            dir=os.path.dirname(os.path.abspath(filename)),
+            prefix='.{}.'.format(os.path.basename(filename)))
+        os.close(fd)
+        try:
+            with self._cookies_lock:
+                super(AtomicMozillaCookieJar, self).save(tmp_filename,
+                                                         ignore_discard,
+                                                         ignore_expires)
+            os.replace(tmp_filename, filename)
+        except BaseException:
+            os.unlink(tmp_filename)
+            raise
+
+
+_scheduled_cookie_savers = weakref.WeakSet()
+
+
+@atexit.register
+def _flush_cookie_savers():
+    for saver in list(_scheduled_cookie_savers):
+        saver.flush()
+
+
+class CookieSaver(object):
+    """Debounces the persistence of a cookie jar. Saving is scheduled in a
+    background timer so that it happens at most once every `delay` seconds,
+    off the request path. Pending saves are flushed at interpreter exit.
+    A `delay` of 0 saves synchronously."""
+
+    def __init__(self, cookies: MozillaCookieJar, delay=DEFAULT_COOKIE_SAVE_DELAY):
+        self.cookies = cookies
+        self.delay = delay
+        self._lock = threading.Lock()
+        self._timer = None
+
+    def save(self):
+        try:
+            self.cookies.save(ignore_discard=True)
+        except OSError as ex:
+            logger.warning('Failed to save cookies to %s: %s',
+                           self.cookies.filename, ex)
+
+    def schedule(self):
+        if self.delay <= 0:
+            self.save()
+            return
+        with self._lock:
+            if self._timer is not None:
+                return
+            self._timer = threading.Timer(self.delay, self._run)
+            self._timer.daemon = True
+            self._timer.start()
+            _scheduled_cookie_savers.add(self)
+
+    def _run(self):
+        with self._lock:
+            self._timer = None
+            _scheduled_cookie_savers.discard(self)
+        self.save()
+
+    def flush(self):
+        """Saves immediately if a save is pending."""
+        with self._lock:
+            timer, self._timer = self._timer, None
+            _scheduled_cookie_savers.discard(self)
+        if timer is not None:
+            timer.cancel()
+            self.save()
+
+
+def load_cookie_jar(cookie_file=None) -> MozillaCookieJar:
+    """Returns a file-backed cookie jar loaded from `cookie_file` (defaults to
+    DEFAULT_COOKIE_FILE). The parent directory is created if needed.
+    """
+    if cookie_file is None:
+        cookie_file = DEFAULT_COOKIE_FILE
+    cookie_dir = os.path.dirname(cookie_file)
+    cookies = AtomicMozillaCookieJar(cookie_file)
+    # Create the $HOME/.nuvla dir if it doesn't exist
+    if not os.path.isdir(cookie_dir):
+        os.mkdir(cookie_dir, stat.S_IRUSR | stat.S_IWUSR | stat.S_IXUSR)
+    # Load existing cookies if the cookies.txt exists
+    if os.path.isfile(cookie_file):
+        cookies.load(ignore_discard=True)
+        cookies.clear_expired_cookies()
+    return cookies
+
+
+def error_message(json_msg: dict) -> str:
+    """Extracts the error message from a Nuvla error response body."""
+    message = json_msg.get('message')
+    if message is None:
+        error = json_msg.get('error')
+        message = error.get('code') + ' - ' + error.get('reason')
+    return message
+
+
+def keep_alive_socket_options(idle=60, interval=10, count=6) -> list:
+    """Returns urllib3 socket options enabling TCP keep-alive probes, so that
+    idle pooled connections are kept open (and dead ones detected) by the OS.
+
+    :param idle: Seconds of inactivity before the first probe.
+    :param interval: Seconds between probes.
+    :param count: Number of failed probes before the connection is dropped.
+    """
+    options = list(HTTPConnection.default_socket_options)
+    options.append((socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1))
+    if hasattr(socket, 'TCP_KEEPIDLE'):
+        options.append((socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, idle))
+    elif hasattr(socket, 'TCP_KEEPALIVE'):
+        # macOS
+        options.append((socket.IPPROTO_TCP, socket.TCP_KEEPALIVE, idle))
+    if hasattr(socket, 'TCP_KEEPINTVL'):
+        options.append((socket.IPPROTO_TCP, socket.TCP_KEEPINTVL, interval))
+    if hasattr(socket, 'TCP_KEEPCNT'):
+        options.append((socket.IPPROTO_TCP, socket.TCP_KEEPCNT, count))
+    return options
+
+
+class PoolAdapter(HTTPAdapter):
+    """An ``HTTPAdapter`` passing custom socket options to its connection pools."""
+
+    __attrs__ = HTTPAdapter.__attrs__ + ['socket_options']
+
+    def __init__(self, socket_options=None, **kwargs):
+        # Set before calling super() which creates the pool manager.
+        self.socket_options = socket_options
+        super(PoolAdapter, self).__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        if self.socket_options is not None:
+            kwargs['socket_options'] = self.socket_options
+        super(PoolAdapter, self).init_poolmanager(*args, **kwargs)
+
+    def proxy_manager_for(self, proxy, **proxy_kwargs):
+        if self.socket_options is not None:
+            proxy_kwargs.setdefault('socket_options', self.socket_options)
+        return super(PoolAdapter, self).proxy_manager_for(proxy, **proxy_kwargs)
+
+
 class SessionStore(requests.Session):
-    """A ``requests.Session`` subclass implementing a file-based session store."""
+    """A ``requests.Session`` subclass implementing a file-based session store.
+
+    It can be shared by several threads: cookies are saved by a debounced
+    `CookieSaver` and concurrent reauthentications are serialized so that
+    only one login request is made. `auth_generation` is incremented each
+    time the authentication changes (login, logout)."""
 
     def __init__(self, endpoint, persist_cookie, cookie_file, reauthenticate,
-                 login_params, authn_header=None, debug=False):
+                 login_params, authn_header=None, debug=False,
+                 pool_connections=DEFAULT_POOL_CONNECTIONS,
+                 pool_maxsize=DEFAULT_POOL_MAXSIZE, pool_block=False,
+                 max_retries=DEFAULT_MAX_RETRIES, socket_options=None,
+                 cookie_save_delay=DEFAULT_COOKIE_SAVE_DELAY):
         super(SessionStore, self).__init__()
         self.session_base_url = '{0}/api/session'.format(endpoint.strip('/'))
         self.reauthenticate = reauthenticate
@@ -138,18 +325,19 @@ class SessionStore(requests.Session):
         self.login_params = login_params
         self.authn_header = authn_header
         self._debug = debug
+        self._login_lock = threading.Lock()
+        self.auth_generation = 0
+        self._cookie_saver = None
+        adapter = PoolAdapter(socket_options=socket_options,
+                              pool_connections=pool_connections,
+                              pool_maxsize=pool_maxsize,
+                              pool_block=pool_block,
+                              max_retries=max_retries)
+        self.mount('https://', adapter)
+        self.mount('http://', adapter)
         if persist_cookie:
-            if cookie_file is None:
-                cookie_file = DEFAULT_COOKIE_FILE
-            cookie_dir = os.path.dirname(cookie_file)
-            self.cookies = MozillaCookieJar(cookie_file)
-            # Create the $HOME/.nuvla dir if it doesn't exist
-            if not os.path.isdir(cookie_dir):
-                os.mkdir(cookie_dir, stat.S_IRUSR | stat.S_IWUSR | stat.S_IXUSR)
-            # Load existing cookies if the cookies.txt exists
-            if os.path.isfile(cookie_file):
-                self.cookies.load(ignore_discard=True)
-                self.cookies.clear_expired_cookies()
+            self.cookies = load_cookie_jar(cookie_file)
+            self._cookie_saver = CookieSaver(self.cookies, cookie_save_delay)
 
     def need_to_login(self, accessed_url, status_code):
         return self.reauthenticate \
@@ -165,22 +353,31 @@ class SessionStore(requests.Session):
         return super(SessionStore, self).request(*args, **kwargs)
 
     def request(self, *args, **kwargs):
+        login_generation = self.auth_generation
         response = self._request(*args, **kwargs)
 
         if not self.verify and response.cookies:
             self._unsecure_cookie(args[1], response)
         if self.persist_cookie and 'Set-Cookie' in response.headers:
-            self.cookies.save(ignore_discard=True)
+            self._cookie_saver.schedule()
 
         url = args[1]
         if self.need_to_login(url, response.status_code):
-            login_response = self.cimi_login(self.login_params)
-            if login_response is not None and login_response.status_code == 201:
+            if self._reauthenticate(login_generation):
                 # retry the call after reauthentication
                 response = self._request(*args, **kwargs)
+                response.reauthenticated = True
 
         return response
 
+    def _reauthenticate(self, login_generation) -> bool:
+        with self._login_lock:
+            if login_generation != self.auth_generation:
+                # Another thread logged in since the request was sent.
+                return True
+            login_response = self.cimi_login(self.login_params)
+            return login_response is not None and login_response.status_code == 201
+
     def cimi_login(self, login_params):
         self.login_params = login_params
         if self.login_params:
@@ -194,6 +391,8 @@ class SessionStore(requests.Session):
             response = self.request(method, endpoint, headers=headers, json=json)
             if self._debug:
                 _response_debug(response)
+            if response.status_code == 201:
+                self.auth_generation += 1
             return response
         else:
             return None
@@ -210,10 +409,20 @@ class SessionStore(requests.Session):
         try:
             self.cookies.clear(domain)
             if self.persist_cookie:
+                self._cookie_saver.flush()
                 self.cookies.save()
         except KeyError:
             pass
 
+    def flush_cookies(self):
+        """Saves the cookies now if a save is pending."""
+        if self._cookie_saver is not None:
+            self._cookie_saver.flush()
+
+    def close(self):
+        self.flush_cookies()
+        super(SessionStore, self).close()
+
 
 def to_login_params(creds):
     """
@@ -232,27 +441,78 @@ def to_login_params(creds):
 
 
 class Api(object):
-    """ This class is a Python wrapper&helper of the native Nuvla REST API"""
+    """ This class is a Python wrapper&helper of the native Nuvla REST API
+
+    An instance can be shared by several threads. Requests run in parallel over
+    the connection pool (see `pool_maxsize`), cookies are persisted atomically
+    and at most once every `cookie_save_delay` seconds, and when several
+    threads need to reauthenticate at the same time a single login is made.
+    Login, logout and changes of the client attributes are not synchronized
+    with in-flight requests.
+    """
 
     def __init__(self, endpoint=DEFAULT_ENDPOINT, insecure=False, persist_cookie=True,
                  cookie_file=None, reauthenticate=False, login_creds=None, authn_header=None,
-                 debug=False, compress=False):
+                 debug=False, compress=False, pool_connections=DEFAULT_POOL_CONNECTIONS,
+                 pool_maxsize=DEFAULT_POOL_MAXSIZE, pool_block=False,
+                 max_retries=DEFAULT_MAX_RETRIES, keep_alive=True, socket_options=None,
+                 cookie_save_delay=DEFAULT_COOKIE_SAVE_DELAY, json_codec=None,
+                 compress_min_size=DEFAULT_COMPRESS_MIN_SIZE,
+                 compress_level=DEFAULT_COMPRESS_LEVEL, compress_stream_threshold=None,
+                 cache_ttl=None, cache_size=DEFAULT_CACHE_SIZE, coalesce=False,
+                 request_hooks: Optional[Iterable[RequestHook]] = None):
         """
         :param endpoint: Nuvla endpoint (https://nuvla.io).
         :param insecure: Don't check server certificate or you are using a http connection.
         The http option is strongly unrecommanded.
-        :param persist_cookie: Use file to persist cookies.
+        :param persist_cookie: Use file to persist cookies. When False cookies are only kept in
+        memory, which is recommended for high volume workers.
         :param cookie_file: Allow to specify cookie jar file path.
         :param reauthenticate: Reauthenticate in case of requests failures with status code 401 or 403.
         :param login_creds: {'username': '', 'password': ''} or {'key': '', 'secret': ''}
         :param authn_header: String containing list of claims for authentication header
         :param compress: Compress json data sent to the server. Needs to be supported by the server.
+        :param compress_min_size: Minimum size in bytes of the json data to compress.
+        :param compress_level: Gzip compression level (1 fastest - 9 smallest).
+        :param compress_stream_threshold: Size in bytes from which json data is compressed on
+        the fly while being sent (chunked transfer encoding). Disabled by default.
+        :param pool_connections: Number of per host connection pools to cache.
+        :param pool_maxsize: Maximum number of connections kept open per host. Should be at least
+        the number of threads sharing this client.
+        :param pool_block: Block when no connection is available in the pool instead of opening
+        a connection that is discarded after use.
+        :param max_retries: Number of retries or urllib3 Retry strategy. Defaults to retrying
+        failed connection attempts only.
+        :param keep_alive: Enable TCP keep-alive probes on the pooled connections.
+        :param socket_options: urllib3 socket options. Overrides `keep_alive`.
+        :param cookie_save_delay: Seconds during which cookie changes are accumulated before
+        being saved to the cookie file in the background. 0 to save synchronously.
+        :param json_codec: Object with `dumps(obj) -> bytes` and `loads(bytes)` methods used for
+        request and response bodies. Defaults to the fastest available (see util.codec).
+        :param cache_ttl: Enable the cache of the resources retrieved with get(). Seconds during
+        which a cached resource is served without contacting the server. Resources edited,
+        deleted or operated through this client are evicted.
+        :param cache_size: Maximum number of resources in the cache (least recently used ones
+        are evicted).
+        :param coalesce: Concurrent identical get() and search() calls (same resource, parameters
+        and authentication) share a single request to the server and its result. The shared
+        results must then be treated as read-only.
+        :param request_hooks: Functions called with a metrics.RequestEvent after each request
+        (see add_request_hook()).
         """
         self.endpoint = endpoint.strip('/')
+        if socket_options is None and keep_alive:
+            socket_options = keep_alive_socket_options()
         self.session = SessionStore(endpoint, persist_cookie, cookie_file, reauthenticate,
                                     login_params=to_login_params(login_creds),
                                     authn_header=authn_header,
-                                    debug=debug)
+                                    debug=debug,
+                                    pool_connections=pool_connections,
+                                    pool_maxsize=pool_maxsize,
+                                    pool_block=pool_block,
+                                    max_retries=max_retries,
+                                    socket_options=socket_options,
+                                    cookie_save_delay=cookie_save_delay)
         self.session.verify = not insecure
         if insecure:
             try:
@@ -264,8 +524,78 @@ class Api(object):
                     urllib3.exceptions.InsecureRequestWarning)
         self._username = None
         self._cimi_cloud_entry_point = None
+        self._collection_hrefs = {}
         self._debug = debug
-        self._compress = compress
+        self._compressor = Compressor(compress_min_size, compress_level,
+                                      compress_stream_threshold) if compress else None
+        self._json_codec = json_codec or default_codec()
+        self._cache = ResourceCache(cache_ttl, cache_size) if cache_ttl is not None else None
+        self._single_flight = SingleFlight() if coalesce else None
+        self._request_hooks = tuple(request_hooks or ())
+
+    def close(self):
+        """Saves pending cookies and closes the pooled connections."""
+        self.session.close()
+
+    @property
+    def compression_stats(self) -> Optional[CompressionCounters]:
+        """Totals of the request body compression (None if compression is disabled).
+        Statistics of the last request of the current thread are available with
+        `api.compressor.last_stats`.
+        """
+        return self._compressor.counters if self._compressor else None
+
+    @property
+    def compressor(self) -> Optional[Compressor]:
+        return self._compressor
+
+    @property
+    def cache(self) -> Optional[ResourceCache]:
+        """Resource cache (None if disabled). See `cache.stats()` for the hit/miss counters."""
+        return self._cache
+
+    @property
+    def single_flight(self) -> Optional[SingleFlight]:
+        """Request coalescing (None if disabled). See `single_flight.stats()`."""
+        return self._single_flight
+
+    def add_request_hook(self, hook: RequestHook):
+        """Registers `hook` to be called, in the thread which made the request, with
+        the metrics.RequestEvent of each request sent to the server (e.g. a
+        metrics.MetricsCollector). Exceptions raised by hooks are logged and ignored.
+        """
+        self._request_hooks += (hook,)
+
+    def remove_request_hook(self, hook: RequestHook):
+        self._request_hooks = tuple(h for h in self._request_hooks if h is not hook)
+
+    def _request_event(self, method, uri, response, latency, compressed, error=None):
+        request_bytes = response_bytes = retries = reauthentications = 0
+        status = compression_ratio = None
+        if compressed:
+            stats = self._compressor.last_stats
+            request_bytes = stats.sent_size
+            compression_ratio = stats.ratio
+        if response is not None:
+            status = response.status_code
+            if not compressed:
+                body = response.request.body
+                request_bytes = len(body) if isinstance(body, (bytes, str)) else 0
+            response_bytes = len(response.content)
+            history = getattr(getattr(response.raw, 'retries', None), 'history', None)
+            retries = len(history) if history else 0
+            reauthentications = 1 if getattr(response, 'reauthenticated', False) else 0
+        return RequestEvent(method, uri, status, latency, request_bytes, response_bytes,
+                            compression_ratio, retries, reauthentications, error)
+
+    def _coalesced(self, key: tuple, fn):
+        """Calls `fn`, which returns a JSON body, sharing the body with the
+        concurrent calls with the same `key` if coalescing is enabled. Returns
+        the body decoded for each caller, so that callers can modify it."""
+        if self._single_flight is None:
+            return self._json_codec.loads(fn())
+        auth = (self.session.auth_generation, self.session.authn_header)
+        return self._json_codec.loads(self._single_flight.do(key + auth, fn))
 
     def login(self, login_params):
         """Uses given 'login_params' to log into the Nuvla server. The
@@ -333,6 +663,7 @@ class Api(object):
         if session_id is not None:
             self._cimi_delete(session_id)
         self.session.login_params = None
+        self.session.auth_generation += 1
         self._username = None
 
     def current_session(self) -> Union[None, str]:
@@ -361,6 +692,19 @@ class Api(object):
             self._cimi_cloud_entry_point = self._cimi_get_cloud_entry_point()
         return self._cimi_cloud_entry_point
 
+    def _collection_href(self, resource_type) -> str:
+        """Returns the href of the `resource_type` collection. It is resolved from
+        the cloud entry point, falling back to a search on the collection, and
+        memoized for the lifetime of the client.
+        """
+        href = self._collection_hrefs.get(resource_type)
+        if href is None:
+            href = self.cloud_entry_point.collections.get(resource_type)
+            if href is None:
+                href = self.search(resource_type=resource_type, last=0).id
+            self._collection_hrefs[resource_type] = href
+        return href
+
     @staticmethod
     def _cimi_find_operation_href(cimi_resource: CimiResource, operation: str):
         operation_href = cimi_resource.operations.get(operation, {}).get('href')
@@ -381,6 +725,32 @@ class Api(object):
         return resource_type or resource_id
 
     def _cimi_request(self, method, uri, params=None, json=None, data=None, headers=None):
+        response = self._cimi_response(method, uri, params=params, json=json, data=data,
+                                       headers=headers)
+        return self._json_codec.loads(response.content)
+
+    def _send(self, method, uri, endpoint, headers, params, body, compressed):
+        hooks = self._request_hooks
+        start = time.perf_counter() if hooks else None
+        try:
+            response = self.session.request(method, endpoint,
+                                            headers=headers,
+                                            allow_redirects=False,
+                                            params=params,
+                                            data=body)
+        except Exception as ex:
+            if hooks:
+                call_hooks(hooks, self._request_event(method, uri, None,
+                                                      time.perf_counter() - start,
+                                                      compressed, ex))
+            raise
+        if hooks:
+            call_hooks(hooks, self._request_event(method, uri, response,
+                                                  time.perf_counter() - start,
+                                                  compressed))
+        return response
+
+    def _cimi_response(self, method, uri, params=None, json=None, data=None, headers=None):
         _headers = {'Accept': APPLICATION_JSON,
                     'Accept-Encoding': 'gzip'}
 
@@ -388,7 +758,7 @@ class Api(object):
             logger.warning('_cimi_request: Both "json" and "data" arguments provided. '
                            'This is unsupported and can cause unexpected behaviour.')
 
-        if json:
+        if json is not None:
             _headers['Content-Type'] = APPLICATION_JSON
 
         if headers:
@@ -396,31 +766,35 @@ class Api(object):
 
         endpoint = '{0}/{1}/{2}'.format(self.endpoint, 'api', uri)
 
-        if self._compress and json is not None:
-            data_to_compress = bytes(jsonlib.dumps(json), 'utf-8')
-            data_compressed = gzip.compress(data_to_compress)
-
-            compression_ratio = len(data_to_compress) / len(data_compressed)
-            logger.debug(f'_cimi_request: Request data compression ratio: {compression_ratio:.2f} '
-                        f'({len(data_to_compress)}/{len(data_compressed)} bytes)')
-
-            if compression_ratio > 1:
-                json = None
-                data = data_compressed
-                _headers['Content-Encoding'] = 'gzip'
-            else:
-                logger.debug('_cimi_request: Compressed data bigger than uncompressed data. '
-                            'Sending uncompressed data.')
+        body = data
+        compressed = False
+        if json is not None:
+            # Serialized once; the same bytes are compressed and/or sent.
+            body = self._json_codec.dumps(json)
+            if self._compressor is not None:
+                data_compressed = self._compressor.compress(body)
+                if data_compressed is not None:
+                    body = data_compressed
+                    compressed = True
+                    _headers['Content-Encoding'] = 'gzip'
 
         if self._debug and uri != CLOUD_ENTRY_POINT_ID:
             _request_debug(method, endpoint, params, json, data, _headers)
 
-        response = self.session.request(method, endpoint,
-                                        headers=_headers,
-                                        allow_redirects=False,
-                                        params=params,
-                                        json=json,
-                                        data=data)
+        tracer = tracing.get_tracer()
+        if tracer is None:
+            response = self._send(method, uri, endpoint, _headers, params, body, compressed)
+        else:
+            with tracer.start_as_current_span(
+                    '{0} {1}'.format(method, uri_template(uri)),
+                    attributes={'http.request.method': method,
+                                'url.full': endpoint,
+                                'nuvla.resource_type': uri.split('/', 1)[0]}) as span:
+                response = self._send(method, uri, endpoint, _headers, params, body,
+                                      compressed)
+                span.set_attribute('http.response.status_code', response.status_code)
+                if getattr(response, 'reauthenticated', False):
+                    span.set_attribute('nuvla.reauthenticated', True)
 
         if self._debug and uri != CLOUD_ENTRY_POINT_ID:
             _response_debug(response)
@@ -428,11 +802,7 @@ class Api(object):
             response.raise_for_status()
         except HTTPError as e:
             try:
-                json_msg = e.response.json()
-                message = json_msg.get('message')
-                if message is None:
-                    error = json_msg.get('error')
-                    message = error.get('code') + ' - ' + error.get('reason')
+                message = error_message(e.response.json())
             except:
                 try:
                     message = e.response.text
@@ -440,11 +810,12 @@ class Api(object):
                     message = str(e)
             raise NuvlaError(message, response)
 
-        return response.json()
+        return response
 
     def _cimi_get(self, resource_id=None, resource_type=None, params=None):
         uri = self._cimi_get_uri(resource_id, resource_type)
-        return self._cimi_request('GET', uri, params=params)
+        return self._coalesced(('GET',) + cache_key(uri, params),
+                               lambda: self._cimi_response('GET', uri, params=params).content)
 
     def _cimi_post(self, resource_id=None, resource_type=None, params=None, json=None, data=None):
         uri = self._cimi_get_uri(resource_id, resource_type)
@@ -457,18 +828,61 @@ class Api(object):
     def _cimi_delete(self, resource_id=None):
         return self._cimi_request('DELETE', resource_id)
 
-    def get(self, resource_id, **kwargs) -> CimiResource:
+    def _cached_get(self, resource_id, params) -> bytes:
+        # Body of the resource, from the cache if fresh (or revalidated).
+        key = cache_key(resource_id, params)
+        generation = self._cache.generation(resource_id)
+        entry = self._cache.lookup(key)
+        headers = None
+        if entry is not None:
+            if entry.fresh:
+                self._cache.record(hit=True)
+                return entry.content
+            if entry.etag:
+                headers = {'If-None-Match': entry.etag}
+            elif entry.updated:
+                current = self._cimi_get(resource_id=resource_id,
+                                         params={'select': 'updated'})
+                if current.get('updated') == entry.updated:
+                    self._cache.refresh(entry)
+                    self._cache.record(hit=True, revalidated=True)
+                    return entry.content
+        response = self._cimi_response('GET', resource_id, params=params, headers=headers)
+        if response.status_code == 304 and entry is not None:
+            self._cache.refresh(entry)
+            self._cache.record(hit=True, revalidated=True)
+            return entry.content
+        self._cache.record(hit=False)
+        etag = response.headers.get('ETag')
+        # The `updated` attribute is only needed to revalidate without ETag.
+        updated = None if etag else self._json_codec.loads(response.content).get('updated')
+        self._cache.put(key, response.content, etag, updated, generation)
+        return response.content
+
+    def _invalidate(self, resource_id):
+        if self._cache is not None:
+            self._cache.invalidate(resource_id)
+
+    def get(self, resource_id, use_cache=True, **kwargs) -> CimiResource:
         """ Retreive a CIMI resource by it's resource id
 
         :param      resource_id: The id of the resource to retrieve
         :type       resource_id: str
 
+        :param      use_cache: Serve the resource from the client cache, if enabled (see
+                    `cache_ttl`). Expired entries are revalidated with the server.
+        :type       use_cache: bool
+
         :keyword    select: Select attributes to return. (resource-type always returned)
         :type       select: str or list of str
 
         :return:    A CimiResource object corresponding to the resource
         :rtype:     CimiResource
         """
+        if self._cache is not None and use_cache:
+            return CimiResource(self._coalesced(
+                ('CACHED-GET',) + cache_key(resource_id, kwargs),
+                lambda: self._cached_get(resource_id, kwargs)))
         resp_json = self._cimi_get(resource_id=resource_id, params=kwargs)
         return CimiResource(resp_json)
 
@@ -488,7 +902,9 @@ class Api(object):
         :return:    A CimiResource object
         :rtype:     CimiResource
         """
-        return CimiResource(self._cimi_put(resource_id=resource_id, json=data, params=kwargs))
+        resource = CimiResource(self._cimi_put(resource_id=resource_id, json=data, params=kwargs))
+        self._invalidate(resource_id)
+        return resource
 
     def edit_patch(self, resource_id, data, **kwargs) -> CimiResource:
         """ Edit a CIMI resource by it's resource id with JSON Patch format (RFC 6902)
@@ -506,21 +922,75 @@ class Api(object):
         :return:    A CimiResource object
         :rtype:     CimiResource
         """
-        return CimiResource(self._cimi_put(resource_id=resource_id, json=data, params=kwargs,
-                                           headers={'content-type': 'application/json-patch+json'}))
+        resource = CimiResource(self._cimi_put(resource_id=resource_id, json=data, params=kwargs,
+                                               headers={'content-type': 'application/json-patch+json'}))
+        self._invalidate(resource_id)
+        return resource
 
-    def delete(self, resource_id) -> CimiResponse:
+    def delete(self, resource_id, prefetch=True) -> CimiResponse:
         """ Delete a CIMI resource by it's resource id
 
         :param  resource_id: The id of the resource to delete
         :type   resource_id: str
 
+        :param  prefetch: Retrieve the resource before deleting it. When False, the
+                DELETE is issued directly by id.
+        :type   prefetch: bool
+
         :return:    A CimiResponse object which should contain the attributes 'status', 'resource-id' and 'message'
         :rtype:     CimiResponse
 
         """
-        resource = self.get(resource_id=resource_id)
-        return CimiResponse(self._cimi_delete(resource_id=resource.id))
+        if prefetch:
+            resource_id = self.get(resource_id=resource_id, use_cache=False).id
+        response = CimiResponse(self._cimi_delete(resource_id=resource_id))
+        self._invalidate(resource_id)
+        return response
+
+    def delete_many(self, resource_ids: Iterable[str], concurrency=DEFAULT_CONCURRENCY) \
+            -> Dict[str, Union[CimiResponse, Exception]]:
+        """ Delete CIMI resources by their resource ids. The deletions are done
+        directly by id (no prefetch) with up to `concurrency` requests in parallel.
+
+        :param  resource_ids: The ids of the resources to delete
+        :type   resource_ids: iterable of str
+
+        :param  concurrency: Maximum number of parallel requests
+        :type   concurrency: int
+
+        :return:    A dict, in the order of `resource_ids`, mapping each id to its
+                    CimiResponse or to the exception raised while deleting it.
+        :rtype:     dict
+        """
+        def delete(resource_id):
+            try:
+                return self.delete(resource_id, prefetch=False)
+            except Exception as ex:
+                return ex
+
+        resource_ids = list(resource_ids)
+        with ThreadPoolExecutor(max_workers=concurrency,
+                                thread_name_prefix='nuvla-delete') as executor:
+            return dict(zip(resource_ids, executor.map(tracing.in_current_context(delete),
+                                                       resource_ids)))
+
+    def batch(self, concurrency=DEFAULT_CONCURRENCY) -> Batch:
+        """ Returns a Batch running the calls queued in it with up to `concurrency`
+        requests in parallel over the pooled session (see `pool_maxsize`).
+
+            with api.batch(concurrency=8) as batch:
+                batch.edit('data-record/1', {'name': 'a'})
+                data_record = batch.proxy(DataRecord(api))
+                data_record.create({...}, infra_service_id)
+            results = batch.results()
+
+        :param  concurrency: Maximum number of parallel calls
+        :type   concurrency: int
+
+        :return:    A Batch, to be used as a context manager
+        :rtype:     Batch
+        """
+        return Batch(self, concurrency)
 
     def delete_bulk(self, resource_type, filter, **kwargs) -> CimiResponse:
         """ Bulk delete CIMI resources of the given type (Collection).
@@ -537,9 +1007,12 @@ class Api(object):
         if not isinstance(filter, str) or len(filter) == 0:
             raise NuvlaError("'filter' must be a non-empty string.")
         else:
-            return CimiResponse(
+            response = CimiResponse(
                 self._cimi_request('DELETE', resource_type,
                                    data={'filter': filter}, headers={'bulk': 'yes'}))
+            if self._cache is not None:
+                self._cache.invalidate_collection(resource_type)
+            return response
 
     def operation_bulk(self, resource_type, filter, operation, data=None) -> CimiResponse:
         """ Bulk delete CIMI resources of the given type (Collection).
@@ -561,9 +1034,12 @@ class Api(object):
         else:
             data_with_filter = copy.deepcopy(data)
             data_with_filter['filter'] = filter
-            return CimiResponse(
+            response = CimiResponse(
                 self._cimi_request('PATCH', '{0}/{1}'.format(resource_type, operation),
                                    json=data_with_filter, headers={'bulk': 'yes'}))
+            if self._cache is not None:
+                self._cache.invalidate_collection(resource_type)
+            return response
 
     def add(self, resource_type, data):
         """ Add a CIMI resource to the specified resource_type (Collection)
@@ -577,8 +1053,8 @@ class Api(object):
         :return:    A CimiResponse object which should contain the attributes 'status', 'resource-id' and 'message'
         :rtype:     CimiResponse
         """
-        collection = self.search(resource_type=resource_type, last=0)
-        return CimiResponse(self._cimi_post(resource_id=collection.id, json=data))
+        return CimiResponse(self._cimi_post(resource_id=self._collection_href(resource_type),
+                                            json=data))
 
     def search(self, resource_type, **kwargs) -> CimiCollection:
         """ Search for CIMI resources of the given type (Collection).
@@ -611,9 +1087,79 @@ class Api(object):
                     as a generator with the method 'resources()' or with the attribute 'resources_list'
         :rtype:     CimiCollection
         """
-        resp_json = self._cimi_put(resource_type=resource_type, data=kwargs)
+        resp_json = self._coalesced(
+            ('SEARCH',) + cache_key(resource_type, kwargs),
+            lambda: self._cimi_response('PUT', resource_type, data=kwargs).content)
         return CimiCollection(resp_json)
 
+    def search_iter(self, resource_type, page_size=DEFAULT_PAGE_SIZE, prefetch=True,
+                    **kwargs) -> Iterator[CimiResource]:
+        """ Lazily iterate over all the CIMI resources of the given type (Collection)
+        matching the search. The collection is walked with consecutive `first`/`last`
+        windows of `page_size` resources. While a page is consumed, the next one is
+        fetched in the background. At most two pages are held in memory.
+
+        Use a stable `orderby` (e.g. 'created:asc') if the collection can change
+        during the iteration.
+
+        :param      resource_type: Type of the resource (Collection name)
+        :type       resource_type: str
+
+        :param      page_size: Number of resources requested per page
+        :type       page_size: int
+
+        :param      prefetch: Fetch the next page while the current one is consumed
+        :type       prefetch: bool
+
+        :keyword    filter, select, orderby, ...: See search(). 'first' and 'last'
+                    are managed by the iterator and can't be provided.
+
+        :return:    A generator of CimiResource objects
+        :rtype:     Iterator[CimiResource]
+        """
+        if page_size < 1:
+            raise ValueError("'page_size' must be a positive integer.")
+        if 'first' in kwargs or 'last' in kwargs:
+            raise TypeError("'first' and 'last' are managed by search_iter().")
+
+        def fetch_page(first):
+            return self.search(resource_type, first=first,
+                               last=first + page_size - 1, **kwargs)
+
+        def has_next_page(collection, next_first):
+            if len(collection.data.get('resources', [])) < page_size:
+                return False
+            return collection.count is None or next_first <= collection.count
+
+        if not prefetch:
+            first = 1
+            while True:
+                collection = fetch_page(first)
+                first += page_size
+                yield from collection
+                if not has_next_page(collection, first):
+                    return
+
+        executor = ThreadPoolExecutor(max_workers=1,
+                                      thread_name_prefix='nuvla-search-iter')
+        fetch_page = tracing.in_current_context(fetch_page)
+        future = executor.submit(fetch_page, 1)
+        first = 1
+        try:
+            while future is not None:
+                collection = future.result()
+                first += page_size
+                if has_next_page(collection, first):
+                    future = executor.submit(fetch_page, first)
+                else:
+                    future = None
+                yield from collection
+                del collection
+        finally:
+            if future is not None:
+                future.cancel()
+            executor.shutdown(wait=False)
+
     def operation(self, resource: CimiResource, operation, data=None) -> CimiResponse:
         """ Execute an operation on a CIMI resource
 
@@ -631,6 +1177,7 @@ class Api(object):
         """
         operation_href = f'{resource.id}/{operation}'
         resp_json = self._cimi_post(operation_href, json=data)
+        self._invalidate(resource.id)
         return CimiResponse(resp_json)
 
     def hook(self, operation, data=None) -> CimiResponse:
@@ -0,0 +1,574 @@
+# -*- coding: utf-8 -*-
+
+"""
+ Asyncio flavour of the Nuvla API wrapper.
+
+ Requires the optional `aiohttp` dependency::
+
+   $ pip install 'nuvla-api[async]'
+
+
+ Usage
+ -----
+ ::
+
+    import asyncio
+    from nuvla.api import AsyncApi
+
+    async def main():
+        async with AsyncApi('https://nuvla.io') as api:
+            await api.login_password('username', 'password')
+            deployments = await asyncio.gather(
+                *[api.get(dpl_id) for dpl_id in dpl_ids])
+
+    asyncio.run(main())
+
+ A single `AsyncApi` instance multiplexes all requests issued from one event
+ loop over a pool of keep-alive connections.
+"""
+
+import asyncio
+import copy
+import email.message
+import json as jsonlib
+import logging
+import urllib.request
+from http.cookiejar import CookieJar
+from typing import AsyncIterator, Dict, Iterable, Optional, Union
+from urllib.parse import urlencode, urlparse
+
+try:
+    import aiohttp
+except ImportError:  # pragma: no cover
+    aiohttp = None
+
+from .api import (APPLICATION_JSON, CLOUD_ENTRY_POINT_ID, DEFAULT_COMPRESS_LEVEL,
+                  DEFAULT_COMPRESS_MIN_SIZE, DEFAULT_CONCURRENCY, DEFAULT_COOKIE_SAVE_DELAY, DEFAULT_ENDPOINT, DEFAULT_PAGE_SIZE,
+                  DEFAULT_TIMEOUT, NuvlaError, Api, CookieSaver, _request_debug,
+                  _response_debug, error_message, load_cookie_jar,
+                  to_login_params)
+from .models import CimiResource, CimiCollection, CimiResponse, CloudEntryPoint
+from .util.codec import default_codec
+from .util.compression import Compressor
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CONNECTIONS_LIMIT = 100
+DEFAULT_KEEPALIVE_TIMEOUT = 15
+
+
+def _form_pairs(data: Optional[dict]) -> list:
+    """Flattens `data` into a list of key/value pairs the same way `requests`
+    does for form and query parameters: None values are dropped and lists
+    are expanded into repeated keys.
+    """
+    pairs = []
+    for k, v in (data or {}).items():
+        if v is None:
+            continue
+        if isinstance(v, (list, tuple)):
+            pairs.extend((k, str(x)) for x in v)
+        else:
+            pairs.append((k, str(v)))
+    return pairs
+
+
+async def _async_chunks(chunks):
+    for chunk in chunks:
+        yield chunk
+
+
+class _CookieResponse(object):
+    """Adapts response headers to the interface expected by http.cookiejar."""
+
+    def __init__(self, headers):
+        self._msg = email.message.Message()
+        for v in headers.getall('Set-Cookie', []):
+            self._msg['Set-Cookie'] = v
+
+    def info(self):
+        return self._msg
+
+
+class AsyncResponse(object):
+    """Fully read HTTP response. Exposes the subset of `requests.Response`
+    used by the library and its callers."""
+
+    def __init__(self, url, status_code, reason, headers, content: bytes):
+        self.url = url
+        self.status_code = status_code
+        self.reason = reason
+        self.headers = headers
+        self.content = content
+
+    @property
+    def ok(self) -> bool:
+        return self.status_code < 400
+
+    @property
+    def text(self) -> str:
+        return self.content.decode('utf-8', errors='replace')
+
+    def json(self):
+        return jsonlib.loads(self.content)
+
+
+class AsyncSessionStore(object):
+    """Asyncio counterpart of `SessionStore`: a pooled `aiohttp` session
+    sharing the cookie jar format and reauthentication rules of the blocking
+    client. When concurrent requests fail with 401/403, only one login
+    request is made. `auth_generation` is incremented each time the
+    authentication changes (login, logout)."""
+
+    def __init__(self, endpoint, persist_cookie, cookie_file, reauthenticate,
+                 login_params, authn_header=None, debug=False, verify=True,
+                 limit=DEFAULT_CONNECTIONS_LIMIT, limit_per_host=0,
+                 keepalive_timeout=DEFAULT_KEEPALIVE_TIMEOUT,
+                 cookie_save_delay=DEFAULT_COOKIE_SAVE_DELAY):
+        if aiohttp is None:
+            raise ImportError("AsyncApi requires 'aiohttp'. "
+                              "Install it with: pip install 'nuvla-api[async]'")
+        self.session_base_url = '{0}/api/session'.format(endpoint.strip('/'))
+        self.reauthenticate = reauthenticate
+        self.persist_cookie = persist_cookie
+        self.login_params = login_params
+        self.authn_header = authn_header
+        self.verify = verify
+        self._debug = debug
+        self._limit = limit
+        self._limit_per_host = limit_per_host
+        self._keepalive_timeout = keepalive_timeout
+        self._session = None
+        self._login_lock = None
+        self._login_loop = None
+        self.auth_generation = 0
+        self._cookie_saver = None
+        if persist_cookie:
+            self.cookies = load_cookie_jar(cookie_file)
+            self._cookie_saver = CookieSaver(self.cookies, cookie_save_delay)
+        else:
+            self.cookies = CookieJar()
+
+    def _client_session(self):
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self._limit,
+                limit_per_host=self._limit_per_host,
+                keepalive_timeout=self._keepalive_timeout,
+                ssl=None if self.verify else False)
+            # Cookies are handled by self.cookies to keep the same jar
+            # (and file format) as the blocking client.
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                cookie_jar=aiohttp.DummyCookieJar(),
+                timeout=aiohttp.ClientTimeout(total=DEFAULT_TIMEOUT))
+        return self._session
+
+    def _login_lock_of_loop(self):
+        # Created in the running loop, like the client session: an
+        # asyncio.Lock is bound to the loop current at its creation on
+        # Python < 3.10, or else to the first loop using it.
+        loop = asyncio.get_running_loop()
+        if self._login_lock is None or self._login_loop is not loop:
+            self._login_lock = asyncio.Lock()
+            self._login_loop = loop
+        return self._login_lock
+
+    async def close(self):
+        if self._cookie_saver is not None:
+            self._cookie_saver.flush()
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    def need_to_login(self, accessed_url, status_code):
+        return self.reauthenticate \
+               and status_code in [401, 403] \
+               and accessed_url != self.session_base_url
+
+    def _add_cookie_header(self, url, headers):
+        cookie_request = urllib.request.Request(url)
+        self.cookies.add_cookie_header(cookie_request)
+        cookie = cookie_request.get_header('Cookie')
+        if cookie:
+            headers['Cookie'] = cookie
+
+    def _extract_cookies(self, url, response_headers):
+        if 'Set-Cookie' not in response_headers:
+            return
+        cookie_request = urllib.request.Request(url)
+        cookies = self.cookies.make_cookies(_CookieResponse(response_headers),
+                                            cookie_request)
+        unsecure = not self.verify and urlparse(url).scheme == 'http'
+        for cookie in cookies:
+            if unsecure:
+                cookie.secure = False
+            self.cookies.set_cookie_if_ok(cookie, cookie_request)
+        if self.persist_cookie:
+            self._cookie_saver.schedule()
+
+    async def _request(self, method, url, params=None, data=None,
+                       headers=None) -> AsyncResponse:
+        headers = dict(headers or {})
+        if self.authn_header is not None:
+            headers['nuvla-authn-info'] = self.authn_header
+        self._add_cookie_header(url, headers)
+        if data is not None and not isinstance(data, (bytes, str)):
+            # Streamed body, iterated anew for each request.
+            data = _async_chunks(data)
+        async with self._client_session().request(
+                method, url, params=_form_pairs(params), data=data,
+                headers=headers, allow_redirects=False) as resp:
+            content = await resp.read()
+            response = AsyncResponse(str(resp.url), resp.status, resp.reason,
+                                     resp.headers, content)
+        self._extract_cookies(url, response.headers)
+        return response
+
+    async def request(self, method, url, params=None, data=None,
+                      headers=None) -> AsyncResponse:
+        login_generation = self.auth_generation
+        response = await self._request(method, url, params=params, data=data,
+                                       headers=headers)
+
+        if self.need_to_login(url, response.status_code):
+            if await self._reauthenticate(login_generation):
+                # retry the call after reauthentication
+                response = await self._request(method, url, params=params,
+                                               data=data, headers=headers)
+
+        return response
+
+    async def _reauthenticate(self, login_generation) -> bool:
+        async with self._login_lock_of_loop():
+            if login_generation != self.auth_generation:
+                # Another task logged in since the request was sent.
+                return True
+            login_response = await self.cimi_login(self.login_params)
+            return login_response is not None and login_response.status_code == 201
+
+    async def cimi_login(self, login_params):
+        self.login_params = login_params
+        if self.login_params:
+            method = 'POST'
+            endpoint = self.session_base_url
+            headers = {'Content-Type': APPLICATION_JSON,
+                       'Accept': APPLICATION_JSON}
+            json = {'template': login_params}
+            if self._debug:
+                _request_debug(method, endpoint, doc=json, headers=headers)
+            response = await self.request(method, endpoint, headers=headers,
+                                          data=bytes(jsonlib.dumps(json), 'utf-8'))
+            if self._debug:
+                _response_debug(response)
+            if response.status_code == 201:
+                self.auth_generation += 1
+            return response
+        else:
+            return None
+
+    def clear(self, domain):
+        """Clear cookies for the specified domain."""
+        try:
+            self.cookies.clear(domain)
+            if self.persist_cookie:
+                self._cookie_saver.flush()
+                self.cookies.save()
+        except KeyError:
+            pass
+
+
+class AsyncApi(object):
+    """Asyncio wrapper&helper of the native Nuvla REST API. Mirrors `Api`,
+    with every network bound method being a coroutine."""
+
+    def __init__(self, endpoint=DEFAULT_ENDPOINT, insecure=False, persist_cookie=True,
+                 cookie_file=None, reauthenticate=False, login_creds=None, authn_header=None,
+                 debug=False, compress=False, limit=DEFAULT_CONNECTIONS_LIMIT,
+                 limit_per_host=0, keepalive_timeout=DEFAULT_KEEPALIVE_TIMEOUT,
+                 cookie_save_delay=DEFAULT_COOKIE_SAVE_DELAY, json_codec=None,
+                 compress_min_size=DEFAULT_COMPRESS_MIN_SIZE,
+                 compress_level=DEFAULT_COMPRESS_LEVEL, compress_stream_threshold=None):
+        """
+        :param endpoint: Nuvla endpoint (https://nuvla.io).
+        :param insecure: Don't check server certificate or you are using a http connection.
+        The http option is strongly unrecommanded.
+        :param persist_cookie: Use file to persist cookies.
+        :param cookie_file: Allow to specify cookie jar file path.
+        :param reauthenticate: Reauthenticate in case of requests failures with status code 401 or 403.
+        :param login_creds: {'username': '', 'password': ''} or {'key': '', 'secret': ''}
+        :param authn_header: String containing list of claims for authentication header
+        :param compress: Compress json data sent to the server. Needs to be supported by the server.
+        :param compress_min_size: Minimum size in bytes of the json data to compress.
+        :param compress_level: Gzip compression level (1 fastest - 9 smallest).
+        :param compress_stream_threshold: Size in bytes from which json data is compressed on
+        the fly while being sent (chunked transfer encoding). Disabled by default.
+        :param limit: Maximum number of simultaneous connections in the pool (0 for no limit).
+        :param limit_per_host: Maximum number of simultaneous connections to the endpoint (0 for no limit).
+        :param keepalive_timeout: Seconds an idle connection is kept open for reuse.
+        :param cookie_save_delay: Seconds during which cookie changes are accumulated before
+        being saved to the cookie file in the background. 0 to save synchronously.
+        :param json_codec: Object with `dumps(obj) -> bytes` and `loads(bytes)` methods used for
+        request and response bodies. Defaults to the fastest available (see util.codec).
+        """
+        self.endpoint = endpoint.strip('/')
+        self.session = AsyncSessionStore(endpoint, persist_cookie, cookie_file, reauthenticate,
+                                         login_params=to_login_params(login_creds),
+                                         authn_header=authn_header,
+                                         debug=debug,
+                                         verify=not insecure,
+                                         limit=limit,
+                                         limit_per_host=limit_per_host,
+                                         keepalive_timeout=keepalive_timeout,
+                                         cookie_save_delay=cookie_save_delay)
+        self._username = None
+        self._cimi_cloud_entry_point = None
+        self._collection_hrefs = {}
+        self._debug = debug
+        self._compressor = Compressor(compress_min_size, compress_level,
+                                      compress_stream_threshold) if compress else None
+        self._json_codec = json_codec or default_codec()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def close(self):
+        """Closes the pooled connections."""
+        await self.session.close()
+
+    compression_stats = Api.compression_stats
+
+    compressor = Api.compressor
+
+    async def login(self, login_params):
+        """See Api.login()"""
+        return await self.session.cimi_login(login_params)
+
+    async def login_password(self, username, password):
+        """See Api.login_password()"""
+        self._username = username
+        return await self.login(to_login_params({'username': username,
+                                                 'password': password}))
+
+    async def login_apikey(self, key, secret):
+        """See Api.login_apikey()"""
+        return await self.login(to_login_params({'key': key,
+                                                 'secret': secret}))
+
+    async def logout(self):
+        """Logout user by deleting his session.
+        """
+        session_id = await self.current_session()
+        if session_id is not None:
+            await self._cimi_delete(session_id)
+        self.session.login_params = None
+        self.session.auth_generation += 1
+        self._username = None
+
+    async def current_session(self) -> Union[None, str]:
+        """See Api.current_session()"""
+        session = await self.search('session')
+        if session and session.count > 0:
+            return session.resources[0].id
+        else:
+            return None
+
+    async def is_authenticated(self) -> bool:
+        return await self.current_session() is not None
+
+    async def cloud_entry_point(self) -> CloudEntryPoint:
+        if self._cimi_cloud_entry_point is None:
+            cep_json = await self._cimi_get(CLOUD_ENTRY_POINT_ID)
+            self._cimi_cloud_entry_point = CloudEntryPoint(cep_json)
+        return self._cimi_cloud_entry_point
+
+    async def _collection_href(self, resource_type) -> str:
+        """See Api._collection_href()"""
+        href = self._collection_hrefs.get(resource_type)
+        if href is None:
+            cep = await self.cloud_entry_point()
+            href = cep.collections.get(resource_type)
+            if href is None:
+                href = (await self.search(resource_type=resource_type, last=0)).id
+            self._collection_hrefs[resource_type] = href
+        return href
+
+    _cimi_get_uri = Api._cimi_get_uri
+
+    async def _cimi_request(self, method, uri, params=None, json=None, data=None, headers=None):
+        _headers = {'Accept': APPLICATION_JSON,
+                    'Accept-Encoding': 'gzip'}
+
+        if json and data:
+            logger.warning('_cimi_request: Both "json" and "data" arguments provided. '
+                           'This is unsupported and can cause unexpected behaviour.')
+
+        if json is not None:
+            _headers['Content-Type'] = APPLICATION_JSON
+
+        if headers:
+            _headers.update(headers)
+
+        endpoint = '{0}/{1}/{2}'.format(self.endpoint, 'api', uri)
+
+        if self._debug and uri != CLOUD_ENTRY_POINT_ID:
+            _request_debug(method, endpoint, params, json, data, _headers)
+
+        if json is not None:
+            # Serialized once; the same bytes are compressed and/or sent.
+            body = self._json_codec.dumps(json)
+            if self._compressor is not None:
+                data_compressed = self._compressor.compress(body)
+                if data_compressed is not None:
+                    body = data_compressed
+                    _headers['Content-Encoding'] = 'gzip'
+        elif isinstance(data, dict):
+            body = urlencode(_form_pairs(data))
+            _headers.setdefault('Content-Type', 'application/x-www-form-urlencoded')
+        else:
+            body = data
+
+        response = await self.session.request(method, endpoint,
+                                              headers=_headers,
+                                              params=params,
+                                              data=body)
+
+        if self._debug and uri != CLOUD_ENTRY_POINT_ID:
+            _response_debug(response)
+
+        if response.status_code >= 400:
+            try:
+                message = error_message(response.json())
+            except:
+                message = response.text or '{0} {1}'.format(response.status_code,
+                                                            response.reason)
+            raise NuvlaError(message, response)
+
+        return self._json_codec.loads(response.content)
+
+    async def _cimi_get(self, resource_id=None, resource_type=None, params=None):
+        uri = self._cimi_get_uri(resource_id, resource_type)
+        return await self._cimi_request('GET', uri, params=params)
+
+    async def _cimi_post(self, resource_id=None, resource_type=None, params=None, json=None, data=None):
+        uri = self._cimi_get_uri(resource_id, resource_type)
+        return await self._cimi_request('POST', uri, params=params, json=json, data=data)
+
+    async def _cimi_put(self, resource_id=None, resource_type=None, params=None, json=None, data=None,
+                        headers=None):
+        uri = self._cimi_get_uri(resource_id, resource_type)
+        return await self._cimi_request('PUT', uri, params=params, json=json, data=data, headers=headers)
+
+    async def _cimi_delete(self, resource_id=None):
+        return await self._cimi_request('DELETE', resource_id)
+
+    async def get(self, resource_id, **kwargs) -> CimiResource:
+        """See Api.get()"""
+        resp_json = await self._cimi_get(resource_id=resource_id, params=kwargs)
+        return CimiResource(resp_json)
+
+    async def edit(self, resource_id, data, **kwargs) -> CimiResource:
+        """See Api.edit()"""
+        return CimiResource(await self._cimi_put(resource_id=resource_id, json=data, params=kwargs))
+
+    async def edit_patch(self, resource_id, data, **kwargs) -> CimiResource:
+        """See Api.edit_patch()"""
+        return CimiResource(await self._cimi_put(resource_id=resource_id, json=data, params=kwargs,
+                                                 headers={'content-type': 'application/json-patch+json'}))
+
+    async def delete(self, resource_id, prefetch=True) -> CimiResponse:
+        """See Api.delete()"""
+        if prefetch:
+            resource_id = (await self.get(resource_id=resource_id)).id
+        return CimiResponse(await self._cimi_delete(resource_id=resource_id))
+
+    async def delete_many(self, resource_ids: Iterable[str], concurrency=DEFAULT_CONCURRENCY) \
+            -> Dict[str, Union[CimiResponse, Exception]]:
+        """See Api.delete_many()"""
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def delete(resource_id):
+            async with semaphore:
+                try:
+                    return await self.delete(resource_id, prefetch=False)
+                except Exception as ex:
+                    return ex
+
+        resource_ids = list(resource_ids)
+        results = await asyncio.gather(*[delete(i) for i in resource_ids])
+        return dict(zip(resource_ids, results))
+
+    async def delete_bulk(self, resource_type, filter, **kwargs) -> CimiResponse:
+        """See Api.delete_bulk()"""
+        if not isinstance(filter, str) or len(filter) == 0:
+            raise NuvlaError("'filter' must be a non-empty string.")
+        else:
+            return CimiResponse(
+                await self._cimi_request('DELETE', resource_type,
+                                         data={'filter': filter}, headers={'bulk': 'yes'}))
+
+    async def operation_bulk(self, resource_type, filter, operation, data=None) -> CimiResponse:
+        """See Api.operation_bulk()"""
+        if not isinstance(filter, str) or len(filter) == 0:
+            raise NuvlaError("'filter' must be a non-empty string.")
+        else:
+            data_with_filter = copy.deepcopy(data)
+            data_with_filter['filter'] = filter
+            return CimiResponse(
+                await self._cimi_request('PATCH', '{0}/{1}'.format(resource_type, operation),
+                                         json=data_with_filter, headers={'bulk': 'yes'}))
+
+    async def add(self, resource_type, data) -> CimiResponse:
+        """See Api.add()"""
+        href = await self._collection_href(resource_type)
+        return CimiResponse(await self._cimi_post(resource_id=href, json=data))
+
+    async def search(self, resource_type, **kwargs) -> CimiCollection:
+        """See Api.search()"""
+        resp_json = await self._cimi_put(resource_type=resource_type, data=kwargs)
+        return CimiCollection(resp_json)
+
+    async def search_iter(self, resource_type, page_size=DEFAULT_PAGE_SIZE,
+                          **kwargs) -> AsyncIterator[CimiResource]:
+        """See Api.search_iter(). The next page is fetched in a background task."""
+        if page_size < 1:
+            raise ValueError("'page_size' must be a positive integer.")
+        if 'first' in kwargs or 'last' in kwargs:
+            raise TypeError("'first' and 'last' are managed by search_iter().")
+
+        def fetch_page(first):
+            return asyncio.ensure_future(
+                self.search(resource_type, first=first,
+                            last=first + page_size - 1, **kwargs))
+
+        task = fetch_page(1)
+        first = 1
+        try:
+            while task is not None:
+                collection = await task
+                first += page_size
+                if len(collection.data.get('resources', [])) == page_size \
+                        and (collection.count is None or first <= collection.count):
+                    task = fetch_page(first)
+                else:
+                    task = None
+                for resource in collection:
+                    yield resource
+                del collection
+        finally:
+            if task is not None:
+                task.cancel()
+
+    async def operation(self, resource: CimiResource, operation, data=None) -> CimiResponse:
+        """See Api.operation()"""
+        operation_href = f'{resource.id}/{operation}'
+        resp_json = await self._cimi_post(operation_href, json=data)
+        return CimiResponse(resp_json)
+
+    async def hook(self, operation, data=None) -> CimiResponse:
+        """See Api.hook()"""
+        resp_json = await self._cimi_post(f'hook/{operation}', json=data)
+        return CimiResponse(resp_json)
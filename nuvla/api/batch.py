@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import Callable, List
+
+from .tracing import in_current_context
+
+
+class Batch(object):
+    """Runs independent client calls in parallel, with at most `concurrency`
+    calls in flight, and collects their results in submission order.
+
+    Calls are queued with `submit()`, with the `Api` methods of the batch
+    (e.g. `batch.add(...)`) or through a `proxy()` of a resource helper, and
+    return futures. Use it as a context manager: leaving the block waits for
+    all the calls; if the block raises, the calls not started yet are
+    cancelled.
+
+        with api.batch(concurrency=8) as batch:
+            data_record = batch.proxy(DataRecord(api))
+            for doc in docs:
+                data_record.create(doc, infra_service_id)
+        ids = batch.results()
+    """
+
+    def __init__(self, api, concurrency: int):
+        self.api = api
+        self.concurrency = concurrency
+        self._executor = ThreadPoolExecutor(max_workers=concurrency,
+                                            thread_name_prefix='nuvla-batch')
+        self._futures = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is not None:
+            for future in self._futures:
+                future.cancel()
+        self.close()
+
+    def close(self):
+        """Waits for the queued calls and releases the worker threads."""
+        self._executor.shutdown(wait=True)
+
+    def submit(self, fn: Callable, *args, **kwargs) -> Future:
+        """Queues the call of `fn(*args, **kwargs)`. It runs in the context
+        (e.g. the current span) of the caller."""
+        future = self._executor.submit(in_current_context(fn), *args, **kwargs)
+        self._futures.append(future)
+        return future
+
+    def proxy(self, obj) -> '_BatchProxy':
+        """Returns a proxy of `obj` (e.g. a resource helper bound to the same
+        client) queuing the calls of its methods in this batch."""
+        return _BatchProxy(self, obj)
+
+    def __getattr__(self, name):
+        if name.startswith('_') or name == 'api':
+            raise AttributeError(name)
+        return getattr(self.proxy(self.api), name)
+
+    @property
+    def futures(self) -> List[Future]:
+        return list(self._futures)
+
+    def wait(self):
+        """Waits for all the queued calls to complete."""
+        wait(self._futures)
+
+    def results(self) -> list:
+        """Waits for all the queued calls and returns, in submission order,
+        their result or the exception they raised (None if cancelled)."""
+        self.wait()
+        return [_outcome(f) for f in self._futures]
+
+    def errors(self) -> dict:
+        """Waits for all the queued calls and returns a dict mapping the index
+        of each failed call to its exception."""
+        return {i: r for i, r in enumerate(self.results())
+                if isinstance(r, BaseException)}
+
+
+class _BatchProxy(object):
+
+    def __init__(self, batch: Batch, obj):
+        self._batch = batch
+        self._obj = obj
+
+    def __getattr__(self, name):
+        attr = getattr(self._obj, name)
+        if not callable(attr):
+            return attr
+
+        def submit(*args, **kwargs) -> Future:
+            return self._batch.submit(attr, *args, **kwargs)
+        submit.__name__ = name
+        submit.__doc__ = attr.__doc__
+        return submit
+
+
+def _outcome(future: Future):
+    if future.cancelled():
+        return None
+    error = future.exception()
+    return error if error is not None else future.result()
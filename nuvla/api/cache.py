@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+DEFAULT_CACHE_SIZE = 1024
+
+
+def cache_key(resource_id: str, params: Optional[dict]) -> tuple:
+    """Hashable key of a `get` of `resource_id` with query `params`,
+    independent of the order of `params` (also used to coalesce requests of
+    any uri, see SingleFlight)."""
+    items = []
+    for k, v in sorted((params or {}).items()):
+        if isinstance(v, list):
+            v = tuple(v)
+        items.append((k, v))
+    return resource_id, tuple(items)
+
+
+class CacheEntry(object):
+    __slots__ = ('content', 'etag', 'updated', 'expires')
+
+    def __init__(self, content: bytes, etag: Optional[str], updated: Optional[str],
+                 expires: float):
+        self.content = content
+        self.etag = etag
+        self.updated = updated
+        self.expires = expires
+
+    @property
+    def fresh(self) -> bool:
+        return time.monotonic() < self.expires
+
+
+class ResourceCache(object):
+    """Thread-safe LRU cache of the bodies of `get` responses, with entries
+    expiring after `ttl` seconds. Bodies are stored encoded so that each hit
+    returns an independent document.
+
+    Expired entries are kept (within `maxsize`) to be revalidated with the
+    server using their ETag or `updated` attribute.
+
+    A response fetched while its resource is invalidated is not stored: the
+    generation() of the resource read before the request is passed to put(),
+    which drops the response if the resource was invalidated since."""
+
+    def __init__(self, ttl: float, maxsize=DEFAULT_CACHE_SIZE):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._keys_by_id = {}
+        # Resource id or type -> generation of its last invalidation, for the
+        # last `maxsize` ones. The generations of those forgotten are at most
+        # `_min_generation`.
+        self._generations = OrderedDict()
+        self._last_generation = 0
+        self._min_generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def lookup(self, key: tuple) -> Optional[CacheEntry]:
+        """Returns the entry for `key` (fresh or expired) or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def generation(self, resource_id: str) -> int:
+        """Returns the generation of the last invalidation of `resource_id`
+        (or of its collection)."""
+        with self._lock:
+            return self._generation(resource_id)
+
+    def _generation(self, resource_id):
+        resource_type = resource_id.split('/', 1)[0]
+        return max(self._generations.get(resource_id, self._min_generation),
+                   self._generations.get(resource_type, self._min_generation))
+
+    def _invalidated(self, name):
+        self._last_generation += 1
+        self._generations[name] = self._last_generation
+        self._generations.move_to_end(name)
+        while len(self._generations) > self.maxsize:
+            _, generation = self._generations.popitem(last=False)
+            self._min_generation = max(self._min_generation, generation)
+
+    def put(self, key: tuple, content: bytes, etag: Optional[str] = None,
+            updated: Optional[str] = None, generation: Optional[int] = None):
+        """Stores `content` for `key`, unless the resource was invalidated
+        after `generation` (see generation())."""
+        with self._lock:
+            if generation is not None and generation != self._generation(key[0]):
+                return
+            self._entries[key] = CacheEntry(content, etag, updated,
+                                            time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            self._keys_by_id.setdefault(key[0], set()).add(key)
+            while len(self._entries) > self.maxsize:
+                old_key, _ = self._entries.popitem(last=False)
+                self._discard_key(old_key)
+                self.evictions += 1
+
+    def refresh(self, entry: CacheEntry):
+        """Extends the life of a revalidated `entry`."""
+        entry.expires = time.monotonic() + self.ttl
+
+    def _discard_key(self, key):
+        keys = self._keys_by_id.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_id[key[0]]
+
+    def invalidate(self, resource_id: str):
+        """Removes all the entries of `resource_id`."""
+        with self._lock:
+            self._invalidated(resource_id)
+            for key in self._keys_by_id.pop(resource_id, ()):
+                self._entries.pop(key, None)
+
+    def invalidate_collection(self, resource_type: str):
+        """Removes all the entries of resources of type `resource_type`."""
+        prefix = resource_type + '/'
+        with self._lock:
+            self._invalidated(resource_type)
+            for resource_id in [i for i in self._keys_by_id if i.startswith(prefix)]:
+                for key in self._keys_by_id.pop(resource_id):
+                    self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_id.clear()
+            self._last_generation += 1
+            self._min_generation = self._last_generation
+            self._generations.clear()
+
+    def record(self, hit: bool, revalidated=False):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+            if revalidated:
+                self.revalidations += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {'hits': self.hits,
+                    'misses': self.misses,
+                    'revalidations': self.revalidations,
+                    'evictions': self.evictions,
+                    'size': len(self._entries)}
@@ -0,0 +1,228 @@
+# -*- coding: utf-8 -*-
+
+import bisect
+import logging
+import threading
+from collections import deque
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds, in seconds, of the latency histogram buckets.
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Number of latest latencies kept per endpoint to compute the percentiles.
+DEFAULT_WINDOW = 1024
+
+
+def uri_template(uri: str) -> str:
+    """Returns `uri` with the resource id replaced by a placeholder, e.g.
+    'deployment/{id}/start' for 'deployment/0f2c.../start'."""
+    parts = uri.split('/')
+    if len(parts) > 1 and parts[0] != 'hook':
+        parts[1] = '{id}'
+    return '/'.join(parts)
+
+
+class RequestEvent(object):
+    """Measures of a request made by the client, passed to the request hooks.
+
+    `status` is None if no response was received (see `error`). Byte counts
+    are those of the bodies as sent and received. `compression_ratio` is
+    None if the request body wasn't compressed. `retries` counts the
+    transport level retries and `reauthentications` the retries after a
+    reauthentication."""
+
+    __slots__ = ('method', 'uri', 'uri_template', 'resource_type', 'status',
+                 'latency', 'request_bytes', 'response_bytes', 'compression_ratio',
+                 'retries', 'reauthentications', 'error')
+
+    def __init__(self, method: str, uri: str, status: Optional[int], latency: float,
+                 request_bytes=0, response_bytes=0,
+                 compression_ratio: Optional[float] = None, retries=0,
+                 reauthentications=0, error: Optional[Exception] = None):
+        self.method = method
+        self.uri = uri
+        self.uri_template = uri_template(uri)
+        self.resource_type = uri.split('/', 1)[0]
+        self.status = status
+        self.latency = latency
+        self.request_bytes = request_bytes
+        self.response_bytes = response_bytes
+        self.compression_ratio = compression_ratio
+        self.retries = retries
+        self.reauthentications = reauthentications
+        self.error = error
+
+    @property
+    def endpoint(self) -> str:
+        return '{0} {1}'.format(self.method, self.uri_template)
+
+    def __repr__(self):
+        return ('RequestEvent({0} {1}, status={2}, latency={3:.6f}, request_bytes={4}, '
+                'response_bytes={5}, compression_ratio={6}, retries={7}, '
+                'reauthentications={8})'
+                .format(self.method, self.uri, self.status, self.latency,
+                        self.request_bytes, self.response_bytes,
+                        self.compression_ratio, self.retries,
+                        self.reauthentications))
+
+
+RequestHook = Callable[[RequestEvent], None]
+
+
+def call_hooks(hooks, event: RequestEvent):
+    for hook in hooks:
+        try:
+            hook(event)
+        except Exception as ex:
+            logger.warning('Request hook %r failed: %s', hook, ex)
+
+
+def percentile(sorted_values, p) -> float:
+    """Returns the `p`th percentile (0-100) of `sorted_values`, linearly
+    interpolated between the closest ranks (0.0 if empty)."""
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * p / 100
+    f = int(k)
+    c = min(f + 1, len(sorted_values) - 1)
+    return sorted_values[f] + (sorted_values[c] - sorted_values[f]) * (k - f)
+
+
+class EndpointStats(object):
+    """Totals and latency distribution of the requests to an endpoint."""
+
+    def __init__(self, buckets, window):
+        self.buckets = buckets
+        self.bucket_counts = [0] * len(buckets)
+        self.latencies = deque(maxlen=window)
+        self.count = 0
+        self.errors = 0
+        self.statuses = {}
+        self.latency_sum = 0.0
+        self.latency_max = 0.0
+        self.request_bytes = 0
+        self.response_bytes = 0
+        self.retries = 0
+        self.reauthentications = 0
+
+    def add(self, event: RequestEvent):
+        self.count += 1
+        if event.status is None or event.status >= 400:
+            self.errors += 1
+        self.statuses[event.status] = self.statuses.get(event.status, 0) + 1
+        self.latency_sum += event.latency
+        self.latency_max = max(self.latency_max, event.latency)
+        i = bisect.bisect_left(self.buckets, event.latency)
+        if i < len(self.buckets):
+            self.bucket_counts[i] += 1
+        self.latencies.append(event.latency)
+        self.request_bytes += event.request_bytes
+        self.response_bytes += event.response_bytes
+        self.retries += event.retries
+        self.reauthentications += event.reauthentications
+
+    def as_dict(self) -> dict:
+        latencies = sorted(self.latencies)
+        return {'count': self.count,
+                'errors': self.errors,
+                'statuses': dict(self.statuses),
+                'latency_total': self.latency_sum,
+                'latency_mean': self.latency_sum / self.count if self.count else 0.0,
+                'latency_max': self.latency_max,
+                'latency_p50': percentile(latencies, 50),
+                'latency_p90': percentile(latencies, 90),
+                'latency_p99': percentile(latencies, 99),
+                'request_bytes': self.request_bytes,
+                'response_bytes': self.response_bytes,
+                'retries': self.retries,
+                'reauthentications': self.reauthentications}
+
+
+class MetricsCollector(object):
+    """Request hook aggregating the requests per endpoint (method and URI
+    template). Percentiles are computed on the latest `window` requests of
+    each endpoint.
+
+        metrics = MetricsCollector()
+        api = Api(request_hooks=[metrics])
+        ...
+        metrics.top(5)
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS, window=DEFAULT_WINDOW):
+        self.buckets = tuple(sorted(buckets))
+        self.window = window
+        self._lock = threading.Lock()
+        self._endpoints: Dict[tuple, EndpointStats] = {}
+
+    def __call__(self, event: RequestEvent):
+        key = (event.method, event.uri_template)
+        with self._lock:
+            stats = self._endpoints.get(key)
+            if stats is None:
+                stats = self._endpoints[key] = EndpointStats(self.buckets, self.window)
+            stats.add(event)
+
+    def reset(self):
+        with self._lock:
+            self._endpoints.clear()
+
+    def snapshot(self) -> Dict[str, dict]:
+        """Returns the statistics by endpoint ('<method> <URI template>')."""
+        with self._lock:
+            return {'{0} {1}'.format(*k): s.as_dict()
+                    for k, s in sorted(self._endpoints.items())}
+
+    def top(self, n=10, by='latency_total') -> List[tuple]:
+        """Returns the `n` (endpoint, statistics) with the highest `by`
+        statistic, e.g. the endpoints the client spends the most time on."""
+        return sorted(self.snapshot().items(), key=lambda i: i[1][by],
+                      reverse=True)[:n]
+
+    def to_prometheus(self, prefix='nuvla_client') -> str:
+        """Returns the metrics in the Prometheus text exposition format."""
+        lines = []
+
+        def header(name, kind, doc):
+            lines.append('# HELP {0}_{1} {2}'.format(prefix, name, doc))
+            lines.append('# TYPE {0}_{1} {2}'.format(prefix, name, kind))
+
+        with self._lock:
+            endpoints = sorted(self._endpoints.items())
+            header('requests_total', 'counter', 'Requests by endpoint and status.')
+            for (method, uri), s in endpoints:
+                for status, count in sorted(s.statuses.items(), key=lambda i: str(i[0])):
+                    lines.append('{0}_requests_total{{{1},status="{2}"}} {3}'.format(
+                        prefix, _labels(method, uri), status or '', count))
+            header('request_duration_seconds', 'histogram', 'Request latency.')
+            for (method, uri), s in endpoints:
+                labels = _labels(method, uri)
+                cumulative = 0
+                for bound, count in zip(s.buckets, s.bucket_counts):
+                    cumulative += count
+                    lines.append('{0}_request_duration_seconds_bucket{{{1},le="{2}"}} {3}'
+                                 .format(prefix, labels, bound, cumulative))
+                lines.append('{0}_request_duration_seconds_bucket{{{1},le="+Inf"}} {2}'
+                             .format(prefix, labels, s.count))
+                lines.append('{0}_request_duration_seconds_sum{{{1}}} {2}'
+                             .format(prefix, labels, s.latency_sum))
+                lines.append('{0}_request_duration_seconds_count{{{1}}} {2}'
+                             .format(prefix, labels, s.count))
+            for name, attr, doc in [
+                    ('request_bytes_total', 'request_bytes', 'Bytes of the request bodies.'),
+                    ('response_bytes_total', 'response_bytes', 'Bytes of the response bodies.'),
+                    ('retries_total', 'retries', 'Transport level retries.'),
+                    ('reauthentications_total', 'reauthentications',
+                     'Requests retried after a reauthentication.')]:
+                header(name, 'counter', doc)
+                for (method, uri), s in endpoints:
+                    lines.append('{0}_{1}{{{2}}} {3}'.format(prefix, name,
+                                                             _labels(method, uri),
+                                                             getattr(s, attr)))
+        return '\n'.join(lines) + '\n'
+
+
+def _labels(method, uri) -> str:
+    return 'method="{0}",endpoint="{1}"'.format(
+        method, uri.replace('\\', '\\\\').replace('"', '\\"'))
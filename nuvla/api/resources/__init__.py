@@ -2,6 +2,7 @@
 from .callback import Callback
 from .credential import Credential
 from .deployment import Deployment
-from .deployment_parameter import DeploymentParameter
+from .deployment_parameter import DeploymentParameter, DeploymentParameterReporter, \
+    DeploymentParameterSnapshot
 from .module import Module
 from .notification import Notification
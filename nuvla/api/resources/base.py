@@ -3,6 +3,7 @@ from typing import Union
 
 from nuvla.api import Api as Nuvla
 from nuvla.api.models import CimiResource
+from nuvla.api.tracing import trace_methods
 
 
 class ResourceNotFound(Exception):
@@ -34,9 +35,16 @@ def check_created(resp, errmsg=''):
 
 
 class ResourceBase:
+    """Base of the resource helpers. When tracing is enabled (see
+    nuvla.api.tracing), a span is opened for each call of their public
+    methods."""
 
     resource = None
 
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        trace_methods(cls)
+
     @staticmethod
     def id(resource: Union[dict, CimiResource]):
         key = 'id'
@@ -65,7 +73,7 @@ class ResourceBase:
     def delete(self, resource_id: str) -> str:
         """Deletes resource identified by `resource_id`. Returns resource ID.
         """
-        response = self.nuvla.delete(resource_id)
+        response = self.nuvla.delete(resource_id, prefetch=False)
         return response.data['resource-id']
 
     def id_by_name(self, name, filter=None) -> list:
@@ -77,3 +85,6 @@ class ResourceBase:
             fltr += f' and {filter}'
         res = self.nuvla.search(self.resource, filter=fltr)
         return [r.data['id'] for r in res.resources]
+
+
+trace_methods(ResourceBase)
@@ -1,9 +1,107 @@
+import json
+import logging
 import os
+import threading
+import time
 import requests
-from typing import Optional, Union
+from urllib3.exceptions import ConnectTimeoutError
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Iterator, List, Optional, Union
 
-from nuvla.api import Api as Nuvla
+from nuvla.api import Api as Nuvla, NuvlaError
+from nuvla.api.api import DEFAULT_CONCURRENCY
 from .base import ResourceBase
+from ..tracing import in_current_context
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_RETRIES = 3
+DEFAULT_RETRY_DELAY = 0.5
+
+# Statuses of the failures worth retrying, with which the server did not
+# process the request.
+TRANSIENT_STATUSES = (429, 503)
+
+_END = object()
+
+
+class _InvalidRecord(object):
+    __slots__ = ('error',)
+
+    def __init__(self, error: str):
+        self.error = error
+
+
+def _ndjson_lines(path) -> Iterator[Union[dict, _InvalidRecord]]:
+    # Documents of the newline delimited JSON file `path`, with an
+    # _InvalidRecord in place of those which can't be decoded.
+    with open(path, 'rb') as fh:
+        for n, line in enumerate(fh, 1):
+            if line.strip():
+                try:
+                    yield json.loads(line)
+                except ValueError as ex:
+                    yield _InvalidRecord('invalid JSON at line {0}: {1}'.format(n, ex))
+
+
+def read_ndjson(path) -> Iterator[dict]:
+    """Lazily reads the documents of the newline delimited JSON file `path`.
+    Raises ValueError at the first invalid line."""
+    for doc in _ndjson_lines(path):
+        if isinstance(doc, _InvalidRecord):
+            raise ValueError(doc.error)
+        yield doc
+
+
+def is_transient(ex: Exception) -> bool:
+    """Whether the request which raised `ex` may succeed if retried, and did
+    not reach the server: the connection failed, or the server refused it
+    with a 429/503 status. Requests failing otherwise (e.g. a read timeout or
+    a 500 status) may have been processed, so retrying a creation could
+    create duplicates."""
+    if isinstance(ex, requests.ConnectTimeout):
+        return True
+    if isinstance(ex, requests.ConnectionError):
+        reason = getattr(ex.args[0], 'reason', None) if ex.args else None
+        return isinstance(reason, ConnectTimeoutError)
+    if isinstance(ex, NuvlaError) and ex.response is not None:
+        return ex.response.status_code in TRANSIENT_STATUSES
+    return False
+
+
+class IngestReport(object):
+    """Outcome of `DataRecord.create_many`. `ids` holds the id of the created
+    records in input order (None for the failed ones), `errors` maps the
+    input index of the failed records to their error message."""
+
+    def __init__(self):
+        self.ids: List[Optional[str]] = []
+        self.errors: Dict[int, str] = {}
+        self.retries = 0
+        self.elapsed = 0.0
+
+    @property
+    def total(self) -> int:
+        return len(self.ids)
+
+    @property
+    def created(self) -> int:
+        return self.total - len(self.errors)
+
+    @property
+    def failed(self) -> int:
+        return len(self.errors)
+
+    @property
+    def throughput(self) -> float:
+        """Records created per second."""
+        return self.created / self.elapsed if self.elapsed else 0.0
+
+    def __repr__(self):
+        return ('IngestReport(total={0}, created={1}, failed={2}, retries={3}, '
+                'elapsed={4:.3f}, throughput={5:.1f}/s)'
+                .format(self.total, self.created, self.failed, self.retries,
+                        self.elapsed, self.throughput))
 
 
 class DataRecord(ResourceBase):
@@ -14,6 +112,90 @@ class DataRecord(ResourceBase):
             data.update({'infrastructure-service': infra_service_id})
             return self.add(data)
 
+    def _create_with_retries(self, data: dict, max_retries, retry_delay,
+                             on_retry) -> str:
+        attempt = 0
+        while True:
+            try:
+                return self.add(data)
+            except Exception as ex:
+                if attempt >= max_retries or not is_transient(ex):
+                    raise
+                on_retry()
+                time.sleep(retry_delay * 2 ** attempt)
+                attempt += 1
+
+    def create_many(self, records: Union[Iterable[dict], str, os.PathLike],
+                    infra_service_id: str, concurrency=DEFAULT_CONCURRENCY,
+                    max_retries=DEFAULT_MAX_RETRIES,
+                    retry_delay=DEFAULT_RETRY_DELAY) -> IngestReport:
+        """Creates the data records of `records` (an iterable of documents or
+        the path of a newline delimited JSON file) on `infra_service_id`,
+        with up to `concurrency` creations in parallel.
+
+        Records are consumed lazily: at most `2 * concurrency` of them are
+        held in memory at any time. Creations which did not reach the server
+        (failed connection, 429/503 status, see is_transient()) are retried
+        up to `max_retries` times with an exponential backoff starting at
+        `retry_delay` seconds; the other failures are not, as the record may
+        have been created. The invalid lines of a file are reported as failed
+        records, and an error reading `records` ends the ingest with the
+        records read so far. The documents are not modified. Returns an
+        IngestReport.
+        """
+        if isinstance(records, (str, os.PathLike)):
+            records = _ndjson_lines(records)
+        report = IngestReport()
+        lock = threading.Lock()
+        slots = threading.BoundedSemaphore(2 * concurrency)
+
+        def on_retry():
+            with lock:
+                report.retries += 1
+
+        def create(index, data):
+            try:
+                doc = dict(data)
+                doc['infrastructure-service'] = infra_service_id
+                resource_id = self._create_with_retries(
+                    doc, max_retries, retry_delay, on_retry)
+                with lock:
+                    report.ids[index] = resource_id
+            except Exception as ex:
+                with lock:
+                    report.errors[index] = str(ex)
+            finally:
+                slots.release()
+
+        create = in_current_context(create)
+        start = time.monotonic()
+        with ThreadPoolExecutor(max_workers=concurrency,
+                                thread_name_prefix='nuvla-ingest') as executor:
+            records = iter(records)
+            index = 0
+            while True:
+                # A record is read only once there's a free slot for it.
+                slots.acquire()
+                try:
+                    data = next(records, _END)
+                except Exception as ex:
+                    data = _InvalidRecord('failed to read record: {}'.format(ex))
+                    records = iter(())
+                if data is _END:
+                    break
+                with lock:
+                    report.ids.append(None)
+                if isinstance(data, _InvalidRecord):
+                    with lock:
+                        report.errors[index] = data.error
+                    slots.release()
+                else:
+                    executor.submit(create, index, data)
+                index += 1
+        report.elapsed = time.monotonic() - start
+        logger.info('Data records ingest: %s', report)
+        return report
+
 
 class DataObjectS3(ResourceBase):
     resource = 'data-object'
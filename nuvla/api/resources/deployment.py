@@ -1,20 +1,123 @@
 
-import re
+import asyncio
+import logging
+import threading
 import time
-from typing import Union, Optional, List, Dict
+from concurrent.futures import Future, as_completed
+from typing import AsyncIterator, Union, Optional, List, Dict, Iterable, Iterator, Set, Tuple
 from datetime import datetime, timezone, timedelta
 
-from .base import ResourceBase, ResourceNotFound
-from ..api import NuvlaResourceOperationNotAvailable
+from .base import ResourceBase, ResourceNotFound, check_created
+from .deployment_parameter import DeploymentParameterSnapshot
+from ..api import DEFAULT_CONCURRENCY, NuvlaError
+from ..batch import Batch, _outcome
 from ..models import CimiResource, CimiResponse
+from ..util.backoff import Backoff, DEFAULT_INITIAL_DELAY, DEFAULT_MAX_DELAY
+from ..util.filter import filter_or
+from ..util.logtail import LogTail, DEFAULT_TAIL_SIZE
+from ..util.template import interpolate
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WAIT_TIMEOUT = 600
+# Attributes needed to check the availability of an operation.
+OPERATION_SELECT = 'id,state,operations'
+# Attributes of deployment-log needed to follow the logs.
+LOG_SELECT = 'id,log,last-timestamp'
+DEFAULT_LOG_POLL_DELAY = 0.5
+# Number of deployment ids per search filter.
+DEFAULT_SEARCH_CHUNK_SIZE = 100
 
 
 class DeploymentOperationNotAvailable(Exception):
     pass
 
 
+class DeploymentStateTimeout(Exception):
+    def __init__(self, reason, states: Dict[str, Optional[str]], pending: List[str]):
+        super(DeploymentStateTimeout, self).__init__(reason)
+        self.reason = reason
+        self.states = states
+        self.pending = pending
+
+
+def _operation_not_available_msg(operation, resource: CimiResource) -> str:
+    return "Operation '{0}' is not available on {1} in state {2}." \
+        .format(operation, resource.id, resource.data.get('state'))
+
+
+class LaunchResult(object):
+    """Outcome of the launch of a deployment by Deployment.launch_many():
+    the index and the spec of the launch, the id of the deployment if it
+    was created and the exception raised if the launch failed."""
+
+    def __init__(self, index: int, spec: dict, deployment_id: Optional[str] = None,
+                 error: Optional[Exception] = None):
+        self.index = index
+        self.spec = spec
+        self.deployment_id = deployment_id
+        self.error = error
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+    def __repr__(self):
+        return 'LaunchResult({0}, deployment_id={1}, error={2!r})'.format(
+            self.index, self.deployment_id, self.error)
+
+
+class _LaunchError(Exception):
+    # Failure of a launch after the creation of the deployment.
+
+    def __init__(self, deployment_id, error):
+        super(_LaunchError, self).__init__(str(error))
+        self.deployment_id = deployment_id
+        self.error = error
+
+
+class _LogFollower(object):
+    # State of Deployment.follow_logs(), shared by the sync and async versions.
+
+    def __init__(self, timeout, initial_delay, max_delay, buffer_size):
+        self.tail = LogTail(buffer_size)
+        self.backoff = Backoff(initial_delay, max_delay)
+        self.max_delay = max_delay
+        self.deadline = None if timeout is None else time.monotonic() + timeout
+        self.last_timestamp = None
+        self.fetched_at = None
+
+    def expired(self) -> bool:
+        return self.deadline is not None and time.monotonic() >= self.deadline
+
+    def should_fetch(self) -> bool:
+        return self.fetched_at is None \
+            or time.monotonic() - self.fetched_at >= self.max_delay
+
+    def fetched(self):
+        self.fetched_at = time.monotonic()
+
+    def next_delay(self) -> float:
+        return self.backoff.next_delay(self.deadline)
+
+    def new_lines(self, logs: CimiResource) -> List[str]:
+        last_timestamp = logs.data.get('last-timestamp')
+        if last_timestamp is None or last_timestamp == self.last_timestamp:
+            return []
+        self.last_timestamp = last_timestamp
+        self.fetched_at = None
+        lines = self.tail.new_lines(Deployment.logs(logs))
+        if lines:
+            self.backoff.reset()
+        return lines
+
+
 class Deployment(ResourceBase):
-    """Stateless interface to Nuvla module deployment."""
+    """Interface to Nuvla module deployment. Its state is the index of the
+    deployment parameter ids used by set_parameters(), guarded by a lock, and
+    whether the server accepts the parent and the data of deployments on
+    creation, learnt by launch_many() (a flag only ever set to the same value
+    by concurrent launches, so not locked)."""
 
     STATE_STARTED = 'STARTED'
     STATE_STOPPED = 'STOPPED'
@@ -23,6 +126,18 @@ class Deployment(ResourceBase):
 
     resource = 'deployment'
 
+    def __init__(self, nuvla):
+        super(Deployment, self).__init__(nuvla)
+        # (deployment id, node-id, name) -> deployment-parameter id
+        self._parameter_ids: Dict[Tuple[str, str, str], str] = {}
+        # (deployment id, node-id, name) of the parameters not found by the
+        # last search of the parameters of the deployment.
+        self._missing_parameters: Set[Tuple[str, str, str]] = set()
+        self._parameter_ids_lock = threading.Lock()
+        # Whether the server accepts the parent and the data of deployments
+        # on creation (None until a launch_many() creation shows it).
+        self._create_with_data: Optional[bool] = None
+
     @staticmethod
     def uuid(deployment):
         return Deployment.id(deployment).split('/')[1]
@@ -211,26 +326,27 @@ class Deployment(ResourceBase):
         :param data_objects: list of data-object resource URIs
         :return: CimiResource
         """
-        module = {"module": {"href": module_id}}
+        return self._create_from_payload(self._create_payload(
+            module_id, infra_cred_id=infra_cred_id, data_sets=data_sets,
+            data_records=data_records, data_objects=data_objects))
 
-        deployment_id = self.add(module)
+    def _create_from_payload(self, payload: dict) -> CimiResource:
+        # Creates the deployment from its module, then sets the rest of
+        # `payload` (see _create_payload()) on it.
+        deployment_id = self.add({'module': payload['module']})
 
         # Get created deployment and update if needed.
-        dpl = self.get(deployment_id)
+        return self._update_created(self.get(deployment_id), payload)
 
-        updated = False
-        if infra_cred_id:
-            dpl.data.update({'parent': infra_cred_id})
-            updated = True
-        if any([data_sets, data_records, data_objects]):
-            self._set_data(dpl.data, data_sets, data_records, data_objects)
-            updated = True
-        if updated:
+    def _update_created(self, dpl: CimiResource, payload: dict) -> CimiResource:
+        # Sets the fields of `payload` other than the module on the created
+        # deployment `dpl`.
+        if len(payload) > 1:
+            dpl.data.update({k: v for k, v in payload.items() if k != 'module'})
             try:
-                dpl = self.nuvla.edit(deployment_id, dpl.data)
+                dpl = self.nuvla.edit(dpl.id, dpl.data)
             except Exception as ex:
-                raise Exception('Failed editing {0}: {1}'.format(deployment_id, ex))
-
+                raise Exception('Failed editing {0}: {1}'.format(dpl.id, ex))
         return dpl
 
     def get(self, resource_id) -> CimiResource:
@@ -242,26 +358,89 @@ class Deployment(ResourceBase):
         return self.nuvla.get(resource_id)
 
     def get_state(self, resource_id):
-        return self.state(self.get(resource_id))
+        return self.state(self.nuvla.get(resource_id, use_cache=False, select='id,state'))
+
+    def _search_states(self, ids: List[str], chunk_size) -> Dict[str, str]:
+        states = {}
+        for i in range(0, len(ids), chunk_size):
+            chunk = ids[i:i + chunk_size]
+            res = self.nuvla.search(self.resource,
+                                    filter=filter_or([f"id='{_id}'" for _id in chunk]),
+                                    select=['id', 'state'], last=len(chunk))
+            for r in res.resources:
+                states[r.id] = r.data.get('state')
+        return states
+
+    def wait_for_state(self, ids: Union[str, Iterable[str]], target_state: str,
+                       timeout=DEFAULT_WAIT_TIMEOUT, final_states=(STATE_ERROR,),
+                       chunk_size=DEFAULT_SEARCH_CHUNK_SIZE,
+                       initial_delay=DEFAULT_INITIAL_DELAY,
+                       max_delay=DEFAULT_MAX_DELAY) -> Dict[str, Optional[str]]:
+        """Waits for the deployments `ids` to settle: to reach `target_state`
+        or one of `final_states`, or to be deleted. Returns a dict mapping each
+        id to its final state (None if the deployment doesn't exist).
+
+        The states of the pending deployments are polled together with one
+        search per `chunk_size` ids, with an exponential backoff (with jitter)
+        from `initial_delay` to `max_delay` seconds, restarted each time a
+        deployment settles. Raises DeploymentStateTimeout after `timeout`
+        seconds.
+        """
+        if isinstance(ids, str):
+            ids = [ids]
+        ids = list(dict.fromkeys(ids))
+        pending = ids
+        settled = {}
+        last_states = {}
+        deadline = time.monotonic() + timeout
+        backoff = Backoff(initial_delay, max_delay)
+        while True:
+            states = self._search_states(pending, chunk_size)
+            last_states.update(states)
+            still_pending = []
+            for _id in pending:
+                state = states.get(_id)
+                if _id not in states or state == target_state or state in final_states:
+                    settled[_id] = state
+                else:
+                    still_pending.append(_id)
+            if len(still_pending) < len(pending):
+                backoff.reset()
+            pending = still_pending
+            if not pending:
+                return {_id: settled[_id] for _id in ids}
+            if time.monotonic() >= deadline:
+                states = dict(settled, **{_id: last_states.get(_id) for _id in pending})
+                raise DeploymentStateTimeout(
+                    '{0} deployments did not reach state {1} within {2}s.'
+                    .format(len(pending), target_state, timeout), states, pending)
+            backoff.sleep(deadline)
 
     def _operation(self, resource_id, operation, timeout=0,
-                   data: Optional[dict]=None) -> CimiResponse:
-        time_max = time.time() + timeout
+                   data: Optional[dict] = None, initial_delay=DEFAULT_INITIAL_DELAY,
+                   max_delay=DEFAULT_MAX_DELAY) -> CimiResponse:
+        """Executes `operation` on the deployment, waiting at most `timeout`
+        seconds for it to be available. Availability is checked by fetching
+        the state and operations of the deployment only, with an exponential
+        backoff between the checks. Raises DeploymentOperationNotAvailable.
+        """
+        deadline = time.monotonic() + timeout
+        backoff = Backoff(initial_delay, max_delay)
         while True:
-            resource = self.get(resource_id)
-            try:
-                if operation == 'delete':
-                    return self.nuvla.delete(resource_id)
-                else:
-                    return self.nuvla.operation(resource, operation, data)
-            except NuvlaResourceOperationNotAvailable:
-                msg = "Operation '{0}' is not available on deployment in state {1}." \
-                    .format(operation, Deployment.state(resource))
-                print(msg)
-                if time.time() >= time_max:
-                    raise DeploymentOperationNotAvailable(msg)
-                else:
-                    time.sleep(3)
+            resource = self.nuvla.get(resource_id, use_cache=False, select=OPERATION_SELECT)
+            if operation in resource.operations:
+                return self._execute(resource, operation, data)
+            msg = _operation_not_available_msg(operation, resource)
+            if time.monotonic() >= deadline:
+                raise DeploymentOperationNotAvailable(msg)
+            delay = backoff.next_delay(deadline)
+            logger.info('%s Retrying in %.1fs.', msg, delay)
+            time.sleep(delay)
+
+    def _execute(self, resource: CimiResource, operation, data) -> CimiResponse:
+        if operation == 'delete':
+            return self.nuvla.delete(resource.id, prefetch=False)
+        return self.nuvla.operation(resource, operation, data)
 
     def start(self, resource_id, timeout=0):
         return self._operation(resource_id, 'start', timeout)
@@ -279,6 +458,90 @@ class Deployment(ResourceBase):
         self.start(dpl.id)
         return self.get(dpl.id)
 
+    def _create_payload(self, module_id, infra_cred_id=None, data_sets=None,
+                        data_records=None, data_objects=None) -> dict:
+        payload = {'module': {'href': module_id}}
+        if infra_cred_id:
+            payload['parent'] = infra_cred_id
+        self._set_data(payload, data_sets, data_records, data_objects)
+        return payload
+
+    def _create_one(self, spec: dict) -> str:
+        # Creates the deployment with one request if the server is known to
+        # accept its parent and data on creation, else like create(). Until
+        # known, they are sent on creation and checked: the server does not
+        # support them if it ignores them, or if it refuses them but accepts
+        # the deployment without them (the spec may be invalid otherwise).
+        payload = self._create_payload(**spec)
+        if len(payload) == 1 or self._create_with_data is False:
+            return self._create_from_payload(payload).id
+        try:
+            deployment_id = self.add(payload)
+        except NuvlaError as ex:
+            if self._create_with_data or ex.response is None \
+                    or ex.response.status_code != 400:
+                raise
+            deployment_id = self._create_from_payload(payload).id
+            logger.info('Deployment parent and data not accepted on creation: %s', ex)
+            self._create_with_data = False
+            return deployment_id
+        if self._create_with_data is None:
+            dpl = self.get(deployment_id)
+            if all(dpl.data.get(k) == v for k, v in payload.items() if k != 'module'):
+                self._create_with_data = True
+            else:
+                logger.info('Deployment parent and data ignored on creation.')
+                self._update_created(dpl, payload)
+                self._create_with_data = False
+        return deployment_id
+
+    def _start_created(self, deployment_id, timeout):
+        # The start operation is normally available on a new deployment: its
+        # availability is only checked (see _operation()) if it is refused.
+        try:
+            self.nuvla.operation(CimiResource({'id': deployment_id}), 'start')
+        except NuvlaError as ex:
+            if ex.response is None or ex.response.status_code not in (400, 409):
+                raise
+            self._operation(deployment_id, 'start', timeout)
+
+    def _launch_one(self, spec: dict, start, start_timeout) -> str:
+        deployment_id = self._create_one(spec)
+        if start:
+            try:
+                self._start_created(deployment_id, start_timeout)
+            except Exception as ex:
+                raise _LaunchError(deployment_id, ex)
+        return deployment_id
+
+    def launch_many(self, specs: Iterable[Union[str, dict]], concurrency=DEFAULT_CONCURRENCY,
+                    start=True, start_timeout=DEFAULT_WAIT_TIMEOUT) -> Iterator[LaunchResult]:
+        """Creates and starts deployments in parallel, at most `concurrency`
+        at once, and yields a LaunchResult for each of them as they complete.
+
+        Each spec is a module id or a dict of the arguments of launch():
+        {'module_id': ..., 'infra_cred_id': ..., 'data_sets': ..., ...}.
+        The credential (parent) and the data are set in the creation request
+        (unless the server refuses or ignores them, which the first launches
+        check), and the deployments are not fetched again: a launch then
+        takes two requests. The deployments are only created
+        if not `start`.
+
+        Closing the iterator cancels the launches not started yet.
+        """
+        specs = [{'module_id': s} if isinstance(s, str) else dict(s) for s in specs]
+        with self.nuvla.batch(concurrency) as batch:
+            futures = {batch.submit(self._launch_one, spec, start, start_timeout): i
+                       for i, spec in enumerate(specs)}
+            for future in as_completed(futures):
+                i = futures[future]
+                try:
+                    yield LaunchResult(i, specs[i], future.result())
+                except _LaunchError as ex:
+                    yield LaunchResult(i, specs[i], ex.deployment_id, ex.error)
+                except Exception as ex:
+                    yield LaunchResult(i, specs[i], error=ex)
+
     def terminate(self, resource_id: str, timeout=30) -> CimiResponse:
         """Stops and deletes the deployment. Waits at max `timeout` seconds for
         the deployment to be fully stoped before attemting deletion.
@@ -286,11 +549,11 @@ class Deployment(ResourceBase):
         self.stop(resource_id)
         return self.delete(resource_id, timeout=timeout)
 
-    def list(self) -> List[Dict]:
-        res = self.nuvla.search(self.resource)
-        if res.count < 1:
-            return []
-        return res.data['resources']
+    def list(self, **kwargs) -> List[Dict]:
+        """Returns all the deployments matching the search `kwargs` (see
+        Api.search_iter()).
+        """
+        return [r.data for r in self.nuvla.search_iter(self.resource, **kwargs)]
 
     def init_logs(self, deployment: CimiResource, service: str,
                   since: Optional[datetime] = None) -> CimiResource:
@@ -329,6 +592,31 @@ class Deployment(ResourceBase):
         # Get the resource. It may contain the logs.
         return self.nuvla.get(logs.id)
 
+    def follow_logs(self, logs: CimiResource, timeout: Optional[float] = None,
+                    initial_delay=DEFAULT_LOG_POLL_DELAY, max_delay=DEFAULT_MAX_DELAY,
+                    buffer_size=DEFAULT_TAIL_SIZE) -> Iterator[str]:
+        """
+        Yields the lines of the `deployment-log` resource `logs` as they are
+        fetched, for `timeout` seconds (forever if None).
+
+        A fetch is requested as soon as the previous one has been applied
+        (or after `max_delay` seconds). The log is polled with a backoff from
+        `initial_delay` to `max_delay` seconds, restarted when new lines
+        arrive. Lines returned again by overlapping fetches are yielded once,
+        by comparison with the last `buffer_size` lines.
+        :param logs: CimiResource
+        :return: iterator of the lines of the log
+        """
+        follower = _LogFollower(timeout, initial_delay, max_delay, buffer_size)
+        yield from follower.new_lines(logs)
+        while not follower.expired():
+            if follower.should_fetch():
+                self.nuvla.operation(logs, 'fetch')
+                follower.fetched()
+            time.sleep(follower.next_delay())
+            yield from follower.new_lines(
+                self.nuvla.get(logs.id, use_cache=False, select=LOG_SELECT))
+
     @staticmethod
     def _template_interpolation(string: str, params: dict) -> str:
         """Returns `string` interpolated by the values from `params`.
@@ -337,44 +625,78 @@ class Deployment(ResourceBase):
         Throws ValueError if `params` is missing substitution keys defined in
         `string`.
         """
-        if not string:
-            return ''
-        groups = re.findall(r'(\${.*?})', string)
-        if len(groups) > 0 and not params:
-            raise ValueError('no substitutions provided.')
-        groups_keys = list(map(lambda x: x.replace('${', '').replace('}', ''),
-                               groups))
-        for k in groups_keys:
-            # If the interpolant from the string (key in groups_keys) is not in
-            # the list of parameters (params.keys()), interpolation is not possible.
-            if k not in params:
-                raise ValueError(f'{k} is missing in params')
-            if not params[k]:
-                return ''
-            string = re.compile(r'\${' + k + '}').sub(params[k], string)
-        return string
-
-    def get_url(self, deployment: CimiResource, name) -> Union[str, None]:
+        return interpolate(string, params)
+
+    @staticmethod
+    def _interpolate_url(url: str, params: dict) -> Optional[str]:
+        try:
+            return interpolate(url, params)
+        except ValueError as ex:
+            logger.info('Failed to interpolate URL %s: %s', url, ex)
+            return None
+
+    def get_url(self, deployment: CimiResource, name,
+                snapshot: Optional[DeploymentParameterSnapshot] = None) -> Union[str, None]:
         """Returns interpolated URL defined by `name` in deployment.
         Returns an empty string if not all deployment parameters required
         for interpolation are filled with values.
         Returns None if either URL `name` is not present on the deployment or
         interpolation is not possible due to missing deployment parameters. This
         means obtaining URL will not be possible.
+        The parameters are taken from `snapshot` when provided.
         """
         url = self.urls(deployment).get(name)
         if not url:
             return None
-        params = self.get_parameters(self.id(deployment.data))
-        # Flatten parameters map.
-        flat_params = {}
-        for v in params.values():
-            flat_params.update(v)
-        try:
-            return self._template_interpolation(url, flat_params)
-        except ValueError as ex:
-            print(ex)
-            return None
+        if snapshot is None:
+            snapshot = self.parameter_snapshot(self.id(deployment.data))
+        return self._interpolate_url(url, snapshot.values())
+
+    def get_urls(self, deployment: Union[dict, CimiResource],
+                 snapshot: Optional[DeploymentParameterSnapshot] = None) \
+            -> Dict[str, Optional[str]]:
+        """Returns all the URLs of the deployment, {name: URL}, interpolated
+        like get_url() with the parameters of `snapshot` (fetched once if not
+        provided).
+        """
+        urls = self.urls(deployment)
+        if not urls:
+            return {}
+        if snapshot is None:
+            snapshot = self.parameter_snapshot(self.id(deployment))
+        params = snapshot.values()
+        return {name: self._interpolate_url(url, params) if url else None
+                for name, url in urls.items()}
+
+    def resolve_fleet(self, deployments: Iterable[Union[str, dict, CimiResource]],
+                      chunk_size=DEFAULT_SEARCH_CHUNK_SIZE) -> Dict[str, dict]:
+        """Returns the parameters and the URLs of many deployments:
+        {id: {'parameters': <see get_parameters()>, 'urls': <see get_urls()>}}.
+
+        The deployments given by id are fetched (only their id and module)
+        with one search per `chunk_size` ids; those not found are omitted.
+        The parameters are fetched with one paged search per `chunk_size`
+        deployments.
+        """
+        docs = {}
+        for d in deployments:
+            if isinstance(d, str):
+                docs[d] = None
+            else:
+                docs[self.id(d)] = d
+        missing = [_id for _id, d in docs.items() if d is None]
+        for i in range(0, len(missing), chunk_size):
+            chunk = missing[i:i + chunk_size]
+            res = self.nuvla.search(self.resource,
+                                    filter=filter_or([f"id='{_id}'" for _id in chunk]),
+                                    select=['id', 'module'], last=len(chunk))
+            for r in res.resources:
+                docs[r.id] = r
+        docs = {_id: d for _id, d in docs.items() if d is not None}
+        snapshots = DeploymentParameterSnapshot.fetch_many(self.nuvla, docs, chunk_size)
+        return {_id: {'parameters': snapshots[_id].parameters(),
+                      'urls': self.get_urls(d, snapshots[_id])}
+                for _id, d in docs.items()}
 
     def create_parameter(self, resource_id, user_id, param_name, param_value=None,
                          node_id=None, param_description=None):
@@ -399,19 +721,32 @@ class Deployment(ResourceBase):
             raise ResourceNotFound(f'Deployment parameter "{filters}" not found.')
         return res.resources[0]
 
-    def get_parameter(self, resource_id, node_id, param_name):
+    def parameter_snapshot(self, resource_id) -> DeploymentParameterSnapshot:
+        """Returns the snapshot of the parameters of the deployment
+        `resource_id`, to be passed to get_parameter(), get_parameters() and
+        get_url() instead of searching the parameters on each call.
+        """
+        return DeploymentParameterSnapshot(self.nuvla, resource_id)
+
+    def get_parameter(self, resource_id, node_id, param_name,
+                      snapshot: Optional[DeploymentParameterSnapshot] = None):
         """Returns value of deployment `resource_id` parameter `name`. To get
         global level parameters (not belonging to a node), provide '' or None
         as `node_id`.
         Returns None if parameter is not found.
+        The value is taken from `snapshot` when provided.
         """
+        if snapshot is not None:
+            return snapshot.get(node_id, param_name)
         try:
             param = self._get_parameter(resource_id, param_name, node_id)
         except ResourceNotFound:
             return None
         return param.data.get('value')
 
-    def get_parameters(self, resource_id, node_id='') -> Union[list, dict]:
+    def get_parameters(self, resource_id, node_id='',
+                       snapshot: Optional[DeploymentParameterSnapshot] = None) \
+            -> Union[list, dict]:
         """When `node_id` is not provided, returns dictionary with all
         parameters
         {'global': {'<param name>': '<param value>', },
@@ -420,24 +755,11 @@ class Deployment(ResourceBase):
         'global' key corresponds to node_id == None or ''.
         Returns list with parameters for the provided `node_id`.
         Returns empty list or dict if parameters were not found.
+        The parameters are taken from `snapshot` when provided.
         """
-        fltr = f"parent='{resource_id}'"
-        if node_id:
-            fltr += f" and node-id='{node_id}'"
-            params = []
-        else:
-            params = {}
-        res = self.nuvla.search('deployment-parameter', filter=fltr)
-        for p in res.resources:
-            d = {p.data['name']: p.data.get('value')}
-            if node_id:
-                params.append(d)
-            else:
-                if 'node-id' in p.data:
-                    params.setdefault(p.data['node-id'], {}).update(d)
-                else:
-                    params.setdefault('global', {}).update(d)
-        return params
+        if snapshot is None:
+            snapshot = self.parameter_snapshot(resource_id)
+        return snapshot.parameters(node_id)
 
     def update_port_parameters(self, deployment: dict, ports_mapping):
         if ports_mapping:
@@ -452,6 +774,108 @@ class Deployment(ResourceBase):
         param = self._get_parameter(resource_id, name, node_id=node_id, select='id')
         return self.nuvla.edit(param.id, {'value': value})
 
+    def _parameter_ids_of(self, resource_id, keys) -> Dict[Tuple[str, str], str]:
+        # Ids of the existing parameters `keys` ((node-id, name)) of the
+        # deployment, from the index, or else with one paged search if some
+        # of the keys are neither indexed nor known to be missing.
+        with self._parameter_ids_lock:
+            ids = {k: self._parameter_ids[(resource_id,) + k] for k in keys
+                   if (resource_id,) + k in self._parameter_ids}
+            unknown = [k for k in keys if k not in ids
+                       and (resource_id,) + k not in self._missing_parameters]
+        if not unknown:
+            return ids
+        found = {DeploymentParameterSnapshot.key(p.data.get('node-id'), p.data['name']): p.id
+                 for p in self.nuvla.search_iter('deployment-parameter', prefetch=False,
+                                                 filter="parent='{}'".format(resource_id),
+                                                 select='id,name,node-id')}
+        with self._parameter_ids_lock:
+            for key, param_id in found.items():
+                self._parameter_ids[(resource_id,) + key] = param_id
+                self._missing_parameters.discard((resource_id,) + key)
+            for key in keys:
+                if key in found:
+                    ids[key] = found[key]
+                else:
+                    self._missing_parameters.add((resource_id,) + key)
+        return ids
+
+    def forget_parameter_ids(self, resource_id):
+        """Drops the ids of the parameters of the deployment `resource_id`
+        known by set_parameters() (e.g. if parameters were created or deleted
+        by another client), which then searches them again."""
+        with self._parameter_ids_lock:
+            self._parameter_ids = {k: v for k, v in self._parameter_ids.items()
+                                   if k[0] != resource_id}
+            self._missing_parameters = {k for k in self._missing_parameters
+                                        if k[0] != resource_id}
+
+    def _edit_parameter(self, resource_id, key, param_id, value) -> CimiResource:
+        try:
+            return self.nuvla.edit(param_id, {'value': value})
+        except NuvlaError as ex:
+            if ex.response is not None and ex.response.status_code == 404:
+                with self._parameter_ids_lock:
+                    self._parameter_ids.pop((resource_id,) + key, None)
+            raise
+
+    def _create_parameter(self, resource_id, key, user_id, value) -> CimiResponse:
+        node_id, name = key
+        try:
+            resp = self.create_parameter(resource_id, user_id, name, value, node_id=node_id)
+            param_id = check_created(resp, 'Failed to create parameter {}'.format(name))
+        except Exception:
+            # E.g. created meanwhile by another client: search it next time.
+            with self._parameter_ids_lock:
+                self._missing_parameters.discard((resource_id,) + key)
+            raise
+        with self._parameter_ids_lock:
+            self._parameter_ids[(resource_id,) + key] = param_id
+            self._missing_parameters.discard((resource_id,) + key)
+        return resp
+
+    def set_parameters(self, resource_id, values: Dict[Tuple[Optional[str], str], str],
+                       user_id=None, concurrency=DEFAULT_CONCURRENCY) -> dict:
+        """Sets the parameters of the deployment `resource_id` from `values`,
+        {(node_id, name): value}, with None or '' as node_id for the global
+        parameters. The parameter ids are resolved with one paged search and
+        kept for the next calls, as well as the parameters found missing (see
+        forget_parameter_ids()). Missing parameters are created if `user_id`
+        is provided. The edits run in parallel, at most `concurrency` at once.
+
+        Returns {(node_id, name): edited parameter (or created response)},
+        with the exception raised in place of the result of the failed edits
+        (ResourceNotFound for missing parameters not created).
+        """
+        for value in values.values():
+            if not isinstance(value, str):
+                raise ValueError('Parameter value should be string.')
+        ids = self._parameter_ids_of(
+            resource_id, {DeploymentParameterSnapshot.key(*k) for k in values})
+        with self.nuvla.batch(concurrency) as batch:
+            results = self._submit_parameters(batch, resource_id, values, ids, user_id)
+        return {k: _outcome(r) if isinstance(r, Future) else r for k, r in results.items()}
+
+    def _submit_parameters(self, batch: Batch, resource_id, values, ids, user_id) -> dict:
+        # Submits to `batch` the edits (or creations) of the parameters
+        # `values` of the deployment, given the `ids` of the existing ones
+        # (see _parameter_ids_of()). Returns {(node_id, name): future}, with
+        # ResourceNotFound in place of the futures of the missing parameters
+        # not created.
+        results = {}
+        for k, value in values.items():
+            key = DeploymentParameterSnapshot.key(*k)
+            if key in ids:
+                results[k] = batch.submit(self._edit_parameter, resource_id, key, ids[key],
+                                          value)
+            elif user_id:
+                results[k] = batch.submit(self._create_parameter, resource_id, key, user_id,
+                                          value)
+            else:
+                results[k] = ResourceNotFound(
+                    'Deployment parameter {0} of {1} not found.'.format(key, resource_id))
+        return results
+
     def set_parameter_ignoring_errors(self, resource_id, node_id, name, value):
         try:
             self.set_parameter(resource_id, node_id, name, value)
@@ -485,3 +909,70 @@ class Deployment(ResourceBase):
 
     def set_state_error(self, resource_id):
         self.set_state(resource_id, self.STATE_ERROR)
+
+
+class AsyncDeployment(object):
+    """Asyncio interface to the operations of Nuvla deployments, to be used
+    with AsyncApi. Operations on many deployments can be driven concurrently,
+    e.g. with asyncio.gather().
+    """
+
+    resource = Deployment.resource
+
+    def __init__(self, nuvla):
+        self.nuvla = nuvla
+
+    async def get(self, resource_id) -> CimiResource:
+        return await self.nuvla.get(resource_id)
+
+    async def get_state(self, resource_id):
+        resource = await self.nuvla.get(resource_id, select='id,state')
+        return Deployment.state(resource)
+
+    async def _operation(self, resource_id, operation, timeout=0,
+                         data: Optional[dict] = None, initial_delay=DEFAULT_INITIAL_DELAY,
+                         max_delay=DEFAULT_MAX_DELAY) -> CimiResponse:
+        """See Deployment._operation()"""
+        deadline = time.monotonic() + timeout
+        backoff = Backoff(initial_delay, max_delay)
+        while True:
+            resource = await self.nuvla.get(resource_id, select=OPERATION_SELECT)
+            if operation in resource.operations:
+                if operation == 'delete':
+                    return await self.nuvla.delete(resource.id, prefetch=False)
+                return await self.nuvla.operation(resource, operation, data)
+            msg = _operation_not_available_msg(operation, resource)
+            if time.monotonic() >= deadline:
+                raise DeploymentOperationNotAvailable(msg)
+            delay = backoff.next_delay(deadline)
+            logger.info('%s Retrying in %.1fs.', msg, delay)
+            await asyncio.sleep(delay)
+
+    async def start(self, resource_id, timeout=0):
+        return await self._operation(resource_id, 'start', timeout)
+
+    async def stop(self, resource_id, timeout=0):
+        return await self._operation(resource_id, 'stop', timeout)
+
+    async def delete(self, resource_id, timeout=0):
+        return await self._operation(resource_id, 'delete', timeout)
+
+    async def follow_logs(self, logs: CimiResource, timeout: Optional[float] = None,
+                          initial_delay=DEFAULT_LOG_POLL_DELAY, max_delay=DEFAULT_MAX_DELAY,
+                          buffer_size=DEFAULT_TAIL_SIZE) -> AsyncIterator[str]:
+        """See Deployment.follow_logs()"""
+        follower = _LogFollower(timeout, initial_delay, max_delay, buffer_size)
+        for line in follower.new_lines(logs):
+            yield line
+        while not follower.expired():
+            if follower.should_fetch():
+                await self.nuvla.operation(logs, 'fetch')
+                follower.fetched()
+            await asyncio.sleep(follower.next_delay())
+            for line in follower.new_lines(await self.nuvla.get(logs.id, select=LOG_SELECT)):
+                yield line
+
+    async def terminate(self, resource_id: str, timeout=30) -> CimiResponse:
+        """See Deployment.terminate()"""
+        await self.stop(resource_id)
+        return await self.delete(resource_id, timeout=timeout)
@@ -1,3 +1,14 @@
+import logging
+import threading
+from concurrent.futures import Future
+from typing import Dict, Iterable, Optional, Tuple, Union
+
+from ..api import DEFAULT_CONCURRENCY, DEFAULT_PAGE_SIZE
+from ..batch import _outcome
+from ..util.filter import filter_or
+
+logger = logging.getLogger(__name__)
+
 
 class DeploymentParameter(object):
 
@@ -36,3 +47,285 @@ class DeploymentParameter(object):
 
     HOSTNAME = {'name': 'hostname',
                 'description': 'Hostname or IP to access the service.'}
+
+
+# Attributes of the parameters kept by DeploymentParameterSnapshot.
+SNAPSHOT_SELECT = 'id,name,node-id,value,updated'
+# Number of deployments per search filter of fetch_many().
+DEFAULT_CHUNK_SIZE = 100
+
+
+class DeploymentParameterSnapshot(object):
+    """Parameters of a deployment, fetched with one paged and projected
+    search, indexed by (node-id, name) and refreshed incrementally. The
+    global parameters (not belonging to a node) have the node-id ''.
+
+        snapshot = Deployment(api).parameter_snapshot(deployment_id)
+        snapshot.get('machine', 'hostname')
+        ...
+        snapshot.refresh()  # fetches the parameters updated since
+    """
+
+    def __init__(self, nuvla, deployment_id: str, page_size=DEFAULT_PAGE_SIZE, fetch=True):
+        self.nuvla = nuvla
+        self.deployment_id = deployment_id
+        self.page_size = page_size
+        self._params: Dict[Tuple[str, str], dict] = {}
+        self._updated: Optional[str] = None
+        self._values: Optional[dict] = None
+        self._lock = threading.Lock()
+        if fetch:
+            self.refresh(full=True)
+
+    @staticmethod
+    def key(node_id: Optional[str], name: str) -> Tuple[str, str]:
+        return node_id or '', name
+
+    def refresh(self, full=False) -> int:
+        """Fetches the parameters updated since the last refresh, or all of
+        them if `full` (which also forgets the deleted parameters). Returns
+        the number of parameters fetched."""
+        fltr = "parent='{}'".format(self.deployment_id)
+        since = None if full else self._updated
+        if since:
+            # Parameters updated in the same millisecond as the last one
+            # fetched are fetched again rather than missed.
+            fltr += " and updated>='{}'".format(since)
+        params = [p.data for p in self.nuvla.search_iter(
+            'deployment-parameter', page_size=self.page_size, prefetch=False,
+            filter=fltr, select=SNAPSHOT_SELECT, orderby='updated:asc')]
+        self._update(params, full)
+        return len(params)
+
+    def _update(self, params: list, full=False):
+        with self._lock:
+            if full:
+                self._params = {}
+            if full or params:
+                self._values = None
+            for p in params:
+                self._params[self.key(p.get('node-id'), p['name'])] = p
+                if p.get('updated') and (self._updated is None or p['updated'] > self._updated):
+                    self._updated = p['updated']
+
+    @classmethod
+    def fetch_many(cls, nuvla, deployment_ids: Iterable[str], chunk_size=DEFAULT_CHUNK_SIZE,
+                   page_size=DEFAULT_PAGE_SIZE) -> Dict[str, 'DeploymentParameterSnapshot']:
+        """Returns the snapshots of the parameters of the deployments
+        `deployment_ids` by id, fetched with one paged search per
+        `chunk_size` deployments."""
+        snapshots = {i: cls(nuvla, i, page_size, fetch=False) for i in deployment_ids}
+        ids = list(snapshots)
+        for i in range(0, len(ids), chunk_size):
+            chunk = ids[i:i + chunk_size]
+            by_parent = {}
+            for p in nuvla.search_iter('deployment-parameter', page_size=page_size,
+                                       prefetch=False,
+                                       filter=filter_or([f"parent='{_id}'" for _id in chunk]),
+                                       select=SNAPSHOT_SELECT + ',parent',
+                                       orderby='updated:asc'):
+                by_parent.setdefault(p.data['parent'], []).append(p.data)
+            for _id in chunk:
+                snapshots[_id]._update(by_parent.get(_id, []), full=True)
+        return snapshots
+
+    def __len__(self):
+        return len(self._params)
+
+    def __contains__(self, key: Tuple[Optional[str], str]):
+        return self.key(*key) in self._params
+
+    def parameter(self, node_id: Optional[str], name: str) -> Optional[dict]:
+        """Returns the parameter (id, name, node-id, value and updated), or
+        None if not found."""
+        return self._params.get(self.key(node_id, name))
+
+    def get(self, node_id: Optional[str], name: str, default=None):
+        """Returns the value of the parameter `name` of `node_id`."""
+        param = self.parameter(node_id, name)
+        return default if param is None else param.get('value', default)
+
+    def parameters(self, node_id='') -> Union[list, dict]:
+        """Returns the parameters like Deployment.get_parameters()."""
+        with self._lock:
+            params = list(self._params.items())
+        if node_id:
+            return [{name: p.get('value')} for (nid, name), p in params if nid == node_id]
+        result = {}
+        for (nid, name), p in params:
+            result.setdefault(nid or 'global', {})[name] = p.get('value')
+        return result
+
+    def values(self) -> dict:
+        """Returns {name: value} of all the parameters, the node parameters
+        taking precedence over the global ones. The dict is computed once per
+        refresh and must not be modified."""
+        with self._lock:
+            if self._values is None:
+                params = sorted(self._params.items(), key=lambda i: i[0][0] != '')
+                self._values = {name: p.get('value') for (_, name), p in params}
+            return self._values
+
+
+DEFAULT_FLUSH_INTERVAL = 5.0
+
+
+class DeploymentParameterReporter(object):
+    """Writes the values of deployment parameters (e.g. those defined by
+    DeploymentParameter) which changed since they were last written.
+
+    Values are recorded by report() and written by flush(): successive values
+    of a parameter within a flush are coalesced into the last one, and the
+    values equal to the ones last written (or being written) are skipped.
+    The changed parameters of all the deployments are written in parallel,
+    at most `concurrency` requests at once, like with
+    Deployment.set_parameters(). Values are converted to str.
+
+        reporter = DeploymentParameterReporter(Deployment(api), user_id)
+        reporter.start()  # flushes every `flush_interval` seconds
+        ...
+        reporter.report(deployment_id, node_id, DeploymentParameter.CURRENT_STATE['name'],
+                        'running')
+        ...
+        reporter.stop()  # flushes the last values
+
+    :param deployment_api: Deployment
+    :param user_id: Owner of the parameters to create when missing (they
+    aren't created if None).
+    """
+
+    def __init__(self, deployment_api, user_id=None, flush_interval=DEFAULT_FLUSH_INTERVAL,
+                 concurrency=DEFAULT_CONCURRENCY):
+        self.deployment_api = deployment_api
+        self.user_id = user_id
+        self.flush_interval = flush_interval
+        self.concurrency = concurrency
+        # deployment id -> {(node-id, name): value}
+        self._sent: Dict[str, Dict[Tuple[str, str], str]] = {}
+        self._in_flight: Dict[str, Dict[Tuple[str, str], str]] = {}
+        self._pending: Dict[str, Dict[Tuple[str, str], str]] = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.writes = 0
+        self.skipped = 0
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def report(self, resource_id: str, node_id: Optional[str], name: str, value) -> bool:
+        """Records the value of a parameter. Returns False if it is the
+        value last written (or being written), which won't be written
+        again."""
+        key = DeploymentParameterSnapshot.key(node_id, name)
+        value = str(value)
+        with self._lock:
+            pending = self._pending.get(resource_id, {})
+            in_flight = self._in_flight.get(resource_id, {})
+            last = in_flight[key] if key in in_flight \
+                else self._sent.get(resource_id, {}).get(key)
+            if last == value:
+                self.skipped += 1
+                if pending.pop(key, None) is not None and not pending:
+                    del self._pending[resource_id]
+                return False
+            self._pending.setdefault(resource_id, {})[key] = value
+            return True
+
+    def report_many(self, resource_id: str, values: Dict[Tuple[Optional[str], str], object]):
+        """Records the values {(node_id, name): value} of parameters of the
+        deployment `resource_id`."""
+        for (node_id, name), value in values.items():
+            self.report(resource_id, node_id, name, value)
+
+    def pending(self) -> int:
+        """Number of values to write."""
+        with self._lock:
+            return sum(len(v) for v in self._pending.values())
+
+    def flush(self) -> Dict[str, Dict[Tuple[str, str], Exception]]:
+        """Writes the changed values. Returns the errors by deployment id and
+        parameter. The values which failed are written again by the next
+        flush only if reported again."""
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+                self._in_flight = pending
+            try:
+                results = self._write(pending)
+            finally:
+                with self._lock:
+                    self._in_flight = {}
+            errors = {}
+            with self._lock:
+                for resource_id, values in pending.items():
+                    failed = {k: r for k, r in results[resource_id].items()
+                              if isinstance(r, Exception)}
+                    sent = self._sent.setdefault(resource_id, {})
+                    for key, value in values.items():
+                        if key in failed:
+                            sent.pop(key, None)
+                        else:
+                            sent[key] = value
+                            self.writes += 1
+                    if failed:
+                        errors[resource_id] = failed
+            for resource_id, failed in errors.items():
+                logger.warning('Failed to write %d parameters of %s: %s', len(failed),
+                               resource_id, next(iter(failed.values())))
+            return errors
+
+    def _write(self, pending) -> Dict[str, Dict[Tuple[str, str], object]]:
+        # Writes the values of all the deployments with one batch: the ids of
+        # their parameters are resolved first, then all the values written.
+        # Returns {deployment id: {(node-id, name): result or exception}}.
+        dpl_api = self.deployment_api
+        results = {}
+        with dpl_api.nuvla.batch(self.concurrency) as batch:
+            ids = {resource_id: batch.submit(dpl_api._parameter_ids_of, resource_id,
+                                             set(values))
+                   for resource_id, values in pending.items()}
+            for resource_id, values in pending.items():
+                try:
+                    results[resource_id] = dpl_api._submit_parameters(
+                        batch, resource_id, values, ids[resource_id].result(), self.user_id)
+                except Exception as ex:
+                    results[resource_id] = {key: ex for key in values}
+        return {resource_id: {k: _outcome(r) if isinstance(r, Future) else r
+                              for k, r in rs.items()}
+                for resource_id, rs in results.items()}
+
+    def forget(self, resource_id: str):
+        """Drops the values of the deployment `resource_id` (e.g. deleted)."""
+        with self._lock:
+            self._sent.pop(resource_id, None)
+            self._pending.pop(resource_id, None)
+            self._in_flight.pop(resource_id, None)
+
+    def start(self) -> 'DeploymentParameterReporter':
+        """Flushes every `flush_interval` seconds in a background thread."""
+        if self._thread is None:
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self._run, daemon=True,
+                                            name='nuvla-parameter-reporter')
+            self._thread.start()
+        return self
+
+    def stop(self):
+        """Stops the background thread and flushes the last values."""
+        if self._thread is not None:
+            self._stopped.set()
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+    def _run(self):
+        while not self._stopped.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as ex:
+                logger.warning('Failed to flush deployment parameters: %s', ex)
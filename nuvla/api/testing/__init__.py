@@ -0,0 +1,4 @@
+# -*- coding: utf-8 -*-
+
+from .filter import FilterError, compile_filter
+from .server import FakeNuvla
@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+"""Evaluation of CIMI filters on documents.
+
+Supported: comparisons `attribute op value` with the operators `=`, `!=`,
+`^=` (prefix), `<`, `<=`, `>`, `>=`; values quoted with ' or ", numbers,
+`true`, `false` and `null`; `and`, `or` and parentheses. Attributes can be
+nested with `/` (e.g. `module/href`). A comparison on a list attribute
+holds if it holds for one of its elements.
+"""
+
+import re
+from typing import Callable
+
+_TOKEN = re.compile(r'''
+    \s*(?:
+      (?P<lparen>\()
+    | (?P<rparen>\))
+    | (?P<op>!=|\^=|<=|>=|=|<|>)
+    | '(?P<squote>(?:[^'\\]|\\.)*)'
+    | "(?P<dquote>(?:[^"\\]|\\.)*)"
+    | (?P<word>[\w:/.@$-]+)
+    )''', re.VERBOSE)
+
+MISSING = object()
+
+
+class FilterError(ValueError):
+    pass
+
+
+def _tokenize(fltr: str) -> list:
+    tokens = []
+    pos = 0
+    fltr = fltr.rstrip()
+    while pos < len(fltr):
+        match = _TOKEN.match(fltr, pos)
+        if match is None or match.end() == pos:
+            raise FilterError('invalid filter at position {0}: {1}'
+                              .format(pos, fltr[pos:]))
+        kind = match.lastgroup
+        value = match.group(kind)
+        if kind in ('squote', 'dquote'):
+            kind, value = 'string', re.sub(r'\\(.)', r'\1', value)
+        tokens.append((kind, value))
+        pos = match.end()
+    return tokens
+
+
+def _literal(kind, value):
+    if kind == 'string':
+        return value
+    if value == 'null':
+        return None
+    if value == 'true':
+        return True
+    if value == 'false':
+        return False
+    try:
+        return int(value)
+    except ValueError:
+        try:
+            return float(value)
+        except ValueError:
+            raise FilterError('invalid value: {}'.format(value))
+
+
+def get_attribute(doc: dict, attribute: str):
+    value = doc
+    for key in attribute.split('/'):
+        if not isinstance(value, dict) or key not in value:
+            return MISSING
+        value = value[key]
+    return value
+
+
+def _compare(actual, op, expected) -> bool:
+    if expected is None:
+        is_null = actual is MISSING or actual is None
+        return is_null if op == '=' else not is_null
+    if actual is MISSING or actual is None:
+        return op == '!='
+    if isinstance(actual, list):
+        if op == '!=':
+            return all(_compare(v, op, expected) for v in actual)
+        return any(_compare(v, op, expected) for v in actual)
+    try:
+        if op == '=':
+            return actual == expected
+        if op == '!=':
+            return actual != expected
+        if op == '^=':
+            return isinstance(actual, str) and actual.startswith(str(expected))
+        if op == '<':
+            return actual < expected
+        if op == '<=':
+            return actual <= expected
+        if op == '>':
+            return actual > expected
+        return actual >= expected
+    except TypeError:
+        return False
+
+
+class _Parser(object):
+
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.pos = 0
+
+    def peek(self):
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else (None, None)
+
+    def next(self):
+        token = self.peek()
+        if token[0] is None:
+            raise FilterError('unexpected end of filter')
+        self.pos += 1
+        return token
+
+    def parse(self) -> Callable[[dict], bool]:
+        predicate = self.or_expr()
+        if self.peek()[0] is not None:
+            raise FilterError('unexpected token: {}'.format(self.peek()[1]))
+        return predicate
+
+    def _keyword(self, keyword):
+        kind, value = self.peek()
+        return kind == 'word' and value.lower() == keyword
+
+    def or_expr(self):
+        operands = [self.and_expr()]
+        while self._keyword('or'):
+            self.next()
+            operands.append(self.and_expr())
+        if len(operands) == 1:
+            return operands[0]
+        return lambda doc: any(p(doc) for p in operands)
+
+    def and_expr(self):
+        operands = [self.primary()]
+        while self._keyword('and'):
+            self.next()
+            operands.append(self.primary())
+        if len(operands) == 1:
+            return operands[0]
+        return lambda doc: all(p(doc) for p in operands)
+
+    def primary(self):
+        kind, value = self.next()
+        if kind == 'lparen':
+            predicate = self.or_expr()
+            if self.next()[0] != 'rparen':
+                raise FilterError('missing closing parenthesis')
+            return predicate
+        if kind != 'word':
+            raise FilterError('attribute expected, got: {}'.format(value))
+        attribute = value
+        op_kind, op = self.next()
+        if op_kind != 'op':
+            raise FilterError('operator expected, got: {}'.format(op))
+        expected = _literal(*self.next())
+        return lambda doc: _compare(get_attribute(doc, attribute), op, expected)
+
+
+def compile_filter(fltr: str) -> Callable[[dict], bool]:
+    """Returns the predicate on documents of the CIMI filter `fltr`.
+    Raises FilterError if `fltr` is invalid."""
+    if not fltr or not fltr.strip():
+        return lambda doc: True
+    return _Parser(_tokenize(fltr)).parse()
@@ -0,0 +1,575 @@
+# -*- coding: utf-8 -*-
+"""In-process stand-in of the Nuvla CIMI server, for functional tests and
+benchmarks of the client without network nor Nuvla deployment.
+
+    with FakeNuvla(latency=0.005) as server:
+        api = Api(server.endpoint, persist_cookie=False)
+        api.login_password('user', 'pass')
+        ...
+
+Resources are kept in memory. Supported: cloud-entry-point, sessions
+(cookie based), search (GET or PUT) with first/last/filter/select/orderby,
+add (including templates), get, edit (with `select` and JSON patch), delete,
+resource operations, bulk delete and bulk operations, hooks, gzip (and
+chunked) request bodies and optional ETags.
+"""
+
+import copy
+import gzip
+import json
+import logging
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Optional, Union
+from urllib.parse import parse_qs, urlparse
+
+from .filter import MISSING, FilterError, compile_filter, get_attribute
+
+logger = logging.getLogger(__name__)
+
+COOKIE_NAME = 'com.sixsq.nuvla.cookie'
+DEFAULT_LAST = 10000
+
+DEFAULT_COLLECTIONS = ['callback', 'credential', 'data-object', 'data-record',
+                       'data-record-key-prefix', 'data-set', 'deployment',
+                       'deployment-log', 'deployment-parameter', 'infrastructure-service',
+                       'job', 'module', 'notification', 'session', 'user']
+
+
+def _format(dt: datetime) -> str:
+    return dt.strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+
+
+class ResourceOperationError(Exception):
+
+    def __init__(self, status, message):
+        super(ResourceOperationError, self).__init__(message)
+        self.status = status
+        self.message = message
+
+
+def _deployment_start(server, doc, data):
+    doc['state'] = 'STARTED'
+
+
+def _deployment_stop(server, doc, data):
+    doc['state'] = 'STOPPED'
+
+
+def _deployment_create_log(server, doc, data):
+    log = dict(data or {}, parent=doc['id'], log=[])
+    log_id = server.add_resource('deployment-log', log)
+    return {'status': 201, 'resource-id': log_id,
+            'message': '{} created'.format(log_id)}
+
+
+def _deployment_log_fetch(server, doc, data):
+    doc['last-timestamp'] = _format(datetime.now(timezone.utc))
+
+
+# Operations of the resources: (resource type, operation) ->
+# (states in which the operation is available or None for any state,
+#  function(server, document, request body) applying it, which can return
+#  the response). The 'delete' operation is applied by DELETE requests.
+DEFAULT_OPERATIONS = {
+    ('deployment', 'delete'): (('CREATED', 'STOPPED', 'ERROR'), None),
+    ('deployment', 'start'): (('CREATED', 'STOPPED', 'ERROR'), _deployment_start),
+    ('deployment', 'stop'): (('STARTED', 'ERROR'), _deployment_stop),
+    ('deployment', 'create-log'): (('STARTED',), _deployment_create_log),
+    ('deployment-log', 'fetch'): (None, _deployment_log_fetch),
+}
+
+# Initial attributes of the resources created by type.
+DEFAULT_ATTRIBUTES = {
+    'deployment': {'state': 'CREATED'},
+}
+
+
+class FakeNuvla(object):
+    """Local CIMI server running in a background thread.
+
+    :param latency: Seconds added to the processing of each request, or
+    function(method, path) returning them.
+    :param require_auth: Reply 401 to the requests without a valid session
+    cookie (but cloud-entry-point and login).
+    :param users: {username: password} accepted by session-template/password.
+    Any credentials are accepted when None.
+    :param etag: Send ETag headers and honour If-None-Match on get.
+
+    The requests received are recorded in `requests` as (method, path) and
+    the number of TCP connections accepted in `connections`.
+    """
+
+    def __init__(self, latency: Union[float, Callable[[str, str], float]] = 0.0,
+                 require_auth=False, users: Optional[Dict[str, str]] = None,
+                 etag=False, host='127.0.0.1', port=0):
+        self.latency = latency
+        self.require_auth = require_auth
+        self.users = users
+        self.etag = etag
+        self.operations = dict(DEFAULT_OPERATIONS)
+        self.attributes = copy.deepcopy(DEFAULT_ATTRIBUTES)
+        self.collections = list(DEFAULT_COLLECTIONS)
+        self.resources = {}
+        self.sessions = {}
+        self.requests = []
+        self.connections = 0
+        self.lock = threading.RLock()
+        self._last_updated = None
+        self._httpd = _HTTPServer((host, port), _Handler)
+        self._httpd.fake = self
+        self._thread = None
+
+    @property
+    def endpoint(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return 'http://{0}:{1}'.format(host, port)
+
+    def start(self) -> 'FakeNuvla':
+        self._thread = threading.Thread(target=self._httpd.serve_forever,
+                                        name='fake-nuvla', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def _timestamp(self) -> str:
+        # Strictly increasing, so that `updated` can be used for incremental
+        # searches.
+        now = datetime.now(timezone.utc)
+        if self._last_updated is not None and now <= self._last_updated:
+            now = self._last_updated + timedelta(microseconds=1)
+        self._last_updated = now
+        return _format(now)
+
+    def add_resource(self, resource_type: str, doc: dict, owner='group/nuvla-admin') -> str:
+        """Stores `doc` as a new resource of `resource_type`. Returns its id."""
+        with self.lock:
+            doc = dict(copy.deepcopy(self.attributes.get(resource_type, {})), **doc)
+            resource_id = doc.get('id') or '{0}/{1}'.format(resource_type, uuid.uuid4())
+            now = self._timestamp()
+            doc.update({'id': resource_id,
+                        'resource-type': resource_type,
+                        'created': doc.get('created', now),
+                        'updated': now})
+            doc.setdefault('acl', {'owners': [owner]})
+            if resource_type == 'deployment':
+                self._resolve_module(doc)
+            self.resources[resource_id] = doc
+            return resource_id
+
+    def _resolve_module(self, doc):
+        href = (doc.get('module') or {}).get('href')
+        module = self.resources.get(href)
+        if module is not None:
+            doc['module'] = dict(copy.deepcopy(module), href=href)
+
+    def touch(self, doc: dict):
+        doc['updated'] = self._timestamp()
+
+    def _operations(self, doc) -> list:
+        resource_id = doc['id']
+        ops = [{'rel': 'edit', 'href': resource_id}]
+        if self._operation_available(doc, 'delete'):
+            ops.append({'rel': 'delete', 'href': resource_id})
+        for (resource_type, name), (states, _) in self.operations.items():
+            if resource_type == doc['resource-type'] and name != 'delete' \
+                    and (states is None or doc.get('state') in states):
+                ops.append({'rel': name, 'href': '{0}/{1}'.format(resource_id, name)})
+        return ops
+
+    def _operation_available(self, doc, operation) -> bool:
+        states, _ = self.operations.get((doc['resource-type'], operation), (None, None))
+        return states is None or doc.get('state') in states
+
+    def render(self, doc: dict, select=None) -> dict:
+        doc = dict(doc, operations=self._operations(doc))
+        if select:
+            keep = set(select) | {'id', 'resource-type'}
+            doc = {k: v for k, v in doc.items() if k in keep}
+        return doc
+
+    # Request processing. Methods return (status, body, headers).
+
+    def delay(self, method, path):
+        latency = self.latency(method, path) if callable(self.latency) else self.latency
+        if latency:
+            time.sleep(latency)
+
+    def cloud_entry_point(self, base_uri):
+        return 200, {'id': 'cloud-entry-point',
+                     'resource-type': 'cloud-entry-point',
+                     'base-uri': base_uri,
+                     'collections': {c: {'href': c} for c in self.collections}}, {}
+
+    def login(self, body):
+        template = (body or {}).get('template', {})
+        href = template.get('href')
+        username = None
+        if href == 'session-template/password':
+            username = template.get('username')
+            if self.users is not None and self.users.get(username) != template.get('password'):
+                return 403, {'status': 403, 'message': 'invalid credentials'}, {}
+        elif href == 'session-template/api-key':
+            username = template.get('key')
+        else:
+            return 400, {'status': 400, 'message': 'invalid session template'}, {}
+        token = uuid.uuid4().hex
+        session_id = self.add_resource('session', {'identifier': username,
+                                                   'user': username,
+                                                   'template': {'href': href}},
+                                       owner=username)
+        with self.lock:
+            self.sessions[token] = session_id
+        return 201, {'status': 201, 'resource-id': session_id,
+                     'message': '{} created'.format(session_id)}, \
+            {'Set-Cookie': '{0}={1}; Path=/'.format(COOKIE_NAME, token)}
+
+    def session_id(self, token) -> Optional[str]:
+        with self.lock:
+            session_id = self.sessions.get(token)
+            if session_id is not None and session_id not in self.resources:
+                del self.sessions[token]
+                session_id = None
+            return session_id
+
+    def search(self, resource_type, params, session_id):
+        try:
+            predicate = compile_filter(params.get('filter'))
+        except FilterError as ex:
+            return 400, {'status': 400, 'message': str(ex)}, {}
+        first = int(params.get('first', 1))
+        last = int(params.get('last', DEFAULT_LAST))
+        with self.lock:
+            docs = [d for d in self.resources.values()
+                    if d['resource-type'] == resource_type and predicate(d)]
+            if resource_type == 'session':
+                docs = [d for d in docs if d['id'] == session_id]
+            for order in reversed(_split(params.get('orderby'))):
+                attribute, _, direction = order.partition(':')
+                docs.sort(key=lambda d: _sort_key(get_attribute(d, attribute)),
+                          reverse=direction == 'desc')
+            select = _split(params.get('select'))
+            resources = [self.render(d, select) for d in docs[max(first, 1) - 1:max(last, 0)]]
+        return 200, {'id': resource_type,
+                     'resource-type': '{}-collection'.format(resource_type),
+                     'count': len(docs),
+                     'resources': resources,
+                     'operations': [{'rel': 'add', 'href': resource_type}]}, {}
+
+    def add(self, resource_type, body, session_id):
+        if not isinstance(body, dict):
+            return 400, {'status': 400, 'message': 'invalid document'}, {}
+        body = dict(body)
+        template = body.pop('template', None)
+        if isinstance(template, dict):
+            body.update({k: v for k, v in template.items() if k != 'href'})
+        for k in ('id', 'resource-type', 'created', 'updated', 'operations'):
+            body.pop(k, None)
+        if resource_type == 'deployment' \
+                and (body.get('module') or {}).get('href') not in self.resources:
+            return 400, {'status': 400, 'message': 'invalid module'}, {}
+        owner = self.resources.get(session_id, {}).get('user') or 'group/nuvla-admin'
+        resource_id = self.add_resource(resource_type, body, owner=owner)
+        return 201, {'status': 201, 'resource-id': resource_id,
+                     'message': '{} created'.format(resource_id)}, \
+            {'Location': resource_id}
+
+    def _not_found(self, resource_id):
+        return 404, {'status': 404, 'resource-id': resource_id,
+                     'message': '{} not found'.format(resource_id)}, {}
+
+    def get(self, resource_id, params, if_none_match=None):
+        with self.lock:
+            doc = self.resources.get(resource_id)
+            if doc is None:
+                return self._not_found(resource_id)
+            etag = '"{}"'.format(doc['updated']) if self.etag else None
+            if etag and if_none_match == etag:
+                return 304, None, {'ETag': etag}
+            return 200, self.render(doc, _split(params.get('select'))), \
+                {'ETag': etag} if etag else {}
+
+    def edit(self, resource_id, body, params, json_patch=False):
+        with self.lock:
+            doc = self.resources.get(resource_id)
+            if doc is None:
+                return self._not_found(resource_id)
+            if json_patch:
+                try:
+                    doc = _json_patch(copy.deepcopy(doc), body)
+                except (KeyError, IndexError, ValueError) as ex:
+                    return 400, {'status': 400, 'message': 'invalid patch: {}'.format(ex)}, {}
+            else:
+                doc = dict(doc)
+                for k in _split(params.get('select')):
+                    if k not in body:
+                        doc.pop(k, None)
+                body = {k: v for k, v in body.items()
+                        if k not in ('id', 'resource-type', 'created', 'updated',
+                                     'operations')}
+                doc.update(body)
+            self.touch(doc)
+            self.resources[resource_id] = doc
+            return 200, self.render(doc), {}
+
+    def delete(self, resource_id):
+        with self.lock:
+            doc = self.resources.get(resource_id)
+            if doc is None:
+                return self._not_found(resource_id)
+            if not self._operation_available(doc, 'delete'):
+                return 409, {'status': 409, 'message': 'operation delete not allowed in state {}'
+                             .format(doc.get('state'))}, {}
+            del self.resources[resource_id]
+        return 200, {'status': 200, 'resource-id': resource_id,
+                     'message': '{} deleted'.format(resource_id)}, {}
+
+    def _apply_operation(self, doc, operation, body):
+        spec = self.operations.get((doc['resource-type'], operation))
+        if spec is None:
+            raise ResourceOperationError(
+                404, 'undefined operation {0} on {1}'.format(operation, doc['id']))
+        states, fn = spec
+        if fn is None:
+            raise ResourceOperationError(
+                405, 'operation {0} on {1} is not a POST'.format(operation, doc['id']))
+        if states is not None and doc.get('state') not in states:
+            raise ResourceOperationError(
+                409, 'operation {0} not allowed in state {1}'.format(operation, doc.get('state')))
+        response = fn(self, doc, body)
+        self.touch(doc)
+        return response
+
+    def _job(self, action, target):
+        return self.add_resource('job', {'action': action,
+                                         'target-resource': {'href': target},
+                                         'state': 'SUCCESS',
+                                         'progress': 100})
+
+    def operation(self, resource_id, operation, body):
+        with self.lock:
+            doc = self.resources.get(resource_id)
+            if doc is None:
+                return self._not_found(resource_id)
+            try:
+                response = self._apply_operation(doc, operation, body)
+            except ResourceOperationError as ex:
+                return ex.status, {'status': ex.status, 'message': ex.message}, {}
+            if response is not None:
+                return response['status'], response, {}
+            job_id = self._job(operation, resource_id)
+            return 202, {'status': 202, 'resource-id': resource_id, 'location': job_id,
+                         'message': 'starting {0} with async {1}'.format(resource_id, job_id)}, {}
+
+    def bulk_delete(self, resource_type, params):
+        try:
+            predicate = compile_filter(params.get('filter'))
+        except FilterError as ex:
+            return 400, {'status': 400, 'message': str(ex)}, {}
+        with self.lock:
+            ids = [i for i, d in self.resources.items()
+                   if d['resource-type'] == resource_type and predicate(d)]
+            for i in ids:
+                del self.resources[i]
+        return 200, {'status': 200, 'deleted': len(ids),
+                     'message': '{} resources deleted'.format(len(ids))}, {}
+
+    def bulk_operation(self, resource_type, operation, body):
+        body = dict(body or {})
+        try:
+            predicate = compile_filter(body.pop('filter', None))
+        except FilterError as ex:
+            return 400, {'status': 400, 'message': str(ex)}, {}
+        with self.lock:
+            docs = [d for d in self.resources.values()
+                    if d['resource-type'] == resource_type and predicate(d)]
+            for doc in docs:
+                try:
+                    self._apply_operation(doc, operation, body)
+                except ResourceOperationError:
+                    pass
+            job_id = self._job('bulk-' + operation, resource_type)
+        return 202, {'status': 202, 'location': job_id,
+                     'message': 'starting bulk {0} with async {1}'.format(operation, job_id)}, {}
+
+    def hook(self, operation, body):
+        return 200, {'status': 200, 'message': 'hook {} called'.format(operation)}, {}
+
+    def handle(self, method, path, query, headers, body):
+        """Dispatches the request. Returns (status, body, headers)."""
+        uri = path[len('/api/'):].strip('/')
+        parts = uri.split('/')
+        params = dict(query)
+        if isinstance(body, dict) and method in ('GET', 'PUT', 'DELETE') \
+                and headers.get('Content-Type', '').startswith('application/x-www-form-urlencoded'):
+            params.update(body)
+        session_id = self.session_id(_cookie(headers.get('Cookie', '')))
+
+        if uri == 'cloud-entry-point':
+            return self.cloud_entry_point(headers.get('Host', ''))
+        if uri == 'session' and method == 'POST':
+            return self.login(body)
+        if self.require_auth and session_id is None:
+            return 401, {'status': 401, 'message': 'unauthorized'}, {}
+        if parts[0] == 'hook' and len(parts) == 2 and method == 'POST':
+            return self.hook(parts[1], body)
+
+        bulk = headers.get('bulk') is not None
+        if len(parts) == 1:
+            if method in ('GET', 'PUT'):
+                return self.search(uri, params, session_id)
+            if method == 'POST':
+                return self.add(uri, body, session_id)
+            if method == 'DELETE' and bulk:
+                return self.bulk_delete(uri, params)
+        elif len(parts) == 2:
+            if method == 'PATCH' and bulk:
+                return self.bulk_operation(parts[0], parts[1], body)
+            if method == 'GET':
+                return self.get(uri, params, headers.get('If-None-Match'))
+            if method == 'PUT':
+                return self.edit(uri, body if body is not None else {}, params,
+                                 'json-patch' in headers.get('Content-Type', ''))
+            if method == 'DELETE':
+                if parts[0] == 'session':
+                    with self.lock:
+                        self.sessions = {t: s for t, s in self.sessions.items() if s != uri}
+                return self.delete(uri)
+        elif len(parts) == 3 and method == 'POST':
+            return self.operation('/'.join(parts[:2]), parts[2], body)
+        return 405, {'status': 405, 'message': 'unsupported request {0} {1}'
+                     .format(method, path)}, {}
+
+
+def _split(value) -> list:
+    if not value:
+        return []
+    if isinstance(value, str):
+        value = [value]
+    return [v.strip() for vs in value for v in vs.split(',') if v.strip()]
+
+
+def _sort_key(value):
+    # Missing values first, then by type to avoid comparing str with int.
+    if value is None or value is MISSING or isinstance(value, (dict, list)):
+        return 0, '', 0
+    if isinstance(value, (int, float)):
+        return 1, '', value
+    return 2, str(value), 0
+
+
+def _cookie(header) -> Optional[str]:
+    for part in header.split(';'):
+        name, _, value = part.strip().partition('=')
+        if name == COOKIE_NAME:
+            return value
+    return None
+
+
+def _json_patch(doc, operations):
+    for op in operations:
+        keys = [k.replace('~1', '/').replace('~0', '~')
+                for k in op['path'].lstrip('/').split('/')]
+        target = doc
+        for k in keys[:-1]:
+            target = target[int(k)] if isinstance(target, list) else target[k]
+        key = keys[-1]
+        if isinstance(target, list):
+            key = len(target) if key == '-' else int(key)
+        if op['op'] in ('add', 'replace'):
+            if isinstance(target, list) and op['op'] == 'add':
+                target.insert(key, op['value'])
+            else:
+                target[key] = op['value']
+        elif op['op'] == 'remove':
+            del target[key]
+        else:
+            raise ValueError('unsupported operation {}'.format(op['op']))
+    return doc
+
+
+class _HTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        super(_Handler, self).setup()
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        with self.server.fake.lock:
+            self.server.fake.connections += 1
+
+    def log_message(self, fmt, *args):
+        logger.debug(fmt, *args)
+
+    def _read_body(self) -> bytes:
+        if self.headers.get('Transfer-Encoding', '').lower() == 'chunked':
+            chunks = []
+            while True:
+                size = int(self.rfile.readline().split(b';')[0], 16)
+                if size == 0:
+                    self.rfile.readline()
+                    break
+                chunks.append(self.rfile.read(size))
+                self.rfile.readline()
+            data = b''.join(chunks)
+        else:
+            data = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if self.headers.get('Content-Encoding') == 'gzip':
+            data = gzip.decompress(data)
+        return data
+
+    def _handle(self):
+        fake = self.server.fake
+        url = urlparse(self.path)
+        data = self._read_body()
+        content_type = self.headers.get('Content-Type', '')
+        body = None
+        if data:
+            if content_type.startswith('application/x-www-form-urlencoded'):
+                body = {k: v if len(v) > 1 else v[0]
+                        for k, v in parse_qs(data.decode()).items()}
+            else:
+                try:
+                    body = json.loads(data)
+                except ValueError:
+                    body = None
+        query = {k: v if len(v) > 1 else v[0] for k, v in parse_qs(url.query).items()}
+        with fake.lock:
+            fake.requests.append((self.command, url.path))
+        fake.delay(self.command, url.path)
+        if not url.path.startswith('/api/'):
+            status, resp, headers = 404, {'status': 404, 'message': 'not found'}, {}
+        else:
+            try:
+                status, resp, headers = fake.handle(self.command, url.path, query,
+                                                    self.headers, body)
+            except Exception as ex:
+                logger.exception('Fake Nuvla failed processing %s %s', self.command, self.path)
+                status, resp, headers = 500, {'status': 500, 'message': str(ex)}, {}
+        payload = json.dumps(resp).encode() if resp is not None else b''
+        self.send_response(status)
+        for k, v in headers.items():
+            self.send_header(k, v)
+        if payload:
+            self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    do_GET = do_PUT = do_POST = do_DELETE = do_PATCH = _handle
@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+"""Optional tracing of the client.
+
+When a tracer is set with `set_tracer()`, a span is opened for each call of
+a resource helper method (e.g. `Deployment.launch`) and a child span for
+each HTTP request, so that a trace shows how many requests a helper makes
+and where the latency comes from. The tracer only needs the
+`start_as_current_span(name, attributes=None)` method of OpenTelemetry
+tracers:
+
+    from opentelemetry import trace
+    tracing.set_tracer(trace.get_tracer('nuvla.api'))
+
+`RecordingTracer` is an in-memory tracer which can print the span tree.
+Tracing is disabled by default: the instrumented code then only checks
+that no tracer is set.
+"""
+
+import contextvars
+import functools
+import inspect
+import threading
+import time
+from contextlib import contextmanager
+from typing import List, Optional
+
+_tracer = None
+
+
+def set_tracer(tracer):
+    """Sets the tracer used by all the clients, or disables tracing if None."""
+    global _tracer
+    _tracer = tracer
+
+
+def get_tracer():
+    return _tracer
+
+
+def in_current_context(fn):
+    """Returns `fn` bound to a copy of the current context, to be run in
+    another thread (e.g. by an executor): the spans it opens are then
+    children of the current span. Each call runs in its own copy, so the
+    function can be called concurrently."""
+    context = contextvars.copy_context()
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        return context.copy().run(fn, *args, **kwargs)
+    return wrapper
+
+
+def _traced_method(fn):
+    @functools.wraps(fn)
+    def wrapper(self, *args, **kwargs):
+        tracer = _tracer
+        if tracer is None:
+            return fn(self, *args, **kwargs)
+        name = '{0}.{1}'.format(type(self).__name__, fn.__name__)
+        with tracer.start_as_current_span(name, attributes={'nuvla.helper': name}):
+            return fn(self, *args, **kwargs)
+    wrapper.__traced__ = True
+    return wrapper
+
+
+def trace_methods(cls):
+    """Traces the public methods defined by `cls` (but static and class
+    methods and generator functions). Spans are named '<class>.<method>',
+    after the class of the instance."""
+    for name, attr in list(vars(cls).items()):
+        if name.startswith('_') or not inspect.isfunction(attr) \
+                or inspect.isgeneratorfunction(attr) or inspect.isasyncgenfunction(attr) \
+                or getattr(attr, '__traced__', False):
+            continue
+        setattr(cls, name, _traced_method(attr))
+    return cls
+
+
+class RecordedSpan(object):
+    """Span recorded by RecordingTracer."""
+
+    def __init__(self, name: str, attributes: Optional[dict] = None,
+                 parent: Optional['RecordedSpan'] = None):
+        self.name = name
+        self.attributes = dict(attributes or {})
+        self.parent = parent
+        self.children: List[RecordedSpan] = []
+        self.exception: Optional[BaseException] = None
+        self.start = time.perf_counter()
+        self.end = None
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def set_attributes(self, attributes: dict):
+        self.attributes.update(attributes)
+
+    def record_exception(self, exception: BaseException, **kwargs):
+        self.exception = exception
+
+    def set_status(self, *args, **kwargs):
+        pass
+
+    def add_event(self, *args, **kwargs):
+        pass
+
+    def is_recording(self) -> bool:
+        return self.end is None
+
+    @property
+    def duration(self) -> float:
+        return (self.end if self.end is not None else time.perf_counter()) - self.start
+
+    @property
+    def is_request(self) -> bool:
+        return 'http.request.method' in self.attributes
+
+    def request_count(self) -> int:
+        """Number of HTTP requests made within this span."""
+        return int(self.is_request) + sum(c.request_count() for c in self.children)
+
+    def format(self, indent=0) -> str:
+        line = '{0}{1} {2:.1f}ms'.format('  ' * indent, self.name, self.duration * 1000)
+        if self.is_request:
+            line += ' [{}]'.format(self.attributes.get('http.response.status_code', '-'))
+        elif self.children:
+            line += ' ({} requests)'.format(self.request_count())
+        if self.exception is not None:
+            line += ' !{}'.format(type(self.exception).__name__)
+        return '\n'.join([line] + [c.format(indent + 1) for c in self.children])
+
+
+class RecordingTracer(object):
+    """In-memory tracer keeping the trees of the spans opened in all the
+    threads. Spans opened in a thread without a current span are roots.
+
+        tracer = RecordingTracer()
+        tracing.set_tracer(tracer)
+        Deployment(api).launch(module_id)
+        print(tracer.format())
+    """
+
+    def __init__(self):
+        self._current = contextvars.ContextVar('nuvla_span', default=None)
+        self._lock = threading.Lock()
+        self.spans: List[RecordedSpan] = []
+
+    @contextmanager
+    def start_as_current_span(self, name, attributes=None, **kwargs):
+        parent = self._current.get()
+        span = RecordedSpan(name, attributes, parent)
+        with self._lock:
+            if parent is None:
+                self.spans.append(span)
+            else:
+                parent.children.append(span)
+        token = self._current.set(span)
+        try:
+            yield span
+        except BaseException as ex:
+            span.record_exception(ex)
+            raise
+        finally:
+            span.end = time.perf_counter()
+            self._current.reset(token)
+
+    def clear(self):
+        with self._lock:
+            self.spans.clear()
+
+    def format(self) -> str:
+        with self._lock:
+            return '\n'.join(s.format() for s in self.spans)
@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+import random
+import time
+from typing import Optional
+
+DEFAULT_INITIAL_DELAY = 0.5
+DEFAULT_MAX_DELAY = 10.0
+DEFAULT_FACTOR = 2.0
+
+
+class Backoff(object):
+    """Exponential backoff with jitter: the n-th delay is drawn between half
+    and all of `initial * factor ** n`, capped to `maximum`. The jitter
+    spreads the polling of many clients started at the same time."""
+
+    def __init__(self, initial=DEFAULT_INITIAL_DELAY, maximum=DEFAULT_MAX_DELAY,
+                 factor=DEFAULT_FACTOR, jitter=True):
+        self.initial = initial
+        self.maximum = maximum
+        self.factor = factor
+        self.jitter = jitter
+        self.attempt = 0
+
+    def reset(self):
+        """Starts again from the initial delay (e.g. after some progress)."""
+        self.attempt = 0
+
+    def next_delay(self, deadline: Optional[float] = None) -> float:
+        """Returns the next delay, shortened not to go past `deadline` (a
+        `time.monotonic()` value)."""
+        delay = min(self.maximum, self.initial * self.factor ** self.attempt)
+        self.attempt += 1
+        if self.jitter:
+            delay = random.uniform(delay / 2, delay)
+        if deadline is not None:
+            delay = max(0.0, min(delay, deadline - time.monotonic()))
+        return delay
+
+    def sleep(self, deadline: Optional[float] = None) -> float:
+        """Sleeps for the next delay (see next_delay()). Returns the time slept."""
+        delay = self.next_delay(deadline)
+        time.sleep(delay)
+        return delay
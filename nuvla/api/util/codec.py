@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+import json as jsonlib
+import logging
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+
+class JsonCodec(object):
+    """JSON encoder/decoder of request and response bodies, based on the
+    standard library. Bodies are serialized to compact UTF-8 bytes."""
+
+    name = 'json'
+
+    def dumps(self, obj) -> bytes:
+        return jsonlib.dumps(obj, separators=(',', ':'),
+                             ensure_ascii=False).encode('utf-8')
+
+    def loads(self, data: bytes):
+        return jsonlib.loads(data)
+
+
+class OrjsonCodec(JsonCodec):
+    """JSON codec based on `orjson`. Documents `orjson` can't serialize
+    (e.g. non string keys of unsupported types, Decimal) fall back to the
+    standard library."""
+
+    name = 'orjson'
+
+    def dumps(self, obj) -> bytes:
+        try:
+            return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+        except TypeError:
+            return super(OrjsonCodec, self).dumps(obj)
+
+    def loads(self, data: bytes):
+        return orjson.loads(data)
+
+
+def default_codec() -> JsonCodec:
+    """Returns the fastest available JSON codec."""
+    if orjson is not None:
+        return OrjsonCodec()
+    return JsonCodec()
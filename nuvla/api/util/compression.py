@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+import gzip
+import logging
+import threading
+import time
+import zlib
+from typing import Iterator, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MIN_SIZE = 1024
+DEFAULT_LEVEL = 6
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+
+class CompressionStats(object):
+    """Compression statistics of a single request body."""
+
+    def __init__(self, original_size: int, compressed_size: Optional[int] = None,
+                 cpu_time: float = 0.0, compressed=False, streamed=False):
+        self.original_size = original_size
+        self.compressed_size = compressed_size
+        self.cpu_time = cpu_time
+        self.compressed = compressed
+        self.streamed = streamed
+
+    @property
+    def sent_size(self) -> int:
+        return self.compressed_size if self.compressed else self.original_size
+
+    @property
+    def bytes_saved(self) -> int:
+        return self.original_size - self.sent_size
+
+    @property
+    def ratio(self) -> float:
+        return self.original_size / self.sent_size if self.sent_size else 1.0
+
+    def __repr__(self):
+        return ('CompressionStats(original_size={0}, compressed_size={1}, '
+                'cpu_time={2:.6f}, compressed={3}, streamed={4})'
+                .format(self.original_size, self.compressed_size,
+                        self.cpu_time, self.compressed, self.streamed))
+
+
+class CompressionCounters(object):
+    """Thread-safe totals of the compression statistics of a client."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.compressed = 0
+        self.skipped = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.cpu_time = 0.0
+
+    def add(self, stats: CompressionStats):
+        with self._lock:
+            self.requests += 1
+            if stats.compressed:
+                self.compressed += 1
+            else:
+                self.skipped += 1
+            self.bytes_in += stats.original_size
+            self.bytes_out += stats.sent_size
+            self.cpu_time += stats.cpu_time
+
+    @property
+    def bytes_saved(self) -> int:
+        return self.bytes_in - self.bytes_out
+
+    def as_dict(self) -> dict:
+        with self._lock:
+            return {'requests': self.requests,
+                    'compressed': self.compressed,
+                    'skipped': self.skipped,
+                    'bytes_in': self.bytes_in,
+                    'bytes_out': self.bytes_out,
+                    'bytes_saved': self.bytes_in - self.bytes_out,
+                    'cpu_time': self.cpu_time}
+
+
+class Compressor(object):
+    """Gzip compression of request bodies.
+
+    Bodies smaller than `min_size` bytes are sent as is, as well as bodies
+    which don't get smaller once compressed. Bodies of at least
+    `stream_threshold` bytes (if set) are compressed on the fly, in chunks of
+    `chunk_size` bytes, while being sent. The statistics of the last request
+    of the current thread are available in `last_stats`, the totals in
+    `counters`."""
+
+    def __init__(self, min_size=DEFAULT_MIN_SIZE, level=DEFAULT_LEVEL,
+                 stream_threshold: Optional[int] = None,
+                 chunk_size=DEFAULT_CHUNK_SIZE):
+        self.min_size = min_size
+        self.level = level
+        self.stream_threshold = stream_threshold
+        self.chunk_size = chunk_size
+        self.counters = CompressionCounters()
+        self._local = threading.local()
+
+    @property
+    def last_stats(self) -> Optional[CompressionStats]:
+        return getattr(self._local, 'stats', None)
+
+    def _record(self, stats: CompressionStats):
+        self._local.stats = stats
+        self.counters.add(stats)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug('Request data compression: %s', stats)
+
+    def compress(self, body: bytes) -> Optional[Union[bytes, 'GzipStream']]:
+        """Returns the gzip compressed `body` (bytes or, when streamed, an
+        iterable of bytes) or None if `body` is to be sent uncompressed.
+        """
+        if len(body) < self.min_size:
+            self._record(CompressionStats(len(body)))
+            return None
+        if self.stream_threshold is not None and len(body) >= self.stream_threshold:
+            return GzipStream(body, self.level, self.chunk_size, self._record)
+        start = time.thread_time()
+        compressed = gzip.compress(body, compresslevel=self.level)
+        stats = CompressionStats(len(body), len(compressed),
+                                 time.thread_time() - start,
+                                 compressed=len(compressed) < len(body))
+        self._record(stats)
+        return compressed if stats.compressed else None
+
+
+class GzipStream(object):
+    """Iterable of the gzip compressed chunks of `body`, compressed while
+    being iterated. It can be iterated again (e.g. to resend the request
+    after a reauthentication)."""
+
+    def __init__(self, body: bytes, level, chunk_size, on_done):
+        self.body = body
+        self.level = level
+        self.chunk_size = chunk_size
+        self._on_done = on_done
+
+    def __iter__(self) -> Iterator[bytes]:
+        stats = CompressionStats(len(self.body), 0, compressed=True, streamed=True)
+        # wbits=31: gzip container.
+        compressor = zlib.compressobj(self.level, zlib.DEFLATED, 31)
+        view = memoryview(self.body)
+        try:
+            for i in range(0, len(self.body), self.chunk_size):
+                start = time.thread_time()
+                chunk = compressor.compress(view[i:i + self.chunk_size])
+                stats.cpu_time += time.thread_time() - start
+                if chunk:
+                    stats.compressed_size += len(chunk)
+                    yield chunk
+            start = time.thread_time()
+            chunk = compressor.flush()
+            stats.cpu_time += time.thread_time() - start
+            stats.compressed_size += len(chunk)
+            yield chunk
+        finally:
+            self._on_done(stats)
@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+from collections import deque
+from typing import List
+
+DEFAULT_TAIL_SIZE = 1000
+
+
+class LogTail(object):
+    """Keeps the last `maxlen` lines of a log read several times, to find
+    the new lines of each read. Reads may overlap: a read can start with
+    (or contain all of) the lines already seen."""
+
+    def __init__(self, maxlen=DEFAULT_TAIL_SIZE):
+        self.lines = deque(maxlen=maxlen)
+
+    def new_lines(self, lines: List[str]) -> List[str]:
+        """Returns the lines of `lines` following those already seen, and
+        adds them to the tail."""
+        new = lines[self._overlap_end(lines):]
+        self.lines.extend(new)
+        return new
+
+    def _overlap_end(self, lines: List[str]) -> int:
+        # Index after the last position of `lines` ending with the tail (or
+        # with the part of the tail that fits before it), 0 if none.
+        if not self.lines:
+            return 0
+        last = self.lines[-1]
+        tail = None
+        for p in range(len(lines) - 1, -1, -1):
+            if lines[p] != last:
+                continue
+            if tail is None:
+                tail = list(self.lines)
+            n = min(len(tail), p + 1)
+            if lines[p + 1 - n:p + 1] == tail[-n:]:
+                return p + 1
+        return 0
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+import functools
+import re
+from typing import List
+
+DEFAULT_CACHE_SIZE = 1024
+
+_PLACEHOLDER = re.compile(r'\${(.*?)}')
+
+
+class Template(object):
+    """String with `${name}` placeholders, parsed once into its literal
+    parts and placeholder names."""
+
+    __slots__ = ('source', 'names', '_parts')
+
+    def __init__(self, source: str):
+        self.source = source
+        # Literal parts at even indexes, placeholder names at odd ones.
+        self._parts: List[str] = _PLACEHOLDER.split(source)
+        self.names: List[str] = self._parts[1::2]
+
+    def interpolate(self, params: dict) -> str:
+        """Returns the template with the placeholders replaced by their value
+        in `params`, in one pass. Returns an empty string if a value is
+        empty. Raises ValueError if a value is missing."""
+        if not self.names:
+            return self.source
+        if not params:
+            raise ValueError('no substitutions provided.')
+        for k in self.names:
+            if k not in params:
+                raise ValueError(f'{k} is missing in params')
+            if not params[k]:
+                return ''
+        parts = list(self._parts)
+        parts[1::2] = [params[k] for k in self.names]
+        return ''.join(parts)
+
+    def __repr__(self):
+        return 'Template({!r})'.format(self.source)
+
+
+@functools.lru_cache(maxsize=DEFAULT_CACHE_SIZE)
+def compile_template(source: str) -> Template:
+    """Returns the Template of `source`, cached (for the last
+    DEFAULT_CACHE_SIZE ones)."""
+    return Template(source)
+
+
+def interpolate(source: str, params: dict) -> str:
+    """See Template.interpolate(). Returns an empty string if `source` is
+    empty."""
+    if not source:
+        return ''
+    return compile_template(source).interpolate(params)
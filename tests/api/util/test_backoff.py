@@ -0,0 +1,27 @@
+import unittest
+from unittest.mock import patch
+
+from nuvla.api.util.backoff import Backoff
+
+
+class TestBackoff(unittest.TestCase):
+
+    def test_delays(self):
+        backoff = Backoff(initial=1, maximum=5, jitter=False)
+        self.assertEqual([1, 2, 4, 5, 5], [backoff.next_delay() for _ in range(5)])
+        backoff.reset()
+        self.assertEqual(1, backoff.next_delay())
+
+    def test_jitter(self):
+        backoff = Backoff(initial=1, maximum=100)
+        for i in range(5):
+            delay = backoff.next_delay()
+            self.assertTrue(2 ** i / 2 <= delay <= 2 ** i)
+
+    def test_sleep_deadline(self):
+        backoff = Backoff(initial=10, jitter=False)
+        with patch('nuvla.api.util.backoff.time') as time_mock:
+            time_mock.monotonic.return_value = 100
+            self.assertEqual(3, backoff.sleep(deadline=103))
+            time_mock.sleep.assert_called_once_with(3)
+            self.assertEqual(0, backoff.sleep(deadline=99))
@@ -0,0 +1,26 @@
+import unittest
+
+from nuvla.api.util import codec
+from nuvla.api.util.codec import JsonCodec, OrjsonCodec, default_codec
+
+
+class TestCodec(unittest.TestCase):
+
+    doc = {'id': 'data-record/1', 'name': 'é', 'tags': ['a', 'b'],
+           'gnss:lat': 52.95220184326172, 'count': 3, 'ok': True, 'none': None}
+
+    def test_json_codec(self):
+        c = JsonCodec()
+        data = c.dumps(self.doc)
+        self.assertIsInstance(data, bytes)
+        self.assertNotIn(b', ', data)
+        self.assertEqual(self.doc, c.loads(data))
+
+    @unittest.skipIf(codec.orjson is None, 'orjson is not installed')
+    def test_orjson_codec(self):
+        c = OrjsonCodec()
+        self.assertIsInstance(default_codec(), OrjsonCodec)
+        self.assertEqual(JsonCodec().dumps(self.doc), c.dumps(self.doc))
+        self.assertEqual(self.doc, c.loads(c.dumps(self.doc)))
+        # Fallback to the standard library for unsupported values.
+        self.assertEqual(b'{"a":1180591620717411303424}', c.dumps({'a': 2 ** 70}))
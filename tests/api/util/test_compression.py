@@ -0,0 +1,61 @@
+import gzip
+import threading
+import unittest
+
+from nuvla.api.util.compression import Compressor, GzipStream
+
+
+class TestCompressor(unittest.TestCase):
+
+    body = b'{"name":"' + b'abc' * 2000 + b'"}'
+
+    def test_min_size(self):
+        c = Compressor(min_size=len(self.body) + 1)
+        self.assertIsNone(c.compress(self.body))
+        self.assertFalse(c.last_stats.compressed)
+        self.assertEqual(0, c.last_stats.bytes_saved)
+        self.assertEqual(1, c.counters.skipped)
+
+    def test_compress(self):
+        for level in [1, 9]:
+            c = Compressor(min_size=10, level=level)
+            data = c.compress(self.body)
+            self.assertEqual(self.body, gzip.decompress(data))
+            stats = c.last_stats
+            self.assertTrue(stats.compressed)
+            self.assertEqual(len(data), stats.compressed_size)
+            self.assertEqual(len(self.body) - len(data), stats.bytes_saved)
+            self.assertGreater(stats.ratio, 1)
+            self.assertEqual({'requests': 1, 'compressed': 1, 'skipped': 0,
+                              'bytes_in': len(self.body),
+                              'bytes_out': len(data),
+                              'bytes_saved': stats.bytes_saved,
+                              'cpu_time': stats.cpu_time},
+                             c.counters.as_dict())
+
+    def test_incompressible(self):
+        c = Compressor(min_size=1)
+        self.assertIsNone(c.compress(b'{}'))
+        self.assertFalse(c.last_stats.compressed)
+        self.assertEqual(2, c.last_stats.sent_size)
+
+    def test_stream(self):
+        c = Compressor(min_size=10, stream_threshold=1000, chunk_size=100)
+        stream = c.compress(self.body)
+        self.assertIsInstance(stream, GzipStream)
+        for _ in range(2):
+            chunks = list(stream)
+            self.assertGreater(len(chunks), 1)
+            self.assertEqual(self.body, gzip.decompress(b''.join(chunks)))
+            self.assertTrue(c.last_stats.streamed)
+            self.assertEqual(len(b''.join(chunks)), c.last_stats.compressed_size)
+        self.assertEqual(2, c.counters.compressed)
+
+    def test_last_stats_per_thread(self):
+        c = Compressor(min_size=10)
+        c.compress(self.body)
+        t = threading.Thread(target=lambda: c.compress(b'{"a":1}' * 2))
+        t.start()
+        t.join()
+        self.assertTrue(c.last_stats.compressed)
+        self.assertEqual(2, c.counters.requests)
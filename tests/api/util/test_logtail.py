@@ -0,0 +1,33 @@
+import unittest
+
+from nuvla.api.util.logtail import LogTail
+
+
+class TestLogTail(unittest.TestCase):
+
+    def test_incremental_reads(self):
+        tail = LogTail()
+        self.assertEqual(['a', 'b'], tail.new_lines(['a', 'b']))
+        self.assertEqual(['c'], tail.new_lines(['c']))
+        self.assertEqual([], tail.new_lines([]))
+
+    def test_overlapping_reads(self):
+        tail = LogTail()
+        tail.new_lines(['a', 'b', 'c'])
+        # Read starting within the lines already seen.
+        self.assertEqual(['d', 'e'], tail.new_lines(['b', 'c', 'd', 'e']))
+        # Read of the whole log.
+        self.assertEqual(['f'], tail.new_lines(['a', 'b', 'c', 'd', 'e', 'f']))
+        self.assertEqual([], tail.new_lines(['e', 'f']))
+
+    def test_repeated_lines(self):
+        tail = LogTail()
+        tail.new_lines(['x', 'y', 'x'])
+        self.assertEqual(['x', 'z'], tail.new_lines(['y', 'x', 'x', 'z']))
+        self.assertEqual(['x', 'y', 'x'], tail.new_lines(['x', 'y', 'x']))
+
+    def test_bounded(self):
+        tail = LogTail(maxlen=3)
+        tail.new_lines([str(i) for i in range(10)])
+        self.assertEqual(['7', '8', '9'], list(tail.lines))
+        self.assertEqual(['10'], tail.new_lines([str(i) for i in range(11)]))
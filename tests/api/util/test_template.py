@@ -0,0 +1,30 @@
+import unittest
+
+from nuvla.api.util.template import Template, compile_template, interpolate
+
+
+class TestTemplate(unittest.TestCase):
+
+    def test_interpolate(self):
+        template = Template('http://${host}:${tcp.80}/${host}')
+        self.assertEqual(['host', 'tcp.80', 'host'], template.names)
+        self.assertEqual('http://a:8080/a',
+                         template.interpolate({'host': 'a', 'tcp.80': '8080'}))
+        # Values are inserted as is.
+        self.assertEqual('http://\\1:$x/\\1',
+                         template.interpolate({'host': '\\1', 'tcp.80': '$x'}))
+        self.assertEqual('', template.interpolate({'host': 'a', 'tcp.80': ''}))
+        with self.assertRaises(ValueError):
+            template.interpolate({'host': 'a'})
+        with self.assertRaises(ValueError):
+            template.interpolate({})
+
+    def test_no_placeholder(self):
+        self.assertEqual('http://a/', Template('http://a/').interpolate({}))
+        self.assertEqual('', interpolate('', {'a': 'b'}))
+        self.assertEqual('', interpolate(None, {}))
+
+    def test_cache(self):
+        source = 'http://${cached}/'
+        self.assertIs(compile_template(source), compile_template(source))
+        self.assertEqual('http://a/', interpolate(source, {'cached': 'a'}))
@@ -0,0 +1,242 @@
+import gzip
+import json
+import socket
+from threading import Event, Timer
+from unittest import TestCase
+from unittest.mock import Mock
+
+from requests.exceptions import HTTPError
+
+from nuvla.api import Api, NuvlaError
+from nuvla.api.api import PoolAdapter
+from nuvla.api.util.codec import JsonCodec
+from nuvla.api.models import CimiCollection
+from nuvla.api.resources import Notification
+
+
+def http_response(json_body, status_code=200):
+    response = Mock()
+    response.status_code = status_code
+    response.content = json.dumps(json_body).encode()
+    response.json.return_value = json_body
+    return response
+
+
+def collection_pages(total):
+    """Mock of Api.search serving `total` resources with first/last windows."""
+    def search(resource_type, first=1, last=None, **kwargs):
+        stop = min(last, total)
+        resources = [{'id': f'{resource_type}/{i}'}
+                     for i in range(first, stop + 1)]
+        return CimiCollection({'id': resource_type, 'count': total,
+                               'resources': resources})
+    return Mock(side_effect=search)
+
+
+class ApiSearchIterTest(TestCase):
+
+    def setUp(self):
+        self.api = Api(persist_cookie=False)
+
+    def test_search_iter(self):
+        for prefetch in [True, False]:
+            for total, page_size, calls in [(0, 10, 1), (5, 10, 1), (10, 10, 1),
+                                            (25, 10, 3), (30, 10, 3)]:
+                self.api.search = collection_pages(total)
+                ids = [r.id for r in self.api.search_iter(
+                    'data-record', page_size=page_size, prefetch=prefetch,
+                    filter="name='a'")]
+                self.assertEqual([f'data-record/{i}' for i in range(1, total + 1)],
+                                 ids)
+                self.assertEqual(calls, self.api.search.call_count)
+                self.api.search.assert_called_with(
+                    'data-record', first=(calls - 1) * page_size + 1,
+                    last=calls * page_size, filter="name='a'")
+
+    def test_search_iter_early_stop(self):
+        self.api.search = collection_pages(100)
+        it = self.api.search_iter('data-record', page_size=10)
+        self.assertEqual('data-record/1', next(it).id)
+        it.close()
+        # At most the current and the prefetched page were requested.
+        self.assertLessEqual(self.api.search.call_count, 2)
+
+    def test_search_iter_args(self):
+        with self.assertRaises(ValueError):
+            next(self.api.search_iter('data-record', page_size=0))
+        with self.assertRaises(TypeError):
+            next(self.api.search_iter('data-record', first=10))
+
+
+class ApiAddTest(TestCase):
+
+    cep = {'id': 'cloud-entry-point',
+           'base-uri': 'https://nuvla.io/api/',
+           'collections': {'data-record': {'href': 'data-record'}}}
+
+    def setUp(self):
+        self.api = Api(persist_cookie=False)
+        self.calls = []
+
+        def request(method, endpoint, **kwargs):
+            uri = endpoint.split('/api/', 1)[1]
+            self.calls.append((method, uri))
+            if uri == 'cloud-entry-point':
+                return http_response(self.cep)
+            if method == 'PUT':
+                return http_response({'id': uri, 'count': 0, 'resources': []})
+            return http_response({'status': 201, 'resource-id': f'{uri}/1'},
+                                 201)
+        self.api.session.request = request
+
+    def test_add_single_post(self):
+        for _ in range(3):
+            resp = self.api.add('data-record', {'name': 'a'})
+            self.assertEqual('data-record/1', resp.data['resource-id'])
+        # Cloud entry point is retrieved once, then each add is a single POST.
+        self.assertEqual([('GET', 'cloud-entry-point')] +
+                         [('POST', 'data-record')] * 3, self.calls)
+
+    def test_add_unknown_collection(self):
+        self.api.add('data-foo', {'name': 'a'})
+        self.api.add('data-foo', {'name': 'b'})
+        # Collection missing from the cloud entry point is searched once.
+        self.assertEqual([('GET', 'cloud-entry-point'),
+                          ('PUT', 'data-foo'),
+                          ('POST', 'data-foo'),
+                          ('POST', 'data-foo')], self.calls)
+
+
+class ApiDeleteTest(TestCase):
+
+    def setUp(self):
+        self.api = Api(persist_cookie=False)
+        self.calls = []
+
+        def request(method, endpoint, **kwargs):
+            uri = endpoint.split('/api/', 1)[1]
+            self.calls.append((method, uri))
+            if uri.endswith('missing'):
+                response = http_response({'message': f'{uri} not found'}, 404)
+                response.raise_for_status.side_effect = HTTPError(response=response)
+                return response
+            if method == 'GET':
+                return http_response({'id': uri})
+            return http_response({'status': 200, 'resource-id': uri})
+        self.api.session.request = request
+
+    def test_delete(self):
+        self.api.delete('data-record/1')
+        self.assertEqual([('GET', 'data-record/1'), ('DELETE', 'data-record/1')],
+                         self.calls)
+        self.calls.clear()
+        self.api.delete('data-record/1', prefetch=False)
+        self.assertEqual([('DELETE', 'data-record/1')], self.calls)
+
+    def test_delete_many(self):
+        ids = [f'data-record/{i}' for i in range(50)] + ['data-record/missing']
+        results = self.api.delete_many(ids, concurrency=8)
+        self.assertEqual(ids, list(results))
+        self.assertEqual(len(ids), len(self.calls))
+        self.assertTrue(all(m == 'DELETE' for m, _ in self.calls))
+        self.assertEqual('data-record/0', results['data-record/0'].data['resource-id'])
+        error = results['data-record/missing']
+        self.assertIsInstance(error, NuvlaError)
+        self.assertEqual('data-record/missing not found', error.reason)
+
+
+class ApiBatchTest(TestCase):
+
+    def setUp(self):
+        self.api = Api(persist_cookie=False)
+        self.api._collection_hrefs['notification'] = 'notification'
+        self.calls = []
+
+        def request(method, endpoint, json=None, data=None, **kwargs):
+            uri = endpoint.split('/api/', 1)[1]
+            self.calls.append((method, uri))
+            if uri.endswith('missing'):
+                response = http_response({'message': f'{uri} not found'}, 404)
+                response.raise_for_status.side_effect = HTTPError(response=response)
+                return response
+            if method == 'POST':
+                doc = self.api._json_codec.loads(data)
+                return http_response({'status': 201,
+                                      'resource-id': 'notification/' + doc['message']})
+            return http_response({'id': uri})
+        self.api.session.request = request
+
+    def test_batch(self):
+        with self.api.batch(concurrency=4) as batch:
+            notification = batch.proxy(Notification(self.api))
+            futures = [notification.create(str(i), 'notice', str(i)) for i in range(20)]
+            batch.get('notification/missing')
+            batch.edit('notification/1', {'message': 'x'})
+        results = batch.results()
+        self.assertEqual(22, len(results))
+        self.assertEqual([f'notification/{i}' for i in range(20)], results[:20])
+        self.assertEqual('notification/3', futures[3].result())
+        self.assertIsInstance(results[20], NuvlaError)
+        self.assertEqual('notification/1', results[21].id)
+        self.assertEqual([20], list(batch.errors()))
+        self.assertEqual(22, len(self.calls))
+
+    def test_batch_cancel(self):
+        with self.assertRaises(ValueError):
+            with self.api.batch(concurrency=1) as batch:
+                started = Event()
+                release = Event()
+
+                def block():
+                    started.set()
+                    release.wait()
+                batch.submit(block)
+                started.wait()
+                pending = batch.get('notification/1')
+                # Released once the batch has cancelled the pending calls.
+                Timer(0.1, release.set).start()
+                raise ValueError()
+        self.assertTrue(pending.cancelled())
+        self.assertEqual([None, None], batch.results())
+        self.assertEqual([], self.calls)
+
+
+class ApiPoolTest(TestCase):
+
+    def test_pool_adapter(self):
+        api = Api(persist_cookie=False, pool_maxsize=32, pool_block=True,
+                  max_retries=5)
+        for prefix in ['http://', 'https://']:
+            adapter = api.session.get_adapter(prefix + 'nuvla.io')
+            self.assertIsInstance(adapter, PoolAdapter)
+            self.assertEqual(5, adapter.max_retries.total)
+            pool_kw = adapter.poolmanager.connection_pool_kw
+            self.assertEqual(32, pool_kw['maxsize'])
+            self.assertTrue(pool_kw['block'])
+            self.assertIn((socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1),
+                          pool_kw['socket_options'])
+
+    def test_pool_adapter_no_keep_alive(self):
+        api = Api(persist_cookie=False, keep_alive=False)
+        adapter = api.session.get_adapter('https://nuvla.io')
+        self.assertNotIn('socket_options', adapter.poolmanager.connection_pool_kw)
+        self.assertEqual(0, adapter.max_retries.read)
+
+
+class ApiRequestBodyTest(TestCase):
+
+    def test_single_serialization(self):
+        for compress in [False, True]:
+            codec = Mock(wraps=JsonCodec())
+            api = Api(persist_cookie=False, compress=compress, json_codec=codec)
+            api.session.request = Mock(return_value=http_response({'id': 'x/1'}))
+            doc = {'name': 'a' * 2000}
+            api.edit('x/1', doc)
+            codec.dumps.assert_called_once_with(doc)
+            codec.loads.assert_called_once()
+            kwargs = api.session.request.call_args.kwargs
+            self.assertNotIn('json', kwargs)
+            body = gzip.decompress(kwargs['data']) if compress else kwargs['data']
+            self.assertEqual(b'{"name":"' + b'a' * 2000 + b'"}', body)
+            self.assertEqual('application/json', kwargs['headers']['Content-Type'])
+            self.assertEqual(compress, 'Content-Encoding' in kwargs['headers'])
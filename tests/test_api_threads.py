@@ -0,0 +1,126 @@
+import json
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.cookiejar import MozillaCookieJar
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import TestCase
+
+from nuvla.api import Api
+
+COOKIE_NAME = 'com.sixsq.nuvla.cookie'
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, status, body, cookie=None):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        if cookie:
+            self.send_header('Set-Cookie', f'{COOKIE_NAME}={cookie}; Path=/')
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        with self.server.lock:
+            self.server.logins += 1
+        # Slow login to widen the window for concurrent reauthentications.
+        time.sleep(0.05)
+        self._reply(201, {'status': 201, 'resource-id': 'session/1'}, 'token-0')
+
+    def do_GET(self):
+        if COOKIE_NAME not in self.headers.get('Cookie', ''):
+            self._reply(401, {'message': 'unauthorized'})
+            return
+        with self.server.lock:
+            self.server.gets += 1
+            token = f'token-{self.server.gets}'
+        time.sleep(self.server.delay)
+        # Session cookie is refreshed by every response.
+        self._reply(200, {'id': self.path[len('/api/'):]}, token)
+
+
+class ApiThreadSafetyTest(TestCase):
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        self.server.lock = threading.Lock()
+        self.server.logins = 0
+        self.server.gets = 0
+        self.server.delay = 0
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.endpoint = 'http://127.0.0.1:{}'.format(self.server.server_port)
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.cookie_file = os.path.join(self.tmp_dir.name, 'cookies.txt')
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.tmp_dir.cleanup()
+
+    def test_shared_api(self):
+        api = Api(self.endpoint, insecure=True, cookie_file=self.cookie_file,
+                  reauthenticate=True, login_creds={'key': 'k', 'secret': 's'},
+                  pool_maxsize=16, cookie_save_delay=0.05)
+        saves = []
+        save = api.session.cookies.save
+
+        def counting_save(*args, **kwargs):
+            saves.append(1)
+            save(*args, **kwargs)
+        api.session.cookies.save = counting_save
+
+        ids = [f'data-record/{i}' for i in range(800)]
+        with ThreadPoolExecutor(max_workers=16) as executor:
+            resources = list(executor.map(api.get, ids))
+        api.close()
+
+        self.assertEqual(ids, [r.id for r in resources])
+        # All the threads got 401 at startup, but a single login was made.
+        self.assertEqual(1, self.server.logins)
+        # Cookie saves are debounced.
+        self.assertGreater(len(saves), 0)
+        self.assertLess(len(saves), len(ids) / 10)
+        # Cookie file is complete and holds one of the session cookies.
+        jar = MozillaCookieJar(self.cookie_file)
+        jar.load(ignore_discard=True)
+        self.assertEqual([COOKIE_NAME], [c.name for c in jar])
+        self.assertTrue(list(jar)[0].value.startswith('token-'))
+        self.assertEqual(['cookies.txt'], os.listdir(self.tmp_dir.name))
+
+    def test_coalesce(self):
+        self.server.delay = 0.2
+        api = Api(self.endpoint, insecure=True, persist_cookie=False,
+                  reauthenticate=True, login_creds={'key': 'k', 'secret': 's'},
+                  pool_maxsize=8, coalesce=True)
+        barrier = threading.Barrier(8)
+
+        def get(_):
+            barrier.wait()
+            return api.get('module/1')
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            resources = list(executor.map(get, range(8)))
+        api.close()
+
+        self.assertEqual(['module/1'] * 8, [r.id for r in resources])
+        # A single request (and login) was made for the 8 threads.
+        self.assertEqual(1, self.server.gets)
+        self.assertEqual(1, self.server.logins)
+        self.assertEqual({'calls': 1, 'coalesced': 7}, api.single_flight.stats())
+        # Each thread got its own document.
+        resources[0].data['modified'] = True
+        self.assertEqual([False] * 7, ['modified' in r.data for r in resources[1:]])
+        # Requests made once the first one completed aren't coalesced.
+        api.get('module/1')
+        self.assertEqual(2, self.server.gets)
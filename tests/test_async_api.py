@@ -0,0 +1,147 @@
+import asyncio
+import json
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+from nuvla.api import NuvlaError
+from nuvla.api.async_api import AsyncApi, _form_pairs
+from nuvla.api.testing import FakeNuvla
+
+SESSION_COOKIE = 'com.sixsq.nuvla.cookie=token'
+
+
+class Handler(BaseHTTPRequestHandler):
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, status, body, headers=None):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _body(self):
+        return self.rfile.read(int(self.headers.get('Content-Length', 0)))
+
+    def do_POST(self):
+        body = self._body()
+        if self.path == '/api/session':
+            self.server.logins += 1
+            self._reply(201, {'status': 201, 'resource-id': 'session/1'},
+                        {'Set-Cookie': SESSION_COOKIE + '; Path=/'})
+        elif self.headers.get('Cookie') != SESSION_COOKIE:
+            self._reply(401, {'message': 'unauthorized'})
+        else:
+            self._reply(201, {'status': 201, 'resource-id': 'data-record/1',
+                              'echo': json.loads(body)})
+
+    def do_PUT(self):
+        form = self._body().decode()
+        self._reply(200, {'id': 'data-record', 'count': 1, 'form': form,
+                          'resources': [{'id': 'data-record/1'}]})
+
+    def do_GET(self):
+        if self.path == '/api/data-record/missing':
+            self._reply(404, {'message': 'data-record/missing not found'})
+        else:
+            self._reply(200, {'id': self.path[len('/api/'):]})
+
+
+@unittest.skipIf(aiohttp is None, 'aiohttp is not installed')
+class AsyncApiTest(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.logins = 0
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.endpoint = 'http://127.0.0.1:{}'.format(self.server.server_port)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_form_pairs(self):
+        self.assertEqual([('last', '0'), ('select', 'a'), ('select', 'b')],
+                         _form_pairs({'last': 0, 'select': ['a', 'b'],
+                                      'filter': None}))
+
+    async def test_concurrent_get(self):
+        async with AsyncApi(self.endpoint, persist_cookie=False) as api:
+            ids = ['data-record/{}'.format(i) for i in range(200)]
+            resources = await asyncio.gather(*[api.get(i) for i in ids])
+            self.assertEqual(ids, [r.id for r in resources])
+
+    async def test_search_form_encoding(self):
+        async with AsyncApi(self.endpoint, persist_cookie=False) as api:
+            res = await api.search('data-record', filter="name='a'", last=0,
+                                   select=None)
+            self.assertEqual(1, res.count)
+            self.assertEqual('filter=name%3D%27a%27&last=0', res.data['form'])
+
+    async def test_error(self):
+        async with AsyncApi(self.endpoint, persist_cookie=False) as api:
+            with self.assertRaises(NuvlaError) as cm:
+                await api.get('data-record/missing')
+            self.assertEqual('data-record/missing not found', cm.exception.reason)
+            self.assertEqual(404, cm.exception.response.status_code)
+
+    async def test_reauthenticate(self):
+        async with AsyncApi(self.endpoint, persist_cookie=False, insecure=True,
+                            reauthenticate=True,
+                            login_creds={'key': 'k', 'secret': 's'}) as api:
+            res = await api._cimi_post('data-record', json={'name': 'x'})
+            self.assertEqual({'name': 'x'}, res['echo'])
+            self.assertEqual(1, self.server.logins)
+            # Session cookie is reused by the following calls.
+            await api._cimi_post('data-record', json={'name': 'y'})
+            self.assertEqual(1, self.server.logins)
+
+    async def test_concurrent_reauthentication(self):
+        with FakeNuvla(require_auth=True) as server:
+            rid = server.add_resource('data-record', {'name': 'x'})
+            async with AsyncApi(server.endpoint, persist_cookie=False, insecure=True,
+                                reauthenticate=True,
+                                login_creds={'key': 'k', 'secret': 's'}) as api:
+                resources = await asyncio.gather(*[api.get(rid) for _ in range(50)])
+                self.assertEqual([rid] * 50, [r.id for r in resources])
+                self.assertEqual(1, api.session.auth_generation)
+            self.assertEqual(1, server.requests.count(('POST', '/api/session')))
+
+    async def test_search_iter(self):
+        async with AsyncApi(self.endpoint, persist_cookie=False) as api:
+            ids = [r.id async for r in api.search_iter('data-record', page_size=1)]
+            self.assertEqual(['data-record/1'], ids)
+
+
+@unittest.skipIf(aiohttp is None, 'aiohttp is not installed')
+class AsyncApiLoopTest(unittest.TestCase):
+
+    def test_created_outside_loop(self):
+        with FakeNuvla(require_auth=True) as server:
+            rid = server.add_resource('data-record', {'name': 'x'})
+            api = AsyncApi(server.endpoint, persist_cookie=False, insecure=True,
+                           reauthenticate=True, login_creds={'key': 'k', 'secret': 's'})
+
+            async def get_all():
+                try:
+                    return await asyncio.gather(*[api.get(rid) for _ in range(10)])
+                finally:
+                    api.session.cookies.clear()
+                    await api.close()
+
+            # Concurrent reauthentications in successive loops.
+            for logins in (1, 2):
+                resources = asyncio.run(get_all())
+                self.assertEqual([rid] * 10, [r.id for r in resources])
+                self.assertEqual(logins, server.requests.count(('POST', '/api/session')))
@@ -0,0 +1,158 @@
+import json
+import threading
+from unittest import TestCase
+from unittest.mock import Mock, patch
+
+from nuvla.api import Api
+from nuvla.api.cache import ResourceCache, cache_key
+
+
+class ResourceCacheTest(TestCase):
+
+    def test_lru(self):
+        cache = ResourceCache(ttl=60, maxsize=2)
+        for i in range(3):
+            cache.put(cache_key(f'module/{i}', None), b'{}')
+        self.assertIsNone(cache.lookup(cache_key('module/0', None)))
+        cache.lookup(cache_key('module/1', None))
+        cache.put(cache_key('module/3', None), b'{}')
+        self.assertIsNotNone(cache.lookup(cache_key('module/1', None)))
+        self.assertIsNone(cache.lookup(cache_key('module/2', None)))
+        self.assertEqual(2, cache.stats()['evictions'])
+
+    def test_ttl(self):
+        cache = ResourceCache(ttl=10)
+        key = cache_key('module/1', {'select': ['a', 'b']})
+        with patch('nuvla.api.cache.time.monotonic', return_value=100):
+            cache.put(key, b'{}')
+            self.assertTrue(cache.lookup(key).fresh)
+        with patch('nuvla.api.cache.time.monotonic', return_value=111):
+            self.assertFalse(cache.lookup(key).fresh)
+
+    def test_invalidate(self):
+        cache = ResourceCache(ttl=60)
+        cache.put(cache_key('module/1', None), b'{}')
+        cache.put(cache_key('module/1', {'select': 'id'}), b'{}')
+        cache.put(cache_key('module/2', None), b'{}')
+        cache.put(cache_key('deployment/1', None), b'{}')
+        cache.invalidate('module/1')
+        self.assertEqual(2, len(cache))
+        cache.invalidate_collection('module')
+        self.assertEqual(1, len(cache))
+        self.assertIsNotNone(cache.lookup(cache_key('deployment/1', None)))
+
+    def test_generation(self):
+        cache = ResourceCache(ttl=60, maxsize=2)
+        generation = cache.generation('module/1')
+        cache.invalidate('module/1')
+        cache.put(cache_key('module/1', None), b'{}', generation=generation)
+        self.assertEqual(0, len(cache))
+        generation = cache.generation('module/1')
+        cache.invalidate_collection('module')
+        cache.put(cache_key('module/1', None), b'{}', generation=generation)
+        self.assertEqual(0, len(cache))
+        # Still detected once the generation of the resource is forgotten.
+        generation = cache.generation('module/1')
+        for i in range(1, 4):
+            cache.invalidate('module/{}'.format(i))
+        cache.put(cache_key('module/1', None), b'{}', generation=generation)
+        self.assertEqual(0, len(cache))
+        generation = cache.generation('module/1')
+        cache.invalidate('module/2')
+        cache.put(cache_key('module/1', None), b'{}', generation=generation)
+        self.assertEqual(1, len(cache))
+
+
+class ApiCacheTest(TestCase):
+
+    def setUp(self):
+        self.api = Api(persist_cookie=False, cache_ttl=60)
+        self.calls = []
+        self.server_doc = {'id': 'module/1', 'updated': 'u1', 'content': {}}
+        self.etag = None
+
+        def request(method, endpoint, params=None, headers=None, **kwargs):
+            uri = endpoint.split('/api/', 1)[1]
+            self.calls.append((method, uri, params, headers.get('If-None-Match')))
+            response = Mock()
+            response.headers = {'ETag': self.etag} if self.etag else {}
+            if self.etag and headers.get('If-None-Match') == self.etag:
+                response.status_code = 304
+                response.content = b''
+                return response
+            response.status_code = 200
+            doc = self.server_doc
+            if params and params.get('select') == 'updated':
+                doc = {'id': doc['id'], 'updated': doc['updated']}
+            response.content = json.dumps(doc).encode()
+            return response
+        self.api.session.request = request
+
+    def expire(self):
+        for entry in self.api.cache._entries.values():
+            entry.expires = 0
+
+    def test_hit_miss(self):
+        m1 = self.api.get('module/1')
+        m1.data['content']['modified'] = True
+        m2 = self.api.get('module/1')
+        self.assertEqual({}, m2.data['content'])
+        self.api.get('module/1', select='id')
+        self.assertEqual(2, len(self.calls))
+        self.assertEqual({'hits': 1, 'misses': 2, 'revalidations': 0,
+                          'evictions': 0, 'size': 2}, self.api.cache.stats())
+        self.api.get('module/1', use_cache=False)
+        self.assertEqual(3, len(self.calls))
+
+    def test_invalidate_on_edit(self):
+        self.api.get('module/1')
+        self.api.edit('module/1', {'name': 'a'})
+        self.assertEqual(0, len(self.api.cache))
+        self.api.get('module/1')
+        self.assertEqual([('GET', 'module/1'), ('PUT', 'module/1'), ('GET', 'module/1')],
+                         [c[:2] for c in self.calls])
+
+    def test_invalidate_during_get(self):
+        reading = threading.Event()
+        edited = threading.Event()
+        request = self.api.session.request
+
+        def slow_request(method, endpoint, *args, **kwargs):
+            response = request(method, endpoint, *args, **kwargs)
+            if method == 'GET' and not reading.is_set():
+                reading.set()
+                edited.wait(5)
+            return response
+
+        self.api.session.request = slow_request
+        thread = threading.Thread(target=self.api.get, args=('module/1',))
+        thread.start()
+        self.assertTrue(reading.wait(5))
+        self.server_doc = dict(self.server_doc, name='a', updated='u2')
+        self.api.edit('module/1', {'name': 'a'})
+        edited.set()
+        thread.join(5)
+        # The body read before the edit was not cached.
+        self.assertEqual(0, len(self.api.cache))
+        self.assertEqual('a', self.api.get('module/1').data['name'])
+
+    def test_revalidate_updated(self):
+        self.api.get('module/1')
+        self.expire()
+        self.api.get('module/1')
+        self.assertEqual({'select': 'updated'}, self.calls[-1][2])
+        self.assertEqual(1, self.api.cache.revalidations)
+        self.assertTrue(self.api.cache.lookup(cache_key('module/1', {})).fresh)
+        self.expire()
+        self.server_doc = {'id': 'module/1', 'updated': 'u2', 'content': {'a': 1}}
+        self.assertEqual({'a': 1}, self.api.get('module/1').data['content'])
+        self.assertEqual(4, len(self.calls))
+
+    def test_revalidate_etag(self):
+        self.etag = '"v1"'
+        self.api.get('module/1')
+        self.expire()
+        self.assertEqual(self.server_doc, self.api.get('module/1').data)
+        self.assertEqual(('GET', 'module/1', {}, '"v1"'), self.calls[-1])
+        self.assertEqual(2, len(self.calls))
+        self.assertEqual(1, self.api.cache.revalidations)
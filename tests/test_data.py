@@ -0,0 +1,127 @@
+import json
+import os
+import tempfile
+import threading
+from unittest import TestCase
+from unittest.mock import Mock, patch
+
+from requests.exceptions import ConnectionError, ConnectTimeout, ReadTimeout
+from urllib3.exceptions import MaxRetryError, NewConnectionError
+
+from nuvla.api import NuvlaError
+from nuvla.api.models import CimiResponse
+from nuvla.api.resources.data import DataRecord
+
+
+def error(status_code):
+    return NuvlaError('error {}'.format(status_code), Mock(status_code=status_code))
+
+
+class DataRecordCreateManyTest(TestCase):
+
+    def setUp(self):
+        self.lock = threading.Lock()
+        self.docs = []
+        self.failures = {}
+
+        def add(resource_type, data):
+            with self.lock:
+                self.docs.append(data)
+                failures = self.failures.get(data['n'])
+                if failures:
+                    self.failures[data['n']] = failures[1:]
+                    raise failures[0]
+            return CimiResponse({'status': 201,
+                                 'resource-id': 'data-record/{}'.format(data['n'])})
+
+        self.nuvla = Mock()
+        self.nuvla.add = add
+
+    def test_create_many(self):
+        refused = ConnectionError(MaxRetryError(
+            None, '/', NewConnectionError(None, 'connection refused')))
+        # Failures with which the record may have been created (500, read
+        # timeout) aren't retried.
+        self.failures = {2: [refused],
+                         3: [ConnectTimeout(), error(503)],
+                         5: [error(400)],
+                         7: [error(500)],
+                         8: [ReadTimeout()],
+                         9: [error(429)] * 4}
+        records = ({'n': i} for i in range(10))
+        with patch('nuvla.api.resources.data.time.sleep') as sleep:
+            report = DataRecord(self.nuvla).create_many(
+                records, 'infrastructure-service/1', concurrency=3)
+        self.assertEqual(10, report.total)
+        self.assertEqual(6, report.created)
+        self.assertEqual([5, 7, 8, 9], sorted(report.errors))
+        self.assertEqual('error 400', report.errors[5])
+        self.assertEqual(1 + 2 + 3, report.retries)
+        self.assertEqual(6, sleep.call_count)
+        self.assertEqual(1, len([d for d in self.docs if d['n'] == 7]))
+        expected = ['data-record/{}'.format(i) for i in range(10)]
+        expected[5] = expected[7] = expected[8] = expected[9] = None
+        self.assertEqual(expected, report.ids)
+        self.assertTrue(all(d['infrastructure-service'] == 'infrastructure-service/1'
+                            for d in self.docs))
+
+    def test_backpressure(self):
+        consumed = []
+
+        def records():
+            for i in range(100):
+                consumed.append(i)
+                yield {'n': i}
+
+        started = threading.Event()
+        release = threading.Event()
+        add = self.nuvla.add
+
+        def blocking_add(resource_type, data):
+            started.set()
+            release.wait()
+            return add(resource_type, data)
+        self.nuvla.add = blocking_add
+        self.addCleanup(release.set)
+
+        thread = threading.Thread(target=DataRecord(self.nuvla).create_many,
+                                  args=(records(), 'infrastructure-service/1'),
+                                  kwargs={'concurrency': 2})
+        thread.start()
+        started.wait()
+        thread.join(0.1)
+        # Workers are blocked: only 2 * concurrency records were read.
+        self.assertEqual(4, len(consumed))
+        release.set()
+        thread.join()
+        self.assertEqual(100, len(consumed))
+
+    def test_ndjson(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'records.ndjson')
+            with open(path, 'w') as fh:
+                for i in range(5):
+                    fh.write(json.dumps({'n': i}) + '\n')
+                fh.write('\n')
+            report = DataRecord(self.nuvla).create_many(path, 'infrastructure-service/1')
+        self.assertEqual(5, report.created)
+        self.assertGreater(report.throughput, 0)
+
+    def test_invalid_ndjson(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'records.ndjson')
+            with open(path, 'w') as fh:
+                fh.write('{"n": 0}\n{"n": \n{"n": 2}\n')
+            report = DataRecord(self.nuvla).create_many(path, 'infrastructure-service/1')
+        self.assertEqual(3, report.total)
+        self.assertEqual(['data-record/0', None, 'data-record/2'], report.ids)
+        self.assertIn('line 2', report.errors[1])
+
+    def test_unreadable_records(self):
+        def records():
+            yield {'n': 0}
+            raise IOError('read error')
+
+        report = DataRecord(self.nuvla).create_many(records(), 'infrastructure-service/1')
+        self.assertEqual(['data-record/0', None], report.ids)
+        self.assertIn('read error', report.errors[1])
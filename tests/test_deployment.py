@@ -1,9 +1,23 @@
+import asyncio
 from random import SystemRandom
 import string
+import threading
+import unittest
 from unittest import TestCase
 from unittest.mock import Mock
 
-from nuvla.api.resources.deployment import Deployment
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+from nuvla.api import Api
+from nuvla.api.async_api import AsyncApi
+from nuvla.api.resources.base import ResourceNotFound
+from nuvla.api.resources.deployment import AsyncDeployment, Deployment, \
+    DeploymentOperationNotAvailable, DeploymentStateTimeout
+from nuvla.api.testing import FakeNuvla
+from nuvla.api.testing.server import DEFAULT_OPERATIONS
 
 
 def rand_str(n):
@@ -130,3 +144,382 @@ class DeploymentTest(TestCase):
         params = {'foo': 'FOO', 'bar.baz': 'BAR.BAZ', 'baz-foo': 'BAZ-FOO'}
         assert 'https://FOO:BAR.BAZ/?BAZ-FOO' == \
                Deployment._template_interpolation(text, params)
+
+
+class DeploymentFakeServerTest(TestCase):
+
+    def setUp(self):
+        self.server = FakeNuvla()
+        self.server.start()
+        self.addCleanup(self.server.stop)
+        self.api = Api(self.server.endpoint, persist_cookie=False)
+        self.addCleanup(self.api.close)
+        self.dpl_api = Deployment(self.api)
+
+    def add_deployments(self, n, state='STARTING'):
+        return [self.server.add_resource('deployment', {'state': state})
+                for _ in range(n)]
+
+    def set_state(self, ids, state):
+        with self.server.lock:
+            for _id in ids:
+                self.server.resources[_id]['state'] = state
+
+    def test_wait_for_state(self):
+        ids = self.add_deployments(5)
+        ids.append('deployment/deleted')
+        timers = [threading.Timer(0.05, self.set_state, (ids[:2], 'STARTED')),
+                  threading.Timer(0.1, self.set_state, (ids[2:4], 'STARTED')),
+                  threading.Timer(0.15, self.set_state, (ids[4:5], 'ERROR'))]
+        for t in timers:
+            t.start()
+        states = self.dpl_api.wait_for_state(ids, 'STARTED', timeout=10, chunk_size=2,
+                                             initial_delay=0.02, max_delay=0.05)
+        self.assertEqual(ids, list(states))
+        self.assertEqual(['STARTED'] * 4 + ['ERROR', None], list(states.values()))
+        methods = {m for m, _ in self.server.requests}
+        self.assertEqual({'PUT'}, methods)
+
+    def test_wait_for_state_timeout(self):
+        ids = self.add_deployments(3)
+        self.set_state(ids[:1], 'STOPPED')
+        with self.assertRaises(DeploymentStateTimeout) as cm:
+            self.dpl_api.wait_for_state(ids, 'STOPPED', timeout=0.1,
+                                        initial_delay=0.01, max_delay=0.02)
+        self.assertEqual(ids[1:], cm.exception.pending)
+        self.assertEqual({ids[0]: 'STOPPED', ids[1]: 'STARTING', ids[2]: 'STARTING'},
+                         cm.exception.states)
+
+    def test_operation_retries(self):
+        dpl_id = self.add_deployments(1, state='STOPPING')[0]
+        timer = threading.Timer(0.1, self.set_state, ([dpl_id], 'STOPPED'))
+        timer.start()
+        self.addCleanup(timer.cancel)
+        with self.assertLogs('nuvla.api.resources.deployment', 'INFO') as cm:
+            self.dpl_api._operation(dpl_id, 'start', timeout=10,
+                                    initial_delay=0.01, max_delay=0.02)
+        self.assertIn("Operation 'start' is not available", cm.output[0])
+        self.assertEqual('STARTED', self.dpl_api.get_state(dpl_id))
+        self.assertEqual(('POST', '/api/{}/start'.format(dpl_id)), self.server.requests[-2])
+
+    def test_operation_not_available(self):
+        dpl_id = self.add_deployments(1)[0]
+        with self.assertRaises(DeploymentOperationNotAvailable):
+            self.dpl_api._operation(dpl_id, 'start', timeout=0.05,
+                                    initial_delay=0.01, max_delay=0.02)
+        with self.assertRaises(DeploymentOperationNotAvailable):
+            self.dpl_api.delete(dpl_id)
+        self.assertNotIn('POST', {m for m, _ in self.server.requests})
+
+    def test_terminate(self):
+        dpl_id = self.add_deployments(1, state='STARTED')[0]
+        self.dpl_api.terminate(dpl_id)
+        self.assertNotIn(dpl_id, self.server.resources)
+
+    def test_follow_logs(self):
+        logs = add_logs(self.server)
+        lines = list(self.dpl_api.follow_logs(self.api.get(logs), timeout=0.5,
+                                              initial_delay=0.01, max_delay=0.02))
+        self.assertEqual(LOG_LINES, lines)
+
+    def test_follow_logs_pending_fetch(self):
+        logs = add_logs(self.server)
+        # Fetches are never applied: they are requested again after max_delay.
+        self.server.operations[('deployment-log', 'fetch')] = (None, lambda *args: None)
+        self.assertEqual([], list(self.dpl_api.follow_logs(
+            self.api.get(logs), timeout=0.35, initial_delay=0.01, max_delay=0.1)))
+        paths = [p for _, p in self.server.requests]
+        fetches = paths.count('/api/{}/fetch'.format(logs))
+        self.assertTrue(2 <= fetches <= 5, fetches)
+        self.assertGreater(paths.count('/api/{}'.format(logs)), fetches)
+
+    def add_parameters(self, dpl_id, params):
+        return {(node_id, name): self.server.add_resource(
+            'deployment-parameter',
+            dict({'parent': dpl_id, 'name': name, 'value': value},
+                 **({'node-id': node_id} if node_id else {})))
+            for (node_id, name), value in params.items()}
+
+    def test_parameter_snapshot(self):
+        dpl_id = self.server.add_resource('deployment', {
+            'module': {'content': {'urls': [['web', 'http://${hostname}:${tcp.80}/']]}}})
+        other_id = self.server.add_resource('deployment', {})
+        ids = self.add_parameters(dpl_id, {(None, 'hostname'): '1.2.3.4',
+                                           ('web', 'tcp.80'): '8080',
+                                           ('web', 'state'): 'running'})
+        self.add_parameters(other_id, {(None, 'hostname'): '5.6.7.8'})
+        dpl = self.api.get(dpl_id)
+        n = len(self.server.requests)
+        snapshot = self.dpl_api.parameter_snapshot(dpl_id)
+        self.assertEqual(n + 1, len(self.server.requests))
+        self.assertEqual(3, len(snapshot))
+        self.assertEqual({'global': {'hostname': '1.2.3.4'},
+                          'web': {'tcp.80': '8080', 'state': 'running'}},
+                         self.dpl_api.get_parameters(dpl_id, snapshot=snapshot))
+        self.assertEqual([{'tcp.80': '8080'}, {'state': 'running'}],
+                         self.dpl_api.get_parameters(dpl_id, 'web', snapshot=snapshot))
+        self.assertEqual('running',
+                         self.dpl_api.get_parameter(dpl_id, 'web', 'state', snapshot=snapshot))
+        self.assertIsNone(self.dpl_api.get_parameter(dpl_id, 'web', 'x', snapshot=snapshot))
+        self.assertEqual('http://1.2.3.4:8080/',
+                         self.dpl_api.get_url(dpl, 'web', snapshot=snapshot))
+        self.assertEqual(n + 1, len(self.server.requests))
+
+        self.api.edit(ids[('web', 'state')], {'value': 'stopped'})
+        self.add_parameters(dpl_id, {('web', 'tcp.443'): '8443'})
+        self.assertLessEqual(snapshot.refresh(), 3)
+        self.assertEqual('stopped', snapshot.get('web', 'state'))
+        self.assertEqual('8443', snapshot.get('web', 'tcp.443'))
+        self.assertEqual(4, len(snapshot))
+
+        self.api.delete(ids[('web', 'state')])
+        self.assertEqual(3, snapshot.refresh(full=True))
+        self.assertNotIn(('web', 'state'), snapshot)
+        self.assertEqual('http://1.2.3.4:8080/', self.dpl_api.get_url(dpl, 'web'))
+
+    def test_get_urls(self):
+        dpl_id = self.server.add_resource('deployment', {'module': {'content': {'urls': [
+            ['web', 'http://${hostname}:${web.tcp.80}/'],
+            ['api', 'https://${hostname}:${web.tcp.443}/api'],
+            ['admin', 'http://${hostname}:${admin.tcp.8080}/'],
+            ['docs', 'https://docs.example.com']]}}})
+        self.add_parameters(dpl_id, {(None, 'hostname'): '1.2.3.4',
+                                     ('web', 'web.tcp.80'): '8080',
+                                     ('web', 'web.tcp.443'): ''})
+        dpl = self.api.get(dpl_id)
+        n = len(self.server.requests)
+        self.assertEqual({'web': 'http://1.2.3.4:8080/', 'api': '', 'admin': None,
+                          'docs': 'https://docs.example.com'},
+                         self.dpl_api.get_urls(dpl))
+        self.assertEqual(n + 1, len(self.server.requests))
+        self.assertEqual({}, self.dpl_api.get_urls(self.api.get(
+            self.server.add_resource('deployment', {}))))
+
+    def test_resolve_fleet(self):
+        urls = [['web', 'http://${hostname}:${tcp.80}/']]
+        ids = [self.server.add_resource('deployment', {'module': {'content': {'urls': urls}}})
+               for _ in range(5)]
+        for i, dpl_id in enumerate(ids[:4]):
+            self.add_parameters(dpl_id, {(None, 'hostname'): '10.0.0.{}'.format(i),
+                                         ('web', 'tcp.80'): str(8000 + i)})
+        doc = self.api.get(ids[3]).data
+        del self.server.requests[:]
+        fleet = self.dpl_api.resolve_fleet(ids[:3] + [doc, ids[4], 'deployment/missing'],
+                                           chunk_size=2)
+        self.assertEqual(ids, list(fleet))
+        self.assertEqual({'global': {'hostname': '10.0.0.1'}, 'web': {'tcp.80': '8001'}},
+                         fleet[ids[1]]['parameters'])
+        self.assertEqual({'web': 'http://10.0.0.3:8003/'}, fleet[ids[3]]['urls'])
+        self.assertEqual({'parameters': {}, 'urls': {'web': None}}, fleet[ids[4]])
+        # 5 deployments fetched by chunks of 2, then the parameters of 5.
+        self.assertEqual(['/api/deployment'] * 3 + ['/api/deployment-parameter'] * 3,
+                         [p for _, p in self.server.requests])
+
+    def test_set_parameters(self):
+        dpl_id = self.server.add_resource('deployment', {})
+        ids = self.add_parameters(dpl_id, {(None, 'hostname'): '',
+                                           ('web', 'state'): '',
+                                           ('db', 'state'): ''})
+        values = {(None, 'hostname'): '1.2.3.4', ('web', 'state'): 'running',
+                  ('db', 'state'): 'running', ('db', 'tcp.5432'): '15432'}
+
+        del self.server.requests[:]
+        results = self.dpl_api.set_parameters(dpl_id, values)
+        self.assertEqual(list(values), list(results))
+        self.assertIsInstance(results[('db', 'tcp.5432')], ResourceNotFound)
+        self.assertEqual('running', results[('web', 'state')].data['value'])
+        # One search and the edits.
+        self.assertEqual(['/api/deployment-parameter'] + sorted('/api/' + i for i in ids.values()),
+                         sorted(p for _, p in self.server.requests))
+
+        # The missing parameter is known: no search.
+        del self.server.requests[:]
+        results = self.dpl_api.set_parameters(dpl_id, values)
+        self.assertIsInstance(results[('db', 'tcp.5432')], ResourceNotFound)
+        self.assertEqual(['PUT'] * 3, [m for m, _ in self.server.requests])
+        self.assertNotIn('/api/deployment-parameter', [p for _, p in self.server.requests])
+
+        results = self.dpl_api.set_parameters(dpl_id, values, user_id='user/1')
+        self.assertEqual(201, results[('db', 'tcp.5432')].data['status'])
+
+        # The next cycles only edit: the ids are known.
+        del self.server.requests[:]
+        self.dpl_api.set_parameters(dpl_id, values)
+        self.assertEqual(['PUT'] * 4, [m for m, _ in self.server.requests])
+        self.assertNotIn('/api/deployment-parameter', [p for _, p in self.server.requests])
+        snapshot = self.dpl_api.parameter_snapshot(dpl_id)
+        self.assertEqual(values, {k: snapshot.get(*k) for k in values})
+
+        # A deleted parameter is dropped from the index.
+        self.api.delete(ids[('web', 'state')])
+        results = self.dpl_api.set_parameters(dpl_id, {('web', 'state'): 'stopped'})
+        self.assertEqual(404, results[('web', 'state')].response.status_code)
+        results = self.dpl_api.set_parameters(dpl_id, {('web', 'state'): 'stopped'},
+                                              user_id='user/1')
+        self.assertEqual(201, results[('web', 'state')].data['status'])
+        with self.assertRaises(ValueError):
+            self.dpl_api.set_parameters(dpl_id, {('web', 'state'): 1})
+
+        # Parameters created by another client are found once forgotten.
+        self.dpl_api.set_parameters(dpl_id, {('db', 'tcp.6543'): '1'})
+        self.add_parameters(dpl_id, {('db', 'tcp.6543'): ''})
+        self.assertIsInstance(self.dpl_api.set_parameters(
+            dpl_id, {('db', 'tcp.6543'): '1'})[('db', 'tcp.6543')], ResourceNotFound)
+        self.dpl_api.forget_parameter_ids(dpl_id)
+        self.assertEqual('1', self.dpl_api.set_parameters(
+            dpl_id, {('db', 'tcp.6543'): '1'})[('db', 'tcp.6543')].data['value'])
+
+    def test_launch_many(self):
+        module_id = self.server.add_resource('module', {'content': {'image': 'nginx'}})
+        self.server.add_resource('data-set', {'id': 'data-set/1',
+                                              'data-record-filter': "tag='a'"})
+        specs = [{'module_id': module_id, 'infra_cred_id': 'credential/{}'.format(i),
+                  'data_records': ['data-record/{}'.format(i)]} for i in range(6)]
+        specs.insert(2, module_id)
+        specs.append({'module_id': module_id, 'data_sets': [{'id': 'data-set/missing'}]})
+        del self.server.requests[:]
+        results = list(self.dpl_api.launch_many(specs, concurrency=3))
+        self.assertEqual(list(range(len(specs))), sorted(r.index for r in results))
+        results.sort(key=lambda r: r.index)
+        self.assertFalse(results[-1].ok)
+        self.assertIsNone(results[-1].deployment_id)
+        self.assertEqual(404, results[-1].error.response.status_code)
+        for r in results[:-1]:
+            self.assertTrue(r.ok, r)
+            dpl = self.server.resources[r.deployment_id]
+            self.assertEqual('STARTED', dpl['state'])
+            self.assertEqual('nginx', dpl['module']['content']['image'])
+            self.assertEqual(r.spec.get('infra_cred_id'), dpl.get('parent'))
+        self.assertEqual({'records-ids': ['data-record/0']},
+                         self.server.resources[results[0].deployment_id]['data']['records'])
+        # Creation and start only (and the data-set of the failed launch),
+        # once the first creations have shown that the parent and data are
+        # accepted.
+        self.assertTrue(self.dpl_api._create_with_data)
+        checks = [p for m, p in self.server.requests
+                  if m == 'GET' and p.startswith('/api/deployment/')]
+        self.assertLessEqual(len(checks), 3)
+        paths = [p for _, p in self.server.requests if p != '/api/cloud-entry-point']
+        self.assertEqual(2 * (len(specs) - 1) + 1 + len(checks), len(paths))
+
+    def test_launch_many_invalid_module(self):
+        module_id = self.server.add_resource('module', {'content': {'image': 'nginx'}})
+        specs = [{'module_id': 'module/missing', 'infra_cred_id': 'credential/1'}] + \
+            [{'module_id': module_id, 'infra_cred_id': 'credential/1'}] * 2
+        results = sorted(self.dpl_api.launch_many(specs, concurrency=1),
+                         key=lambda r: r.index)
+        self.assertEqual(400, results[0].error.response.status_code)
+        self.assertTrue(all(r.ok for r in results[1:]), results)
+        # The invalid spec did not disable the creation with the parent.
+        self.assertTrue(self.dpl_api._create_with_data)
+        del self.server.requests[:]
+        result, = self.dpl_api.launch_many(specs[1:2], start=False)
+        self.assertEqual([('POST', '/api/deployment')],
+                         [r for r in self.server.requests if r[1] != '/api/cloud-entry-point'])
+        self.assertEqual('credential/1', self.server.resources[result.deployment_id]['parent'])
+
+    def test_launch_many_ignored_parent(self):
+        module_id = self.server.add_resource('module', {'content': {'image': 'nginx'}})
+        add = self.server.add
+
+        def add_ignoring_parent(resource_type, body, session_id):
+            return add(resource_type, {k: v for k, v in body.items() if k != 'parent'},
+                       session_id)
+
+        self.server.add = add_ignoring_parent
+        specs = [{'module_id': module_id, 'infra_cred_id': 'credential/1'}] * 3
+        results = list(self.dpl_api.launch_many(specs, concurrency=1))
+        self.assertTrue(all(r.ok for r in results), results)
+        for r in results:
+            self.assertEqual('credential/1', self.server.resources[r.deployment_id]['parent'])
+        self.assertFalse(self.dpl_api._create_with_data)
+
+    def test_launch_many_fallback(self):
+        module_id = self.server.add_resource('module', {'content': {'image': 'nginx'}})
+        add = self.server.add
+
+        def add_without_parent(resource_type, body, session_id):
+            if resource_type == 'deployment' and 'parent' in body:
+                return 400, {'status': 400, 'message': 'parent not allowed'}, {}
+            return add(resource_type, body, session_id)
+
+        self.server.add = add_without_parent
+        # A deployment refusing to start at once.
+        self.server.attributes['deployment'] = {'state': 'STARTING'}
+        timer = threading.Timer(0.1, lambda: self.set_state(
+            [i for i, d in self.server.resources.items()
+             if d['resource-type'] == 'deployment'], 'STOPPED'))
+        timer.start()
+        self.addCleanup(timer.cancel)
+        self.server.add_resource('data-set', {'id': 'data-set/1',
+                                              'data-record-filter': "tag='a'"})
+        specs = [{'module_id': module_id, 'infra_cred_id': 'credential/1',
+                  'data_sets': [{'id': 'data-set/1'}]}] * 3
+        del self.server.requests[:]
+        results = list(self.dpl_api.launch_many(specs, concurrency=3))
+        self.assertTrue(all(r.ok for r in results), results)
+        # The data-set is fetched once per launch, even when falling back.
+        self.assertEqual(3, self.server.requests.count(('GET', '/api/data-set/1')))
+        for r in results:
+            self.assertEqual('credential/1', self.server.resources[r.deployment_id]['parent'])
+            self.assertEqual("tag='a'", self.server.resources[r.deployment_id]
+                             ['data']['records']['filters'][0]['filter'])
+            self.assertEqual('STARTED', self.server.resources[r.deployment_id]['state'])
+        self.assertFalse(self.dpl_api._create_with_data)
+
+
+# Lines of the log returned by successive fetches, overlapping.
+LOG_FETCHES = [['a'], ['a', 'b', 'c'], ['c', 'd'], [], ['a', 'b', 'c', 'd', 'e']]
+LOG_LINES = ['a', 'b', 'c', 'd', 'e']
+
+
+def add_logs(server):
+    fetches = iter(LOG_FETCHES)
+    fetch = DEFAULT_OPERATIONS[('deployment-log', 'fetch')][1]
+
+    def fetch_next(_server, doc, data):
+        doc['log'] = next(fetches, [])
+        fetch(_server, doc, data)
+
+    server.operations[('deployment-log', 'fetch')] = (None, fetch_next)
+    return server.add_resource('deployment-log', {'parent': 'deployment/1', 'log': []})
+
+
+@unittest.skipIf(aiohttp is None, 'aiohttp is not installed')
+class AsyncDeploymentTest(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.server = FakeNuvla()
+        self.server.start()
+        self.addCleanup(self.server.stop)
+
+    def set_state(self, ids, state):
+        with self.server.lock:
+            for _id in ids:
+                self.server.resources[_id]['state'] = state
+
+    async def test_operations(self):
+        ids = [self.server.add_resource('deployment', {'state': 'STOPPING'})
+               for _ in range(3)]
+        timer = threading.Timer(0.1, self.set_state, (ids, 'STOPPED'))
+        timer.start()
+        self.addCleanup(timer.cancel)
+        async with AsyncApi(self.server.endpoint, persist_cookie=False) as api:
+            dpl_api = AsyncDeployment(api)
+            await asyncio.gather(*[dpl_api._operation(i, 'start', timeout=10,
+                                                      initial_delay=0.01, max_delay=0.02)
+                                   for i in ids])
+            states = await asyncio.gather(*[dpl_api.get_state(i) for i in ids])
+            self.assertEqual(['STARTED'] * 3, states)
+            with self.assertRaises(DeploymentOperationNotAvailable):
+                await dpl_api.start(ids[0])
+            await asyncio.gather(*[dpl_api.terminate(i) for i in ids])
+        self.assertFalse(set(ids) & set(self.server.resources))
+
+    async def test_follow_logs(self):
+        logs = add_logs(self.server)
+        async with AsyncApi(self.server.endpoint, persist_cookie=False) as api:
+            dpl_api = AsyncDeployment(api)
+            lines = [line async for line in dpl_api.follow_logs(
+                await api.get(logs), timeout=0.5, initial_delay=0.01, max_delay=0.02)]
+        self.assertEqual(LOG_LINES, lines)
@@ -0,0 +1,134 @@
+import threading
+import time
+from unittest import TestCase
+
+from nuvla.api import Api
+from nuvla.api.resources import Deployment, DeploymentParameter, \
+    DeploymentParameterReporter
+from nuvla.api.resources.base import ResourceNotFound
+from nuvla.api.testing import FakeNuvla
+
+STATE = DeploymentParameter.CURRENT_STATE['name']
+REPLICAS = DeploymentParameter.REPLICAS_RUNNING['name']
+
+
+class DeploymentParameterReporterTest(TestCase):
+
+    def setUp(self):
+        self.server = FakeNuvla()
+        self.server.start()
+        self.addCleanup(self.server.stop)
+        self.api = Api(self.server.endpoint, persist_cookie=False)
+        self.addCleanup(self.api.close)
+        self.dpl_api = Deployment(self.api)
+        self.dpl_id = self.server.add_resource('deployment', {})
+        for name in [STATE, REPLICAS]:
+            self.server.add_resource('deployment-parameter', {
+                'parent': self.dpl_id, 'node-id': 'web', 'name': name})
+
+    def values(self):
+        snapshot = self.dpl_api.parameter_snapshot(self.dpl_id)
+        return snapshot.get('web', STATE), snapshot.get('web', REPLICAS)
+
+    def edits(self):
+        return len([p for m, p in self.server.requests
+                    if m == 'PUT' and p.startswith('/api/deployment-parameter/')])
+
+    def test_changes_only(self):
+        reporter = DeploymentParameterReporter(self.dpl_api)
+        reporter.report(self.dpl_id, 'web', STATE, 'starting')
+        reporter.report(self.dpl_id, 'web', STATE, 'running')
+        reporter.report(self.dpl_id, 'web', REPLICAS, 1)
+        self.assertEqual(2, reporter.pending())
+        self.assertEqual({}, reporter.flush())
+        self.assertEqual(('running', '1'), self.values())
+        self.assertEqual(2, self.edits())
+
+        for _ in range(10):
+            self.assertFalse(reporter.report(self.dpl_id, 'web', STATE, 'running'))
+            reporter.report(self.dpl_id, 'web', REPLICAS, 1)
+        # Changed back before the flush.
+        reporter.report(self.dpl_id, 'web', REPLICAS, 2)
+        reporter.report(self.dpl_id, 'web', REPLICAS, 1)
+        self.assertEqual(0, reporter.pending())
+        reporter.report_many(self.dpl_id, {('web', STATE): 'stopped',
+                                           ('web', REPLICAS): 1})
+        reporter.flush()
+        self.assertEqual(('stopped', '1'), self.values())
+        self.assertEqual(3, self.edits())
+        self.assertEqual(3, reporter.writes)
+        self.assertEqual(22, reporter.skipped)
+
+    def test_errors(self):
+        reporter = DeploymentParameterReporter(self.dpl_api)
+        reporter.report(self.dpl_id, 'web', 'missing', 'x')
+        errors = reporter.flush()
+        self.assertIsInstance(errors[self.dpl_id][('web', 'missing')], ResourceNotFound)
+        # Reported again, as not written.
+        self.assertTrue(reporter.report(self.dpl_id, 'web', 'missing', 'x'))
+        reporter.user_id = 'user/1'
+        self.assertEqual({}, reporter.flush())
+        self.assertEqual('x', self.dpl_api.get_parameter(self.dpl_id, 'web', 'missing'))
+
+    def test_background_flush(self):
+        with DeploymentParameterReporter(self.dpl_api, flush_interval=0.05) as reporter:
+            reporter.report(self.dpl_id, 'web', STATE, 'running')
+            deadline = time.monotonic() + 5
+            while reporter.pending() and time.monotonic() < deadline:
+                time.sleep(0.01)
+            self.assertEqual(0, reporter.pending())
+            reporter.report(self.dpl_id, 'web', REPLICAS, 3)
+        self.assertEqual(('running', '3'), self.values())
+
+    def test_report_during_flush(self):
+        reporter = DeploymentParameterReporter(self.dpl_api)
+        reporter.report(self.dpl_id, 'web', STATE, 'running')
+        reporter.flush()
+        writing = threading.Event()
+        written = threading.Event()
+        edit = self.server.edit
+
+        def slow_edit(*args, **kwargs):
+            writing.set()
+            written.wait(5)
+            return edit(*args, **kwargs)
+
+        self.server.edit = slow_edit
+        reporter.report(self.dpl_id, 'web', STATE, 'stopped')
+        flush = threading.Thread(target=reporter.flush)
+        flush.start()
+        self.assertTrue(writing.wait(5))
+        # The value being written is skipped, not the one last written.
+        self.assertFalse(reporter.report(self.dpl_id, 'web', STATE, 'stopped'))
+        self.assertTrue(reporter.report(self.dpl_id, 'web', STATE, 'running'))
+        written.set()
+        flush.join(5)
+        self.assertEqual(1, reporter.pending())
+        reporter.flush()
+        self.assertEqual(('running', None), self.values())
+
+    def test_one_batch(self):
+        dpl_ids = [self.dpl_id] + [self.server.add_resource('deployment', {})
+                                   for _ in range(3)]
+        for dpl_id in dpl_ids[1:]:
+            self.server.add_resource('deployment-parameter', {
+                'parent': dpl_id, 'node-id': 'web', 'name': STATE})
+        batches = []
+        batch = self.api.batch
+
+        def count_batch(concurrency):
+            batches.append(concurrency)
+            return batch(concurrency)
+
+        self.api.batch = count_batch
+        reporter = DeploymentParameterReporter(self.dpl_api, concurrency=4)
+        for dpl_id in dpl_ids:
+            reporter.report(dpl_id, 'web', STATE, 'running')
+        reporter.report(dpl_ids[0], 'web', 'missing', 'x')
+        errors = reporter.flush()
+        self.assertEqual([4], batches)
+        self.assertEqual([dpl_ids[0]], list(errors))
+        self.assertEqual(len(dpl_ids), reporter.writes)
+        for dpl_id in dpl_ids:
+            self.assertEqual('running',
+                             self.dpl_api.parameter_snapshot(dpl_id).get('web', STATE))
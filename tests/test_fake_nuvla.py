@@ -0,0 +1,112 @@
+from unittest import TestCase
+
+from nuvla.api import Api, NuvlaError
+from nuvla.api.resources import Deployment
+from nuvla.api.testing import FakeNuvla, FilterError, compile_filter
+
+
+class FilterTest(TestCase):
+
+    def test_filter(self):
+        doc = {'name': 'abc', 'n': 3, 'tags': ['a', 'b'], 'module': {'href': 'module/1'},
+               'empty': None}
+        for fltr, expected in [("name='abc'", True),
+                               ('name="abc" and n=3', True),
+                               ("name!='abc' or (n>2 and n<=3)", True),
+                               ("name^='ab' and tags='b'", True),
+                               ("tags!='a'", False),
+                               ("module/href='module/1'", True),
+                               ('missing=null and empty=null', True),
+                               ('name!=null and n>=4', False),
+                               ("(name='x' or name='abc') and (n=1 or n=3)", True),
+                               ('', True)]:
+            self.assertEqual(expected, compile_filter(fltr)(doc), fltr)
+
+    def test_invalid_filter(self):
+        for fltr in ["name='abc' and", "(name='abc'", "name 'abc'", "name='abc' n=1"]:
+            with self.assertRaises(FilterError, msg=fltr):
+                compile_filter(fltr)
+
+
+class FakeNuvlaTest(TestCase):
+
+    def setUp(self):
+        self.server = FakeNuvla(require_auth=True, users={'user': 'pass'}, etag=True)
+        self.server.start()
+        self.addCleanup(self.server.stop)
+        self.api = Api(self.server.endpoint, persist_cookie=False)
+        self.addCleanup(self.api.close)
+
+    def test_session(self):
+        self.assertEqual(403, self.api.login_password('user', 'bad').status_code)
+        with self.assertRaises(NuvlaError) as cm:
+            self.api.search('data-record')
+        self.assertEqual(401, cm.exception.response.status_code)
+        self.assertEqual(201, self.api.login_password('user', 'pass').status_code)
+        self.assertTrue(self.api.is_authenticated())
+        self.api.logout()
+        self.assertFalse(self.server.sessions)
+
+    def test_crud_search(self):
+        self.api.login_password('user', 'pass')
+        for i in range(10):
+            self.api.add('data-record', {'name': 'r{}'.format(i), 'n': i % 3})
+        res = self.api.search('data-record', filter='n=1', orderby='name:desc',
+                              select=['name'], first=2, last=3)
+        self.assertEqual(3, res.count)
+        self.assertEqual(['r4', 'r1'], [r.data['name'] for r in res.resources])
+        self.assertNotIn('n', res.resources[0].data)
+
+        rid = res.resources[0].id
+        self.api.edit(rid, {'description': 'd'})
+        self.api.edit(rid, {'name': 'x'}, select='description')
+        doc = self.api.get(rid).data
+        self.assertEqual('x', doc['name'])
+        self.assertNotIn('description', doc)
+        self.api.edit_patch(rid, [{'op': 'add', 'path': '/tags', 'value': ['t']}])
+        self.assertEqual(['t'], self.api.get(rid).data['tags'])
+
+        self.api.delete(rid)
+        with self.assertRaises(NuvlaError):
+            self.api.get(rid)
+        self.assertEqual(4, self.api.delete_bulk('data-record', 'n=0').data['deleted'])
+        self.assertEqual(5, self.api.search('data-record', last=0).count)
+
+    def test_etag(self):
+        self.api.login_password('user', 'pass')
+        rid = self.api.add('module', {'name': 'm'}).data['resource-id']
+        api = Api(self.server.endpoint, persist_cookie=False, cache_ttl=0)
+        api.session.cookies = self.api.session.cookies
+        api.get(rid)
+        api.get(rid)
+        self.assertEqual(1, api.cache.revalidations)
+
+    def test_deployment(self):
+        self.server.latency = 0.001
+        self.api.login_password('user', 'pass')
+        module_id = self.api.add('module', {'name': 'app', 'subtype': 'component',
+                                            'content': {'image': 'nginx'}}) \
+            .data['resource-id']
+        dpl_api = Deployment(self.api)
+        dpl = dpl_api.launch(module_id, infra_cred_id='credential/1')
+        self.assertEqual('STARTED', Deployment.state(dpl))
+        self.assertEqual('credential/1', Deployment.credential_id(dpl))
+        self.assertEqual('nginx', Deployment.module_content(dpl)['image'])
+        with self.assertRaises(NuvlaError) as cm:
+            self.api.operation(dpl, 'start')
+        self.assertEqual(409, cm.exception.response.status_code)
+
+        resp = self.api.operation_bulk('deployment', "state='STARTED'", 'stop', {})
+        self.assertEqual(202, resp.data['status'])
+        self.assertEqual('STOPPED', dpl_api.get_state(dpl.id))
+        dpl_api.delete(dpl.id)
+        self.assertEqual(0, self.api.search('deployment', last=0).count)
+
+    def test_compressed_bodies(self):
+        api = Api(self.server.endpoint, persist_cookie=False, compress=True,
+                  compress_min_size=10, compress_stream_threshold=2000)
+        self.addCleanup(api.close)
+        api.login_password('user', 'pass')
+        for size in [100, 10000]:
+            rid = api.add('data-record', {'content': 'x' * size}).data['resource-id']
+            self.assertEqual(size, len(self.server.resources[rid]['content']))
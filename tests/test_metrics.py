@@ -0,0 +1,90 @@
+from unittest import TestCase
+
+from nuvla.api import Api, NuvlaError
+from nuvla.api.metrics import MetricsCollector, RequestEvent, uri_template
+from nuvla.api.testing import FakeNuvla
+
+
+class MetricsCollectorTest(TestCase):
+
+    def test_uri_template(self):
+        self.assertEqual('deployment', uri_template('deployment'))
+        self.assertEqual('deployment/{id}', uri_template('deployment/123'))
+        self.assertEqual('deployment/{id}/start', uri_template('deployment/123/start'))
+        self.assertEqual('hook/reset-password', uri_template('hook/reset-password'))
+
+    def test_collector(self):
+        metrics = MetricsCollector(buckets=(0.1, 1.0))
+        for i in range(100):
+            metrics(RequestEvent('GET', 'module/{}'.format(i), 200, i / 100,
+                                 response_bytes=10))
+        metrics(RequestEvent('GET', 'module/x', 404, 2.0))
+        metrics(RequestEvent('PUT', 'module', 200, 0.01, retries=1))
+        stats = metrics.snapshot()['GET module/{id}']
+        self.assertEqual(101, stats['count'])
+        self.assertEqual(1, stats['errors'])
+        self.assertEqual({200: 100, 404: 1}, stats['statuses'])
+        self.assertAlmostEqual(0.5, stats['latency_p50'], places=2)
+        self.assertEqual(2.0, stats['latency_max'])
+        self.assertEqual(1000, stats['response_bytes'])
+        self.assertEqual(['GET module/{id}', 'PUT module'], [e for e, _ in metrics.top()])
+
+        text = metrics.to_prometheus()
+        self.assertIn('nuvla_client_requests_total{method="GET",endpoint="module/{id}",'
+                      'status="404"} 1', text)
+        self.assertIn('nuvla_client_request_duration_seconds_bucket{method="GET",'
+                      'endpoint="module/{id}",le="0.1"} 11', text)
+        self.assertIn('nuvla_client_request_duration_seconds_bucket{method="GET",'
+                      'endpoint="module/{id}",le="+Inf"} 101', text)
+        self.assertIn('nuvla_client_retries_total{method="PUT",endpoint="module"} 1', text)
+
+
+class ApiRequestHooksTest(TestCase):
+
+    def setUp(self):
+        self.server = FakeNuvla(require_auth=True)
+        self.server.start()
+        self.addCleanup(self.server.stop)
+        self.events = []
+        self.metrics = MetricsCollector()
+        self.api = Api(self.server.endpoint, persist_cookie=False, reauthenticate=True,
+                       login_creds={'username': 'user', 'password': 'pass'},
+                       compress=True, compress_min_size=100,
+                       request_hooks=[self.events.append])
+        self.api.add_request_hook(self.metrics)
+        self.addCleanup(self.api.close)
+
+    def test_hooks(self):
+        rid = self.api.add('data-record', {'name': 'x' * 1000}).data['resource-id']
+        self.api.get(rid)
+        with self.assertRaises(NuvlaError):
+            self.api.get('data-record/missing')
+
+        self.assertEqual(['GET cloud-entry-point', 'POST data-record',
+                          'GET data-record/{id}', 'GET data-record/{id}'],
+                         [e.endpoint for e in self.events])
+        # The add was sent unauthenticated, then retried after login.
+        add = self.events[1]
+        self.assertEqual(1, add.reauthentications)
+        self.assertEqual('data-record', add.resource_type)
+        self.assertEqual(201, add.status)
+        self.assertGreater(add.compression_ratio, 10)
+        self.assertLess(add.request_bytes, 100)
+        get = self.events[2]
+        self.assertEqual(0, get.reauthentications)
+        self.assertIsNone(get.compression_ratio)
+        self.assertGreater(get.response_bytes, 1000)
+        self.assertEqual(404, self.events[3].status)
+        self.assertEqual(1, self.metrics.snapshot()['GET data-record/{id}']['errors'])
+
+        self.api.remove_request_hook(self.events.append)
+        self.api.get(rid)
+        self.assertEqual(5, len(self.events))
+
+    def test_failing_hook(self):
+        def hook(event):
+            raise ValueError()
+        self.api.add_request_hook(hook)
+        with self.assertLogs('nuvla.api.metrics', 'WARNING'):
+            self.api.search('data-record')
+        self.assertEqual(1, len(self.events))
@@ -0,0 +1,74 @@
+from unittest import TestCase
+
+from nuvla.api import Api, NuvlaError
+from nuvla.api import tracing
+from nuvla.api.resources import Deployment
+from nuvla.api.testing import FakeNuvla
+from nuvla.api.tracing import RecordingTracer
+
+
+class TracingTest(TestCase):
+
+    def setUp(self):
+        self.server = FakeNuvla()
+        self.server.start()
+        self.addCleanup(self.server.stop)
+        self.api = Api(self.server.endpoint, persist_cookie=False)
+        self.addCleanup(self.api.close)
+        self.module_id = self.server.add_resource('module', {'subtype': 'component'})
+        self.tracer = RecordingTracer()
+        tracing.set_tracer(self.tracer)
+        self.addCleanup(tracing.set_tracer, None)
+
+    def test_helper_spans(self):
+        dpl = Deployment(self.api).launch(self.module_id, infra_cred_id='credential/1')
+        [launch] = self.tracer.spans
+        self.assertEqual('Deployment.launch', launch.name)
+        self.assertEqual(['Deployment.create', 'Deployment.start', 'Deployment.get'],
+                         [s.name for s in launch.children])
+        create = launch.children[0]
+        self.assertEqual(['Deployment.add', 'Deployment.get', 'PUT deployment/{id}'],
+                         [s.name for s in create.children])
+        self.assertEqual(['GET cloud-entry-point', 'POST deployment'],
+                         [s.name for s in create.children[0].children])
+        http = create.children[0].children[1]
+        self.assertEqual({'http.request.method': 'POST',
+                          'url.full': self.server.endpoint + '/api/deployment',
+                          'nuvla.resource_type': 'deployment',
+                          'http.response.status_code': 201}, http.attributes)
+        self.assertEqual(len(self.server.requests), launch.request_count())
+        self.assertIn('Deployment.launch', self.tracer.format())
+        self.assertEqual('STARTED', Deployment.state(dpl))
+
+    def test_batch_nesting(self):
+        dpl_api = Deployment(self.api)
+        dpl_id = self.server.add_resource('deployment', {})
+        for name in ['a', 'b', 'c']:
+            self.server.add_resource('deployment-parameter', {'parent': dpl_id, 'name': name})
+        dpl_api.set_parameters(dpl_id, {(None, 'a'): '1', (None, 'b'): '2', (None, 'c'): '3'})
+        [span] = self.tracer.spans
+        self.assertEqual('Deployment.set_parameters', span.name)
+        # The search and the edits run in the batch threads.
+        self.assertEqual(4, span.request_count())
+
+        self.tracer.clear()
+        with self.tracer.start_as_current_span('parent') as parent:
+            with self.api.batch(concurrency=2) as batch:
+                for _ in range(3):
+                    batch.get(dpl_id)
+            self.api.delete_many([dpl_id])
+        self.assertEqual([parent], self.tracer.spans)
+        self.assertEqual(['GET deployment/{id}'] * 3 + ['DELETE deployment/{id}'],
+                         [s.name for s in parent.children])
+
+    def test_exception(self):
+        with self.assertRaises(NuvlaError):
+            Deployment(self.api).get('deployment/missing')
+        [get] = self.tracer.spans
+        self.assertIsInstance(get.exception, NuvlaError)
+        self.assertEqual(404, get.children[0].attributes['http.response.status_code'])
+
+    def test_disabled(self):
+        tracing.set_tracer(None)
+        Deployment(self.api).launch(self.module_id)
+        self.assertEqual([], self.tracer.spans)
@@ -1,10 +1,10 @@
 #!/usr/bin/env python
 
 from datetime import datetime, timezone
-import time
 import sys
 
 from nuvla.api import Api as Nuvla
+from nuvla.api.resources.data import DataRecord
 
 debug = False
 if debug:
@@ -61,21 +61,20 @@ def create_data_key_prefix(nuvla):
             raise ex
 
 
-def dr_create(nuvla: Nuvla, num_create: int):
-    while num_create > 0:
-        try:
-            tm = datetime.utcnow().replace(tzinfo=timezone.utc) \
-                .replace(microsecond=0).isoformat().replace('+00:00', 'Z')
-            dr_object.update({'timestamp': tm})
-            res = nuvla.add('data-record', dr_object)
-            if res.data['status'] != 201:
-                print('Failed to create object.')
-            else:
-                print('Created object.')
-        except Exception as ex:
-            print('Exception while adding data-record: {}'.format(ex))
-        time.sleep(0.1)
-        num_create -= 1
+def dr_records(num_create: int):
+    for _ in range(num_create):
+        tm = datetime.utcnow().replace(tzinfo=timezone.utc) \
+            .replace(microsecond=0).isoformat().replace('+00:00', 'Z')
+        yield dict(dr_object, timestamp=tm)
+
+
+def dr_create(nuvla: Nuvla, num_create: int, concurrency: int):
+    report = DataRecord(nuvla).create_many(dr_records(num_create),
+                                           dr_object['infrastructure-service'],
+                                           concurrency=concurrency)
+    for index, error in report.errors.items():
+        print('Failed to create object {}: {}'.format(index, error))
+    print(report)
 
 
 nuvla = Nuvla(endpoint='https://localhost', insecure=True)
@@ -88,7 +87,12 @@ if len(sys.argv) > 1:
 else:
     n = 5
 
+if len(sys.argv) > 2:
+    concurrency = int(sys.argv[2])
+else:
+    concurrency = 10
+
 create_data_key_prefix(nuvla)
-dr_create(nuvla, n)
+dr_create(nuvla, n, concurrency)
 
 nuvla.logout()